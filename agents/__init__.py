@@ -1,7 +1,13 @@
-from .cardiologist import Cardiologist
-from .psychologist import Psychologist
-from .pulmonologist import Pulmonologist
-from .custom_agent import CustomAgent
+import importlib
+
+# Agent classes are imported on first attribute access, so importing the
+# package (or one agent module) does not import every agent
+_EXPORTS = {
+    'Cardiologist': '.cardiologist',
+    'Psychologist': '.psychologist',
+    'Pulmonologist': '.pulmonologist',
+    'CustomAgent': '.custom_agent'
+}
 
 __all__ = [
     'Cardiologist',
@@ -9,3 +15,12 @@ __all__ = [
     'Pulmonologist',
     'CustomAgent'
 ]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -4,15 +4,21 @@ import logging
 import json
 import os
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 # Import project modules
-from config.settings import MAX_WORKERS, GROQ_API_KEY, GROQ_MODEL
+from config import settings
 from core.agent_factory import AgentFactory
-from core.multidisciplinary_team import MultidisciplinaryTeam
-from services.llm_service import LLMService
-from utils.file_handler import FileHandler
+from core.condenser import ReportCondenser
+from core.pipeline import build_analysis_pipeline
+from core.triage import get_triage_router
+from services.client_pool import get_client_pool, get_llm_service
+from services.job_queue import get_job_queue
+from services.report_parser import parse_report
+from services.report_stream import ReportBuffer, ReportSpan
+from medical_agents.worker import analysis_payload
 from utils.logger import setup_logger
 
 # Setup logging
@@ -28,7 +34,10 @@ if "processing" not in st.session_state:
 if "selected_specialists" not in st.session_state:
     st.session_state.selected_specialists = ["cardiologist", "psychologist", "pulmonologist"]
 if "api_key" not in st.session_state:
-    st.session_state.api_key = GROQ_API_KEY
+    st.session_state.api_key = settings.GROQ_API_KEY
+if "job_id" not in st.session_state:
+    # The job id is kept in the URL so a reloaded or reopened tab finds its background job again
+    st.session_state.job_id = st.query_params.get("job")
 
 # App title and description
 st.set_page_config(page_title="Medical AI Agent System", layout="wide")
@@ -68,6 +77,36 @@ with st.sidebar.expander("API Configuration", expanded=True):
         os.environ["GROQ_API_KEY"] = api_key
         st.success("API key updated successfully!")
 
+# Open the LLM connections while the user picks a report (once per key per process)
+if st.session_state.api_key and settings.LLM_PREWARM:
+    try:
+        get_client_pool().prewarm(api_key=st.session_state.api_key)
+    except ValueError:
+        pass
+
+# Files can hold several reports (see REPORT_DELIMITER); only the chosen one is decoded
+@st.cache_data(show_spinner=False)
+def report_file_spans(path: str, modified: float) -> List[ReportSpan]:
+    """Locate the reports in a file once per version of the file, not on every rerun."""
+    with ReportBuffer.open(path) as reader:
+        return list(reader.spans())
+
+def choose_report(reader: ReportBuffer,
+                  source_name: str,
+                  key: str,
+                  spans: Optional[List[ReportSpan]] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Return the text and name of one report from a file, asking which one if it holds several."""
+    spans = list(reader.spans()) if spans is None else spans
+    if not spans:
+        return None, None
+    if len(spans) == 1:
+        return reader.read(spans[0]), source_name
+    number = st.sidebar.number_input(
+        f"Report in {source_name} (1-{len(spans)})",
+        min_value=1, max_value=len(spans), value=1, step=1, key=key
+    )
+    return reader.read(spans[number - 1]), f"{source_name}#{number}"
+
 # Report selection
 st.sidebar.subheader("Report Selection")
 
@@ -94,9 +133,12 @@ if sample_reports:
     
     if selected_sample:
         try:
-            with open(os.path.join(sample_reports_dir, selected_sample), 'r', encoding='utf-8') as f:
-                report_content = f.read()
-                selected_report = selected_sample
+            sample_path = os.path.join(sample_reports_dir, selected_sample)
+            with ReportBuffer.open(sample_path) as reader:
+                report_content, selected_report = choose_report(
+                    reader, selected_sample, "sample_report_number",
+                    spans=report_file_spans(sample_path, os.path.getmtime(sample_path))
+                )
         except Exception as e:
             st.error(f"Error loading sample report: {str(e)}")
             report_content = None
@@ -112,8 +154,10 @@ else:
 # Handle uploaded file
 if uploaded_file is not None:
     try:
-        report_content = uploaded_file.getvalue().decode("utf-8")
-        selected_report = uploaded_file.name
+        # getbuffer() is a view of the upload; only the chosen report is copied out of it
+        report_content, selected_report = choose_report(
+            ReportBuffer(uploaded_file.getbuffer()), uploaded_file.name, "uploaded_report_number"
+        )
     except Exception as e:
         st.error(f"Error reading uploaded file: {str(e)}")
         report_content = None
@@ -141,25 +185,66 @@ st.session_state.selected_specialists = selected_specialists
 with st.sidebar.expander("Advanced Settings"):
     temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.2, step=0.1)
     max_tokens = st.slider("Max Tokens", min_value=256, max_value=4096, value=1024, step=256)
+    panel_mode = st.checkbox(
+        "Panel mode",
+        value=settings.SPECIALIST_PANEL_MODE,
+        help="Ask for all specialist assessments in a single request (falls back to one request per specialist)"
+    )
+    triage_enabled = st.checkbox(
+        "Skip irrelevant specialists",
+        value=settings.TRIAGE_ENABLED,
+        help="Score each selected specialist's relevance to the report locally and skip those below the threshold"
+    )
+    condense_reports = st.checkbox(
+        "Condense reports for the team",
+        value=settings.CONDENSE_SPECIALIST_REPORTS,
+        help="Send the multidisciplinary team only each specialist's differentials, findings and next steps"
+    )
+    background_job = st.checkbox(
+        "Run in background worker",
+        value=settings.BACKGROUND_JOBS,
+        help="Queue the analysis for a worker process (python -m medical_agents.worker) so it survives closing the tab"
+    )
 
 # Function to run analysis in parallel
 def run_specialist_analysis(report_content):
-    """Run specialist analysis in parallel and update session state."""
+    """Run the analysis pipeline, rendering its progress live, and update session state."""
     st.session_state.processing = True
     st.session_state.specialist_reports = {}
     st.session_state.final_diagnosis = None
     
-    # Create shared LLM service for all agents
+    # Shared LLM service for all agents, reused across reruns and sessions
     try:
-        llm_service = LLMService(api_key=st.session_state.api_key)
+        llm_service = get_llm_service(api_key=st.session_state.api_key)
     except ValueError as e:
         st.error("Please enter a valid Groq API key to enable the AI agents.")
         st.session_state.processing = False
         return
     
+    # Parsed once for triage and every pipeline stage
+    report = parse_report(report_content)
+    specialist_types = selected_specialists
+    if triage_enabled:
+        decision = get_triage_router().route(report, selected_specialists)
+        specialist_types = decision.selected
+        llm_service.metrics.increment("triage_avoided_calls", decision.avoided_calls)
+        if decision.skipped:
+            st.info(f"Skipped specialists not relevant to this report: "
+                    f"{', '.join(specialist_type.capitalize() for specialist_type in decision.skipped)}")
+    
     progress_bar = st.progress(0)
     status_text = st.empty()
     
+    # Live view that renders each specialist's assessment as its tokens arrive
+    live_view = st.empty()
+    with live_view.container():
+        st.header("Specialist Reports")
+        live_placeholders = {}
+        for specialist_type in specialist_types:
+            with st.expander(f"{specialist_type.capitalize()} Assessment", expanded=True):
+                live_placeholders[specialist_type] = st.empty()
+        live_diagnosis = st.empty()
+    
     # Update progress
     def update_progress(i, total, text):
         progress = int((i / total) * 100)
@@ -167,87 +252,84 @@ def run_specialist_analysis(report_content):
         status_text.text(text)
     
     try:
-        # Create and run specialist agents in parallel
-        results = {}
-        agents = []
+        # The pipeline runs on worker threads; only the script thread may touch the page
+        updates = queue.Queue()
+        pipeline = build_analysis_pipeline(
+            medical_report=report,
+            specialist_types=specialist_types,
+            llm_service=llm_service,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            report_name=selected_report,
+            panel_mode=panel_mode,
+            on_delta=lambda name, delta: updates.put(("delta", name, delta)),
+            condenser=ReportCondenser(structured=settings.CONDENSE_STRUCTURED) if condense_reports else None
+        )
         
-        # Create the agents
-        for i, specialist_type in enumerate(selected_specialists):
-            update_progress(i, len(selected_specialists) + 1, f"Creating {specialist_type} agent...")
-            agent = AgentFactory.create_agent(
-                agent_type=specialist_type,
-                llm_service=llm_service,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            agents.append((specialist_type, agent))
+        total_stages = len(pipeline.stages)
+        update_progress(0, total_stages, "Running specialist analysis...")
         
-        # Create a thread pool and run the agents
-        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(selected_specialists))) as executor:
-            # Submit all tasks
-            future_to_specialist = {
-                executor.submit(agent.analyze, report_content): specialist_type 
-                for specialist_type, agent in agents
-            }
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            run = executor.submit(
+                pipeline.run,
+                on_stage_done=lambda name, timing: updates.put(("stage", name, timing.status))
+            )
+            run.add_done_callback(lambda _: updates.put(("finished", None, None)))
             
-            # Process results as they complete
-            for i, future in enumerate(as_completed(future_to_specialist)):
-                specialist_type = future_to_specialist[future]
-                update_progress(i, len(selected_specialists), f"Processing {specialist_type} analysis...")
+            streamed = {}
+            completed = 0
+            finished = False
+            while not finished:
+                # Drain whatever has arrived, then re-render only the views that changed
+                batch = [updates.get()]
+                while True:
+                    try:
+                        batch.append(updates.get_nowait())
+                    except queue.Empty:
+                        break
                 
-                try:
-                    result = future.result()
-                    results[specialist_type] = result
-                except Exception as e:
-                    logger.error(f"Error in {specialist_type} analysis: {str(e)}")
-                    results[specialist_type] = f"Error: {str(e)}"
+                changed = set()
+                for kind, name, value in batch:
+                    if kind == "delta":
+                        streamed[name] = streamed.get(name, "") + value
+                        changed.add(name)
+                    elif kind == "stage":
+                        completed += 1
+                        update_progress(min(completed, total_stages), total_stages, f"Stage {name}: {value}")
+                    else:
+                        finished = True
+                
+                for name in changed:
+                    if name == "team":
+                        live_diagnosis.markdown(f"## Final Diagnosis\n\n{streamed[name]}")
+                    else:
+                        live_placeholders[name].markdown(streamed[name])
+            
+            result = run.result()
         
         # Update session state with specialist reports
-        st.session_state.specialist_reports = results
-        
-        # Run multidisciplinary team analysis if we have at least 2 specialist reports
-        if len(results) >= 2:
-            update_progress(len(selected_specialists), len(selected_specialists) + 1, "Running multidisciplinary analysis...")
-            
-            team_agent = MultidisciplinaryTeam(
-                specialist_reports=results,
-                llm_service=llm_service,
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            
-            final_diagnosis = team_agent.analyze()
-            st.session_state.final_diagnosis = final_diagnosis
-            
-            # Save the final diagnosis to file
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            diagnosis_filename = f"diagnosis_{timestamp}"
-            FileHandler.save_result(
-                data={
-                    "timestamp": timestamp,
-                    "report": selected_report,
-                    "specialist_reports": results,
-                    "final_diagnosis": final_diagnosis
-                },
-                filename=diagnosis_filename,
-                format_type="json"
-            )
-            
-            # Also save a text-only version for easy reading
-            FileHandler.save_result(
-                data=f"Final Diagnosis ({timestamp}):\n\n{final_diagnosis}",
-                filename=f"{diagnosis_filename}_text",
-                format_type="txt"
-            )
+        st.session_state.specialist_reports = result.outputs.get("specialists", {})
+        st.session_state.final_diagnosis = result.outputs.get("team")
+        for stage_name, error in result.errors.items():
+            st.error(f"An error occurred during {stage_name}: {str(error)}")
         
         # Complete progress
         update_progress(1, 1, "Analysis complete!")
-        
+        logger.info(f"Pipeline timing: {result.timing_summary()}")
+        if "condense" in result.outputs:
+            logger.info(f"Specialist report condensation: {result.outputs['condense'].to_dict()}")
+        logger.info(f"LLM service stats: {llm_service.stats()}")
+        logger.info(f"LLM client pool stats: {get_client_pool().stats()}")
+        logger.info(f"Agent pool stats: {AgentFactory.pool.stats()}")
+        logger.info(f"Triage stats: {get_triage_router().stats()}")
+    
     except Exception as e:
         logger.error(f"Error during analysis: {str(e)}")
         st.error(f"An error occurred during analysis: {str(e)}")
     
     finally:
+        # The results section below re-renders the finished reports
+        live_view.empty()
         st.session_state.processing = False
 
 # Main content area
@@ -266,11 +348,55 @@ with main_col1:
     if not report_content:
         st.warning("Please upload a medical report or select a sample report.")
     
-    if st.button(
+    analyze_clicked = st.button(
         "Analyze Medical Report",
-        disabled=not (report_content and selected_specialists and st.session_state.api_key) or st.session_state.processing
-    ):
-        run_specialist_analysis(report_content)
+        disabled=(not (report_content and selected_specialists and st.session_state.api_key)
+                  or st.session_state.processing or bool(st.session_state.job_id))
+    )
+
+# Run outside the column so the live view spans the page like the results do
+if analyze_clicked and background_job:
+    st.session_state.specialist_reports = {}
+    st.session_state.final_diagnosis = None
+    st.session_state.job_id = get_job_queue().enqueue(analysis_payload(
+        medical_report=report_content,
+        specialist_types=selected_specialists,
+        report_name=selected_report,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        panel_mode=panel_mode,
+        triage=triage_enabled,
+        condense=condense_reports
+    ))
+    st.query_params["job"] = st.session_state.job_id
+elif analyze_clicked:
+    run_specialist_analysis(report_content)
+
+# Poll the background job until a worker has finished it
+if st.session_state.job_id:
+    job = get_job_queue().get(st.session_state.job_id)
+    if job is None:
+        st.warning("The background analysis could not be found in the job queue.")
+    elif not job.finished:
+        st.info(f"Background analysis {job.status} (attempt {max(job.attempts, 1)})"
+                + (f" on {job.worker}" if job.worker else "; waiting for a worker"))
+        outputs = job.progress.get("outputs", {})
+        for stage_name, output in outputs.items():
+            if stage_name.startswith("specialist:"):
+                with st.expander(f"{stage_name.split(':', 1)[1].capitalize()} Assessment", expanded=False):
+                    st.markdown(output)
+        time.sleep(settings.JOB_POLL_INTERVAL)
+        st.rerun()
+    elif job.status == "done":
+        st.session_state.specialist_reports = job.result.get("specialist_reports", {})
+        st.session_state.final_diagnosis = job.result.get("final_diagnosis")
+        logger.info(f"Background job {job.id} finished: {job.result.get('timing')}")
+    else:
+        st.error(f"The background analysis failed: {job.error}")
+    
+    if job is None or job.finished:
+        st.session_state.job_id = None
+        st.query_params.pop("job", None)
 
 # Display results
 if st.session_state.specialist_reports:
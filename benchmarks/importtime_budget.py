@@ -0,0 +1,81 @@
+# benchmarks/importtime_budget.py
+"""
+Cold-start import budget check.
+
+Imports each entry path in a fresh interpreter under `python -X importtime`
+and fails if the best of several runs exceeds its budget:
+
+    python benchmarks/importtime_budget.py
+    python benchmarks/importtime_budget.py --budget-ms 200 --runs 10 --verbose
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Project modules imported by each entry path (streamlit itself is not counted for the app)
+ENTRY_PATHS: Dict[str, List[str]] = {
+    "app": ["utils.logger", "utils.file_handler", "core.agent_factory", "core.pipeline", "services.client_pool"],
+    "cli": ["medical_agents.batch", "core.pipeline"],
+}
+
+DEFAULT_BUDGET_MS = 150.0
+
+MARKER = "--importtime-start--"
+
+
+def measure(modules: List[str]) -> Tuple[float, List[Tuple[float, str]]]:
+    """
+    Import modules in a fresh interpreter and return the total and per-module cumulative times.
+
+    Args:
+        modules: Dotted module names to import
+
+    Returns:
+        Total milliseconds and (milliseconds, module) pairs for the top-level imports
+    """
+    code = f"import sys; sys.stderr.write({MARKER!r} + '\\n'); import " + ", ".join(modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    lines = completed.stderr.splitlines()
+    lines = lines[lines.index(MARKER) + 1:]
+
+    top_level = []
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two more spaces under the module that imported them
+        if name.startswith("   "):
+            continue
+        top_level.append((int(cumulative) / 1000.0, name.strip()))
+    return sum(ms for ms, _ in top_level), top_level
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check cold-start import time against a budget")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Budget per entry path")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry path (best run counts)")
+    parser.add_argument("--verbose", action="store_true", help="Show the slowest top-level imports")
+    args = parser.parse_args()
+
+    failed = False
+    for path, modules in ENTRY_PATHS.items():
+        runs = [measure(modules) for _ in range(args.runs)]
+        total, top_level = min(runs, key=lambda run: run[0])
+        within = total <= args.budget_ms
+        failed = failed or not within
+        print(f"{path:>4}: {total:7.1f} ms (budget {args.budget_ms:.0f} ms) {'ok' if within else 'OVER BUDGET'}")
+        if args.verbose:
+            for ms, name in sorted(top_level, reverse=True)[:10]:
+                print(f"        {ms:7.1f} ms  {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
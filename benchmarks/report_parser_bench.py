@@ -0,0 +1,131 @@
+# benchmarks/report_parser_bench.py
+"""
+Section parser benchmark.
+
+Compares ReportParser.extract_sections with the previous implementation (one
+regex search per section) on reports grown to several sizes, after checking
+that both return the same sections. "complete" reports have every header
+near the top; "sparse" reports (long records) lack some headers, which the
+previous implementation searched the whole text for:
+
+    python benchmarks/report_parser_bench.py
+    python benchmarks/report_parser_bench.py --sizes-kb 50 200 800 --runs 3
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Sequence
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from services.report_parser import COMMON_SECTIONS, ReportParser  # noqa: E402
+
+SAMPLE_REPORT = os.path.join(ROOT_DIR, "data", "sample_reports", "sample_medical_report.txt")
+
+FILLER_WORDS = (
+    "patient reports intermittent pain with nausea and fatigue over several weeks "
+    "blood pressure stable heart rate regular no acute distress noted on exam "
+    "follow up planned after imaging results and lab work are reviewed"
+).split()
+
+
+def legacy_extract_sections(report_text: str) -> Dict[str, str]:
+    """The previous implementation: one DOTALL search per section."""
+    sections = {}
+    for section in COMMON_SECTIONS:
+        pattern = rf"{section}:?\s*(.*?)(?=\n\n|\n[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*:|$)"
+        match = re.search(pattern, report_text, re.DOTALL | re.IGNORECASE)
+        if match:
+            sections[section] = match.group(1).strip()
+    if not sections:
+        sections["Full Report"] = report_text
+    return sections
+
+
+def make_report(size: int, seed: int, headers: Sequence[str] = COMMON_SECTIONS) -> str:
+    """Grow a report to about size characters from free-text notes under the given headers."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(5, 60))]
+        part = " ".join(words).capitalize() + rng.choice([".", ",", ";", ""])
+        if rng.random() < 0.3:
+            part = f"{rng.choice(headers)}:{rng.choice([' ', chr(10)])}{part}"
+        parts.append(part)
+        length += len(part) + 2
+    return rng.choice(["\n\n", "\n"]).join(parts)
+
+
+def sized_reports(size: int) -> Dict[str, str]:
+    """A complete and a sparse report of about size characters."""
+    with open(SAMPLE_REPORT, "r", encoding="utf-8") as file:
+        sample = file.read()
+    sparse_headers = [section for section in COMMON_SECTIONS
+                      if section not in ("Assessment", "Plan", "Recommendations", "Follow-up")]
+    return {
+        "complete": make_report(size, seed=size),
+        "sparse": sample + "\n\n" + make_report(size, seed=size, headers=sparse_headers)
+    }
+
+
+def edge_cases() -> List[str]:
+    """Short reports exercising header and section-end corner cases."""
+    return [
+        "",
+        "no sections here",
+        "Chief Complaint:",
+        "Chief Complaint:   \n",
+        "chief complaint: lowercase header\nnext line",
+        "Personal Medical History: asthma\nMedical History: none",
+        "The average agent\nGender: F\nAge 40\n",
+        "Plan\n\nSecond paragraph",
+        "Assessment: fine\nVital Signs Stable: yes\nmore",
+        "Name: A\n\n\nLab Results:\n\n  value 5\nNotes:\nx\n",
+        "PATIENT ID: 7\nA b: c\nAb cd: e",
+        "Chief Complaint: dizzine\u017f\u017f\nDate of Report: today\n\u0130\u0131 Notes: x",
+        "Patient IDate of Report: now\nFollow-uPlan: none",
+        "Medical Histor\u0130 Personal Medical History: copd",
+    ]
+
+
+def best_time(fn: Callable[[str], Dict[str, str]], report: str, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(report)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ReportParser.extract_sections")
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[2, 50, 200, 500], help="Report sizes to time")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per size (best run counts)")
+    parser.add_argument("--check-reports", type=int, default=200, help="Random reports compared with the old parser")
+    args = parser.parse_args()
+
+    reports = edge_cases() + [make_report(random.Random(seed).randint(100, 20000), seed)
+                              for seed in range(args.check_reports)]
+    reports += [report for size_kb in args.sizes_kb for report in sized_reports(size_kb * 1024).values()]
+    mismatches = sum(1 for report in reports
+                     if ReportParser.extract_sections(report) != legacy_extract_sections(report))
+    print(f"checked {len(reports)} reports against the previous parser: {mismatches} mismatches")
+    if mismatches:
+        return 1
+
+    for size_kb in args.sizes_kb:
+        for shape, report in sized_reports(size_kb * 1024).items():
+            old = best_time(legacy_extract_sections, report, args.runs)
+            new = best_time(ReportParser.extract_sections, report, args.runs)
+            print(f"{size_kb:>5} KB {shape:<8}: previous {old * 1000:9.2f} ms  current {new * 1000:8.2f} ms  "
+                  f"speedup {old / new:6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# benchmarks/symptom_matcher_bench.py
+"""
+Symptom extraction benchmark.
+
+Compares ReportParser.extract_symptoms, which finds every symptom term in one
+pass with services.term_matcher.TermMatcher, with the previous implementation
+(two regex scans of the chief complaint per term), after checking that both
+return the same symptoms. Vocabularies are grown with generated terms to show
+how each scales with the number of terms:
+
+    python benchmarks/symptom_matcher_bench.py
+    python benchmarks/symptom_matcher_bench.py --terms 24 500 5000 --complaint-kb 4
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from typing import Callable, List, Sequence
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from services.report_parser import SYMPTOM_TERMS, ReportParser  # noqa: E402
+from services.term_matcher import TermMatcher  # noqa: E402
+
+FILLER_WORDS = (
+    "patient reports intermittent painful episodes with headaches worse at night "
+    "and ongoing rashes on the arms since last week mild morning stiffness noted"
+).split()
+
+
+def legacy_extract_symptoms(complaint_text: str, symptom_terms: Sequence[str] = SYMPTOM_TERMS) -> List[str]:
+    """The previous implementation, applied to the chief complaint."""
+    symptoms = []
+    for term in symptom_terms:
+        if re.search(rf"\b{term}\b", complaint_text, re.IGNORECASE):
+            matches = re.finditer(rf"[^.;,]*\b{term}\b[^.;,]*", complaint_text, re.IGNORECASE)
+            for match in matches:
+                symptom = match.group(0).strip()
+                if symptom and len(symptom) > len(term):
+                    symptoms.append(symptom)
+                else:
+                    symptoms.append(term)
+    return list(dict.fromkeys(symptoms))
+
+
+def current_extract_symptoms(complaint_text: str) -> List[str]:
+    return ReportParser.extract_symptoms(f"Chief Complaint: {complaint_text}")
+
+
+def make_complaint(size: int, seed: int, terms: Sequence[str] = SYMPTOM_TERMS) -> str:
+    """Grow a chief complaint to about size characters, mixing symptom terms into filler."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    length = 0
+    while length < size:
+        words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(0, 8))]
+        for _ in range(rng.randint(0, 2)):
+            term = rng.choice(terms)
+            words.insert(rng.randint(0, len(words)), rng.choice([term, term.upper(), term.capitalize()]))
+        part = " ".join(words) + rng.choice([".", ",", ";", " and", ""])
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts).strip()
+
+
+def vocabulary(size: int) -> List[str]:
+    """The built-in terms followed by generated two-word terms, size in all."""
+    rng = random.Random(size)
+    extra = [f"{rng.choice(FILLER_WORDS)} {''.join(rng.choice('aeioubcdfgklmnprst') for _ in range(6))}"
+             for _ in range(max(0, size - len(SYMPTOM_TERMS)))]
+    return list(SYMPTOM_TERMS) + extra
+
+
+def best_time(fn: Callable[[str], List[str]], text: str, runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark symptom extraction")
+    parser.add_argument("--terms", type=int, nargs="+", default=[24, 200, 2000], help="Vocabulary sizes to time")
+    parser.add_argument("--complaint-kb", type=float, default=2, help="Chief complaint size")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per size (best run counts)")
+    parser.add_argument("--check-complaints", type=int, default=500, help="Random complaints compared with the old code")
+    args = parser.parse_args()
+
+    complaints = ["", "pain", "Headache, ache; painful", "chest pain, CHEST PAIN.", "fever,fever"]
+    complaints += [make_complaint(random.Random(seed).randint(1, 600), seed) for seed in range(args.check_complaints)]
+    mismatches = sum(1 for complaint in complaints
+                     if current_extract_symptoms(complaint) != legacy_extract_symptoms(complaint))
+    print(f"checked {len(complaints)} complaints against the previous code: {mismatches} mismatches")
+    if mismatches:
+        return 1
+
+    complaint = make_complaint(int(args.complaint_kb * 1024), seed=0)
+    for size in args.terms:
+        terms = vocabulary(size)
+        start = time.perf_counter()
+        matcher = TermMatcher(terms)
+        build = time.perf_counter() - start
+        old = best_time(lambda text: legacy_extract_symptoms(text, terms), complaint, args.runs)
+        new = best_time(matcher.phrases, complaint, args.runs)
+        print(f"{size:>6} terms: previous {old * 1000:9.2f} ms  current {new * 1000:8.2f} ms  "
+              f"speedup {old / new:7.1f}x  (automaton built in {build * 1000:.1f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,162 @@
 # config/settings.py
+#
+# Settings are resolved on first access (PEP 562 module __getattr__), so
+# importing this module is free and the .env file is only read once a
+# setting is actually needed. Modules therefore import the module itself
+# (`from config import settings`) and read `settings.NAME` where the value
+# is used; `from config.settings import NAME` at module level would resolve
+# every setting at import time. Directories are created by
+# ensure_directories() when something is about to be written.
 import os
-from dotenv import load_dotenv
+import threading
 
-# Load environment variables
-load_dotenv()
+_resolved = False
+_resolve_lock = threading.Lock()
 
-# API settings
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
 
-# Application settings
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-MAX_WORKERS = int(os.getenv("MAX_WORKERS", 3))
+def _settings() -> dict:
+    """Load environment variables and compute every setting."""
+    from dotenv import load_dotenv
+    
+    # Load environment variables
+    load_dotenv()
+    
+    # API settings
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    GROQ_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-scout-17b-16e-instruct")
+    
+    # Application settings
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    MAX_WORKERS = int(os.getenv("MAX_WORKERS", 3))
+    
+    # Rate limiting (MAX_WORKERS is the starting concurrency; the governor adapts it)
+    GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+    GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", 30000))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+    LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", 5))
+    
+    # Retries, hedging and deadlines for LLM calls (a deadline of 0 means none)
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+    LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+    LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 8.0))
+    LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+    LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", 0))
+    
+    # Model routing (calls are routed across these backends by observed latency and error rate)
+    GROQ_FALLBACK_MODELS = [m.strip() for m in os.getenv("GROQ_FALLBACK_MODELS", "").split(",") if m.strip()]
+    LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL")
+    LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3.1")
+    LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY")
+    
+    # Shared LLM clients (idle connections are kept alive for reuse; idle services are evicted from the pool)
+    LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", 20))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 120))
+    LLM_CLIENT_IDLE_SECONDS = float(os.getenv("LLM_CLIENT_IDLE_SECONDS", 1800))
+    LLM_PREWARM = os.getenv("LLM_PREWARM", "true").lower() in ("1", "true", "yes")
+    
+    # Maximum number of reusable agent instances kept by AgentFactory
+    AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", 64))
+    
+    # Ask for every specialist assessment in one JSON request instead of one request per specialist
+    SPECIALIST_PANEL_MODE = os.getenv("SPECIALIST_PANEL_MODE", "false").lower() in ("1", "true", "yes")
+    
+    # Most completion tokens a model accepts per request ("model=tokens,..." overrides the default per model);
+    # the specialist panel's combined budget is clamped to it
+    LLM_MAX_COMPLETION_TOKENS = int(os.getenv("LLM_MAX_COMPLETION_TOKENS", 8192))
+    LLM_MODEL_MAX_COMPLETION_TOKENS = {
+        model.strip(): int(tokens)
+        for model, _, tokens in (entry.partition("=") for entry in os.getenv("LLM_MODEL_MAX_COMPLETION_TOKENS", "").split(","))
+        if model.strip() and tokens.strip()
+    }
+    
+    # With more specialist reports than this, the team merges them in groups of this size first (0 disables)
+    TEAM_GROUP_SIZE = int(os.getenv("TEAM_GROUP_SIZE", 6))
+    
+    # Send the team only the differentials, findings and next steps extracted from each specialist report
+    CONDENSE_SPECIALIST_REPORTS = os.getenv("CONDENSE_SPECIALIST_REPORTS", "true").lower() in ("1", "true", "yes")
+    CONDENSE_STRUCTURED = os.getenv("CONDENSE_STRUCTURED", "false").lower() in ("1", "true", "yes")
+    
+    # Local triage: skip selected specialists whose keyword relevance score is below the threshold
+    TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    TRIAGE_THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", 3.0))
+    TRIAGE_ALWAYS_INCLUDE = [t.strip().lower() for t in os.getenv("TRIAGE_ALWAYS_INCLUDE", "").split(",") if t.strip()]
+    
+    # Background analysis jobs (the app enqueues them; `python -m medical_agents.worker` runs them)
+    BACKGROUND_JOBS = os.getenv("BACKGROUND_JOBS", "false").lower() in ("1", "true", "yes")
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 120))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1.0))
+    
+    # HTTP API (`python -m medical_agents.server`); analyses over the LLM concurrency limit wait in a bounded queue
+    API_HOST = os.getenv("API_HOST", "127.0.0.1")
+    API_PORT = int(os.getenv("API_PORT", 8000))
+    API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", 32))
+    API_ADMISSION_TIMEOUT = float(os.getenv("API_ADMISSION_TIMEOUT", 30))
+    
+    # Reports per task when `python -m medical_agents.corpus` parses a corpus across processes
+    CORPUS_CHUNK_SIZE = int(os.getenv("CORPUS_CHUNK_SIZE", 500))
+    
+    # Separator between reports in a file holding several (regular expression, matched line by line):
+    # by default a form feed at the start of a line. A single report may underline its headings, so a
+    # line of "=" only separates reports when set explicitly, e.g. REPORT_DELIMITER=^={5,}[ \t]*\r?$
+    REPORT_DELIMITER = os.getenv("REPORT_DELIMITER", r"^\f")
+    
+    # File paths
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+    DATA_DIR = os.path.join(BASE_DIR, "data")
+    REPORTS_DIR = os.path.join(DATA_DIR, "sample_reports")
+    RESULTS_DIR = os.path.join(DATA_DIR, "results")
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs", "jobs.sqlite3"))
+    
+    # Seconds between checks for edited prompt templates (0 disables hot reload)
+    TEMPLATE_RELOAD_INTERVAL = float(os.getenv("TEMPLATE_RELOAD_INTERVAL", 2.0))
+    
+    # Response cache settings
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "cache", "llm_responses.sqlite3"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 256))
+    LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", 10000))
+    # Calls with a temperature above this are sampled afresh instead of served from the cache
+    LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.5))
+    
+    # Symptom vocabulary (one term per line, optional tab-separated label); empty uses the built-in terms
+    SYMPTOM_VOCABULARY_PATH = os.getenv("SYMPTOM_VOCABULARY_PATH", "")
+    # Compiled vocabularies are saved here and reused while the vocabulary file is unchanged
+    TERM_AUTOMATON_CACHE_DIR = os.getenv("TERM_AUTOMATON_CACHE_DIR", os.path.join(DATA_DIR, "cache", "term_automata"))
+    # Lab reference ranges (CSV with analyte, unit, low, high[, aliases, specialty]); empty uses the built-in table
+    LAB_REFERENCE_PATH = os.getenv("LAB_REFERENCE_PATH", "")
+    
+    return {name: value for name, value in locals().items() if name.isupper()}
 
-# File paths
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
-DATA_DIR = os.path.join(BASE_DIR, "data")
-REPORTS_DIR = os.path.join(DATA_DIR, "sample_reports")
-RESULTS_DIR = os.path.join(DATA_DIR, "results")
 
-# Ensure directories exist
-os.makedirs(REPORTS_DIR, exist_ok=True)
-os.makedirs(RESULTS_DIR, exist_ok=True)
\ No newline at end of file
+def _resolve() -> None:
+    global _resolved
+    with _resolve_lock:
+        if not _resolved:
+            globals().update(_settings())
+            _resolved = True
+
+
+def __getattr__(name: str):
+    # Only called for names not yet in the module namespace
+    if name.isupper() and not _resolved:
+        _resolve()
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    _resolve()
+    return list(globals())
+
+
+def ensure_directories() -> None:
+    """Create the data directories the app writes to."""
+    _resolve()
+    for name in ("REPORTS_DIR", "RESULTS_DIR"):
+        os.makedirs(globals()[name], exist_ok=True)
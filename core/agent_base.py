@@ -1,34 +1,44 @@
 # core/agent_base.py
-import os
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Iterator, AsyncIterator, Union
 
-from services.llm_service import LLMService
-from config.settings import TEMPLATES_DIR
+from services.llm_service import LLMService, iterate_in_background_loop, run_in_background_loop
+from services.llm_router import RoutingPolicy
+from services.client_pool import get_llm_service
+from services.report_parser import ParsedReport
+from core.template_registry import CompiledTemplate, get_template_registry
 
 logger = logging.getLogger(__name__)
 
 class BaseAgent(ABC):
     """Abstract base class for medical specialty agents."""
     
+    # Placeholders every prompt template for this agent must contain
+    REQUIRED_PLACEHOLDERS = ("medical_report",)
+    
     def __init__(self, 
                  llm_service: Optional[LLMService] = None,
                  temperature: float = 0.2,
-                 max_tokens: int = 1024):
+                 max_tokens: int = 1024,
+                 routing_policy: Optional[RoutingPolicy] = None):
         """
         Initialize the base agent.
         
         Args:
-            llm_service: LLM service for generating responses
+            llm_service: LLM service for generating responses (defaults to the pooled one)
             temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
             max_tokens: Maximum tokens in the response
+            routing_policy: Backend routing for this agent when no llm_service is given
+                (the pooled service for that policy is used; defaults to settings)
         """
-        self.llm_service = llm_service or LLMService()
+        self.llm_service = llm_service or get_llm_service(routing_policy=routing_policy)
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.role = self._get_role()
-        self.prompt_template = self._load_prompt_template()
+        # Fail at construction rather than at request time if no usable template exists
+        self._load_prompt_template()
         
         logger.info(f"Initialized {self.role} agent")
     
@@ -37,15 +47,18 @@ class BaseAgent(ABC):
         """Return the role/specialty of this agent."""
         pass
     
-    def _load_prompt_template(self) -> str:
-        """Load the prompt template for this agent."""
-        template_path = os.path.join(TEMPLATES_DIR, f"{self._get_role().lower()}_prompt.txt")
-        try:
-            with open(template_path, 'r') as file:
-                return file.read()
-        except FileNotFoundError:
-            logger.warning(f"Prompt template not found for {self.role} at {template_path}")
-            return self._get_default_prompt_template()
+    def _load_prompt_template(self) -> CompiledTemplate:
+        """Look up the compiled prompt template for this agent in the shared registry."""
+        return get_template_registry().get(
+            self._get_role(),
+            default=self._get_default_prompt_template(),
+            required=self.REQUIRED_PLACEHOLDERS
+        )
+    
+    @property
+    def prompt_template(self) -> CompiledTemplate:
+        """The current prompt template (picks up edits to the template file)."""
+        return self._load_prompt_template()
     
     def _get_default_prompt_template(self) -> str:
         """Return a default prompt template if no file is found."""
@@ -58,28 +71,59 @@ class BaseAgent(ABC):
         Patient Report: {{medical_report}}
         """
     
-    def format_prompt(self, medical_report: str, **kwargs) -> str:
+    def format_prompt(self, medical_report: Union[str, ParsedReport], **kwargs) -> str:
         """
         Format the prompt template with the medical report and other arguments.
         
         Args:
-            medical_report: The patient's medical report
+            medical_report: The patient's medical report (text or ParsedReport)
             **kwargs: Additional arguments to format into the prompt
-            
+        
         Returns:
             Formatted prompt string
         """
-        context = {"medical_report": medical_report, **kwargs}
+        context = {"medical_report": str(medical_report), **kwargs}
         return self.prompt_template.format(**context)
     
-    def analyze(self, medical_report: str, **kwargs) -> str:
+    def analyze(self, medical_report: Union[str, ParsedReport], **kwargs) -> str:
         """
         Analyze the medical report and generate recommendations.
         
+        Blocking wrapper around analyze_async; the call runs on the shared
+        background event loop.
+        
+        Args:
+            medical_report: The patient's medical report
+            **kwargs: Additional arguments to pass to the formatter
+        
+        Returns:
+            Analysis results
+        """
+        return run_in_background_loop(self.analyze_async(medical_report, **kwargs))
+    
+    def analyze_stream(self, medical_report: Union[str, ParsedReport], **kwargs) -> Iterator[str]:
+        """
+        Analyze the medical report, yielding the response as it is generated.
+        
+        Blocking wrapper around analyze_stream_async.
+        
+        Args:
+            medical_report: The patient's medical report
+            **kwargs: Additional arguments to pass to the formatter
+        
+        Returns:
+            Iterator of text deltas of the analysis (an error message if the call fails)
+        """
+        return iterate_in_background_loop(self.analyze_stream_async(medical_report, **kwargs))
+    
+    async def analyze_async(self, medical_report: Union[str, ParsedReport], **kwargs) -> str:
+        """
+        Analyze the medical report without blocking the event loop.
+        
         Args:
             medical_report: The patient's medical report
             **kwargs: Additional arguments to pass to the formatter
-            
+        
         Returns:
             Analysis results
         """
@@ -87,7 +131,7 @@ class BaseAgent(ABC):
         prompt = self.format_prompt(medical_report, **kwargs)
         
         try:
-            response = self.llm_service.generate_response(
+            response = await self.llm_service.generate_response_async(
                 prompt=prompt,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens
@@ -96,4 +140,59 @@ class BaseAgent(ABC):
             return response
         except Exception as e:
             logger.error(f"Error in {self.role} agent analysis: {str(e)}")
-            return f"Error during {self.role} analysis: {str(e)}"
\ No newline at end of file
+            return f"Error during {self.role} analysis: {str(e)}"
+    
+    async def analyze_stream_async(self, medical_report: Union[str, ParsedReport], **kwargs) -> AsyncIterator[str]:
+        """
+        Analyze the medical report without blocking the event loop, yielding the response as it is generated.
+        
+        Args:
+            medical_report: The patient's medical report
+            **kwargs: Additional arguments to pass to the formatter
+        
+        Yields:
+            Text deltas of the analysis (an error message if the call fails)
+        """
+        logger.info(f"{self.role} agent streaming analysis")
+        prompt = self.format_prompt(medical_report, **kwargs)
+        
+        try:
+            async for delta in self.llm_service.stream_async(
+                prompt=prompt,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            ):
+                yield delta
+            logger.info(f"{self.role} agent completed analysis")
+        except Exception as e:
+            logger.error(f"Error in {self.role} agent analysis: {str(e)}")
+            yield f"Error during {self.role} analysis: {str(e)}"
+
+
+async def analyze_all_async(agents: Dict[str, BaseAgent],
+                            medical_report: Union[str, ParsedReport],
+                            max_concurrency: Optional[int] = None,
+                            **kwargs) -> Dict[str, str]:
+    """
+    Run several agents on the same report concurrently on one event loop.
+    
+    Args:
+        agents: Dictionary mapping specialist names to agent instances
+        medical_report: The patient's medical report
+        max_concurrency: Optional cap on requests in flight (None = unbounded)
+        **kwargs: Additional arguments to pass to each agent's formatter
+    
+    Returns:
+        Dictionary mapping specialist names to their analysis, in the order given
+    """
+    semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+    
+    async def run(agent: BaseAgent) -> str:
+        if semaphore is None:
+            return await agent.analyze_async(medical_report, **kwargs)
+        async with semaphore:
+            return await agent.analyze_async(medical_report, **kwargs)
+    
+    names = list(agents.keys())
+    results = await asyncio.gather(*(run(agents[name]) for name in names))
+    return dict(zip(names, results))
\ No newline at end of file
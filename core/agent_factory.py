@@ -1,35 +1,217 @@
 # core/agent_factory.py
 import logging
-from typing import Dict, Type, Optional
+import importlib
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, Tuple, Type, Optional, Union
 
 from core.agent_base import BaseAgent
-from agents.cardiologist import Cardiologist
-from agents.psychologist import Psychologist
-from agents.pulmonologist import Pulmonologist
+from core.multidisciplinary_team import MultidisciplinaryTeam
 from services.llm_service import LLMService
+from services.llm_router import RoutingPolicy
+from services.client_pool import get_llm_service
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+TEAM_AGENT_TYPE = "multidisciplinaryteam"
+
+# Installed packages can contribute agents through this entry-point group, e.g.
+#   [project.entry-points."medical_agents.agents"]
+#   neurologist = "my_package.neurologist:Neurologist"
+AGENT_ENTRY_POINT_GROUP = "medical_agents.agents"
+
+
+class LazyAgentRegistry(MutableMapping):
+    """
+    Agent types mapped to their classes, imported only when first requested.
+    
+    Values may be agent classes or "module:ClassName" import paths. Agents
+    published under the AGENT_ENTRY_POINT_GROUP entry points are discovered
+    the first time the registry is listed or an unknown type is looked up;
+    their modules, too, are only imported when that type is requested.
+    """
+    
+    def __init__(self, entries: Dict[str, Union[str, Type[BaseAgent]]], entry_point_group: str = AGENT_ENTRY_POINT_GROUP):
+        """
+        Initialize the registry.
+        
+        Args:
+            entries: Agent types mapped to classes or "module:ClassName" paths
+            entry_point_group: Entry-point group to discover more agents from (None to disable)
+        """
+        self._entries: Dict[str, Any] = {key.lower(): value for key, value in entries.items()}
+        self._entry_point_group = entry_point_group
+        self._discovered = entry_point_group is None
+        self._lock = threading.Lock()
+    
+    def _discover(self) -> None:
+        """Add the entry-point agents (without loading them) on first use."""
+        if self._discovered:
+            return
+        with self._lock:
+            if self._discovered:
+                return
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=self._entry_point_group)
+            except TypeError:
+                # Python < 3.10 returns a dict of groups
+                found = entry_points().get(self._entry_point_group, [])
+            for entry_point in found:
+                # Built-in and explicitly registered agents take precedence
+                self._entries.setdefault(entry_point.name.lower(), entry_point)
+            self._discovered = True
+    
+    def __getitem__(self, agent_type: str) -> Type[BaseAgent]:
+        agent_type = agent_type.lower()
+        if agent_type not in self._entries:
+            self._discover()
+        value = self._entries[agent_type]
+        if isinstance(value, type):
+            return value
+        
+        if isinstance(value, str):
+            module_name, _, class_name = value.partition(":")
+            agent_class = getattr(importlib.import_module(module_name), class_name)
+        else:
+            agent_class = value.load()
+        if not (isinstance(agent_class, type) and issubclass(agent_class, BaseAgent)):
+            raise TypeError(f"Agent type {agent_type} does not resolve to a BaseAgent subclass: {value}")
+        self._entries[agent_type] = agent_class
+        logger.debug(f"Loaded agent type {agent_type}")
+        return agent_class
+    
+    def __setitem__(self, agent_type: str, agent_class: Union[str, Type[BaseAgent]]) -> None:
+        self._entries[agent_type.lower()] = agent_class
+    
+    def __delitem__(self, agent_type: str) -> None:
+        del self._entries[agent_type.lower()]
+    
+    def __contains__(self, agent_type: object) -> bool:
+        # Membership must not import the agent
+        if not isinstance(agent_type, str):
+            return False
+        if agent_type.lower() not in self._entries:
+            self._discover()
+        return agent_type.lower() in self._entries
+    
+    def __iter__(self) -> Iterator[str]:
+        self._discover()
+        return iter(list(self._entries))
+    
+    def __len__(self) -> int:
+        self._discover()
+        return len(self._entries)
+
+
+class AgentPool:
+    """
+    Bounded LRU pool of ready-to-use agents.
+    
+    Agents hold no per-request state, so one instance per (agent type,
+    temperature, max tokens, LLM service) can serve any number of requests
+    and threads. The least recently used agent is dropped when the pool is full.
+    """
+    
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        Initialize the pool.
+        
+        Args:
+            max_size: Maximum number of pooled agents (defaults to AGENT_POOL_SIZE)
+        """
+        # Read from settings on first use: AgentFactory builds its pool at import time
+        self._max_size = max_size
+        self._agents: "OrderedDict[Tuple[Hashable, ...], BaseAgent]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+    
+    @property
+    def max_size(self) -> int:
+        """Maximum number of pooled agents."""
+        return settings.AGENT_POOL_SIZE if self._max_size is None else self._max_size
+    
+    def get(self, key: Tuple[Hashable, ...], build: Callable[[], BaseAgent]) -> BaseAgent:
+        """
+        Return the pooled agent for a key, building it on a miss.
+        
+        Args:
+            key: Identifies interchangeable agents; the first element is the agent type
+            build: Creates the agent
+        
+        Returns:
+            The pooled agent
+        """
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+                self._counters["hits"] += 1
+                return agent
+            self._counters["misses"] += 1
+        
+        # Built outside the lock; if two threads race, both agents work and the last one is kept
+        agent = build()
+        with self._lock:
+            self._agents[key] = agent
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_size:
+                self._agents.popitem(last=False)
+                self._counters["evictions"] += 1
+        return agent
+    
+    def discard(self, agent_type: str) -> None:
+        """Drop every pooled agent of a type (e.g. after its class was re-registered)."""
+        with self._lock:
+            for key in [key for key in self._agents if key[0] == agent_type]:
+                del self._agents[key]
+    
+    def clear(self) -> None:
+        """Drop every pooled agent."""
+        with self._lock:
+            self._agents.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return pool counters.
+        
+        Returns:
+            Dictionary with hits, misses, evictions, pooled agents and hit rate
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pooled"] = len(self._agents)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
 class AgentFactory:
     """Factory for creating different types of medical specialist agents."""
     
-    # Registry of available agent types
-    AGENT_REGISTRY: Dict[str, Type[BaseAgent]] = {
-        "cardiologist": Cardiologist,
-        "psychologist": Psychologist,
-        "pulmonologist": Pulmonologist,
-    }
+    # Registry of available agent types (modules are imported on first use)
+    AGENT_REGISTRY = LazyAgentRegistry({
+        "cardiologist": "agents.cardiologist:Cardiologist",
+        "psychologist": "agents.psychologist:Psychologist",
+        "pulmonologist": "agents.pulmonologist:Pulmonologist",
+    })
+    
+    # Reusable agents shared by every caller of get_agent / get_team
+    pool = AgentPool()
     
     @classmethod
-    def register_agent(cls, agent_type: str, agent_class: Type[BaseAgent]) -> None:
+    def register_agent(cls, agent_type: str, agent_class: Union[str, Type[BaseAgent]]) -> None:
         """
         Register a new agent type.
         
         Args:
             agent_type: Lowercase string identifier for the agent type
-            agent_class: The agent class to register
+            agent_class: The agent class to register, or its "module:ClassName" path to import lazily
         """
         cls.AGENT_REGISTRY[agent_type.lower()] = agent_class
+        cls.pool.discard(agent_type.lower())
         logger.info(f"Registered new agent type: {agent_type}")
     
     @classmethod
@@ -37,19 +219,21 @@ class AgentFactory:
                     agent_type: str, 
                     llm_service: Optional[LLMService] = None,
                     temperature: float = 0.2,
-                    max_tokens: int = 1024) -> BaseAgent:
+                    max_tokens: int = 1024,
+                    routing_policy: Optional[RoutingPolicy] = None) -> BaseAgent:
         """
         Create an agent of the specified type.
         
         Args:
             agent_type: Type of agent to create (must be in AGENT_REGISTRY)
-            llm_service: LLM service to use (will create one if None)
+            llm_service: LLM service to use (the pooled one if None)
             temperature: LLM temperature setting
             max_tokens: LLM max tokens setting
-            
+            routing_policy: Backend routing when no llm_service is given (the pooled service for that policy)
+        
         Returns:
             Initialized agent instance
-            
+        
         Raises:
             ValueError: If agent_type is not registered
         """
@@ -59,12 +243,71 @@ class AgentFactory:
         
         agent_class = cls.AGENT_REGISTRY[agent_type]
         
-        # Create a shared LLM service if one wasn't provided
+        # Use the pooled LLM service (one per routing policy) if one wasn't provided
         if llm_service is None:
-            llm_service = LLMService()
-            
+            llm_service = get_llm_service(routing_policy=routing_policy)
+        
         return agent_class(
             llm_service=llm_service,
             temperature=temperature,
             max_tokens=max_tokens
-        )
\ No newline at end of file
+        )
+    
+    @classmethod
+    def get_agent(cls,
+                  agent_type: str,
+                  llm_service: Optional[LLMService] = None,
+                  temperature: float = 0.2,
+                  max_tokens: int = 1024,
+                  routing_policy: Optional[RoutingPolicy] = None) -> BaseAgent:
+        """
+        Return a pooled agent of the specified type, creating it only on first use.
+        
+        Args:
+            agent_type: Type of agent (must be in AGENT_REGISTRY)
+            llm_service: LLM service to use (the pooled one if None)
+            temperature: LLM temperature setting
+            max_tokens: LLM max tokens setting
+            routing_policy: Backend routing when no llm_service is given (defaults to settings)
+        
+        Returns:
+            Shared agent instance
+        
+        Raises:
+            ValueError: If agent_type is not registered
+        """
+        agent_type = agent_type.lower()
+        if agent_type not in cls.AGENT_REGISTRY:
+            raise ValueError(f"Unknown agent type: {agent_type}. Available types: {', '.join(cls.AGENT_REGISTRY.keys())}")
+        llm_service = llm_service or get_llm_service(routing_policy=routing_policy)
+        return cls.pool.get(
+            (agent_type, temperature, max_tokens, llm_service),
+            lambda: cls.create_agent(agent_type, llm_service=llm_service, temperature=temperature, max_tokens=max_tokens)
+        )
+    
+    @classmethod
+    def get_team(cls,
+                 llm_service: Optional[LLMService] = None,
+                 temperature: float = 0.2,
+                 max_tokens: int = 1024,
+                 routing_policy: Optional[RoutingPolicy] = None) -> MultidisciplinaryTeam:
+        """
+        Return a pooled multidisciplinary team agent.
+        
+        The specialist reports are passed to each analyze call rather than
+        to the constructor, so one team instance serves every request.
+        
+        Args:
+            llm_service: LLM service to use (the pooled one if None)
+            temperature: LLM temperature setting
+            max_tokens: LLM max tokens setting
+            routing_policy: Backend routing when no llm_service is given (defaults to settings)
+        
+        Returns:
+            Shared MultidisciplinaryTeam instance
+        """
+        llm_service = llm_service or get_llm_service(routing_policy=routing_policy)
+        return cls.pool.get(
+            (TEAM_AGENT_TYPE, temperature, max_tokens, llm_service),
+            lambda: MultidisciplinaryTeam(llm_service=llm_service, temperature=temperature, max_tokens=max_tokens)
+        )
@@ -0,0 +1,213 @@
+# core/condenser.py
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Categories kept from each specialist report, in the order they are sent to the team
+CATEGORIES = ("differentials", "findings", "next_steps")
+CATEGORY_TITLES = {"differentials": "Differentials", "findings": "Findings", "next_steps": "Next steps"}
+
+# Heading or label text that starts a block of each category; the earliest match in a label wins
+_CATEGORY_PATTERNS = {
+    "differentials": re.compile(
+        r"differential|diagnos|impression|"
+        r"\b(?:possible|potential|likely|probable)\b[^.]*?\b(?:issues?|causes?|conditions?|problems?|concerns?|disorders?)\b|"
+        r"\bhealth issues?\b",
+        re.IGNORECASE
+    ),
+    "findings": re.compile(
+        r"finding|observation|key points|summary|assessment|symptoms|results|evaluation|interpretation",
+        re.IGNORECASE
+    ),
+    "next_steps": re.compile(
+        r"recommend|next steps?|\bplan\b|follow[- ]?up|further (?:tests?|testing|evaluation)|"
+        r"additional tests?|treatment|management",
+        re.IGNORECASE
+    )
+}
+# Labels of asides that are dropped wherever they appear
+_ASIDE_LABEL = re.compile(r"^(?:note|disclaimer|caveat|important)\b", re.IGNORECASE)
+
+_MARKDOWN_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+# "**Heading:**" alone, or "**Label:** text" with content after it
+_BOLD_LABEL = re.compile(r"^\s*\*\*([^*]+?):?\*\*:?\s*(.*)$")
+_LIST_ITEM = re.compile(r"^(\s*)(?:[-*•+]|\d+[.)])\s+(.*)$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z(])")
+
+
+def _approx_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token, as the rate-limit governor assumes)."""
+    return len(text) // 4
+
+
+def _classify(label: str) -> Optional[str]:
+    """Return the category a heading or label introduces, or None."""
+    best, best_position = None, None
+    for category, pattern in _CATEGORY_PATTERNS.items():
+        match = pattern.search(label)
+        if match and (best_position is None or match.start() < best_position):
+            best, best_position = category, match.start()
+    return best
+
+
+def _clean(text: str) -> str:
+    """Drop markdown emphasis and collapse whitespace."""
+    return " ".join(text.replace("**", "").replace("__", "").split())
+
+
+class CondensationResult:
+    """Condensed specialist reports plus the token counts before and after."""
+    
+    def __init__(self, reports: Dict[str, str], original_tokens: int, condensed_tokens: int,
+                 uncondensed: List[str]):
+        self.reports = reports
+        self.original_tokens = original_tokens
+        self.condensed_tokens = condensed_tokens
+        self.uncondensed = uncondensed
+    
+    @property
+    def reduction(self) -> float:
+        """Fraction of the estimated input tokens removed (0.0 to 1.0)."""
+        if not self.original_tokens:
+            return 0.0
+        return 1.0 - self.condensed_tokens / self.original_tokens
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "original_tokens": self.original_tokens,
+            "condensed_tokens": self.condensed_tokens,
+            "reduction": round(self.reduction, 3),
+            "uncondensed": self.uncondensed
+        }
+
+
+class ReportCondenser:
+    """
+    Deterministically shortens specialist reports before the team synthesis.
+    
+    A report's markdown is split into blocks at headings, bold labels and
+    short lines ending with a colon. Blocks about differentials, findings
+    or next steps are kept; each list item or sentence in them is cut to
+    its first sentence and max_item_chars. Anything else (preamble,
+    caveats, repetition of the case) is dropped. A report in which nothing
+    can be recognized is passed through unchanged.
+    """
+    
+    def __init__(self, structured: bool = False, max_items: int = 8, max_item_chars: int = 160):
+        """
+        Initialize the condenser.
+        
+        Args:
+            structured: Emit each report as a JSON object of lists instead of headed bullet lists
+            max_items: Maximum items kept per category
+            max_item_chars: Maximum characters kept per item
+        """
+        self.structured = structured
+        self.max_items = max_items
+        self.max_item_chars = max_item_chars
+    
+    def _shorten(self, text: str) -> str:
+        """Keep a label plus the first sentence of its explanation, within max_item_chars."""
+        text = _clean(text)
+        text = _SENTENCE_END.split(text, maxsplit=1)[0]
+        if len(text) > self.max_item_chars:
+            text = text[:self.max_item_chars].rsplit(" ", 1)[0].rstrip(",;:") + "…"
+        return text
+    
+    def extract(self, report: str) -> Dict[str, List[str]]:
+        """
+        Pull the differentials, findings and next steps out of one report.
+        
+        Args:
+            report: A specialist's markdown assessment
+        
+        Returns:
+            Dictionary mapping each of CATEGORIES to its items (possibly empty)
+        """
+        extracted: Dict[str, List[str]] = {category: [] for category in CATEGORIES}
+        category: Optional[str] = None
+        
+        for line in report.splitlines():
+            if not line.strip():
+                continue
+            
+            heading = _MARKDOWN_HEADING.match(line)
+            bold = None if heading else _BOLD_LABEL.match(line)
+            if heading or (bold and not bold.group(2)):
+                # A heading that names no category ends the previous block
+                category = _classify((heading or bold).group(1))
+                continue
+            
+            item = _LIST_ITEM.match(line)
+            text = item.group(2) if item else line.strip()
+            if bold and not item:
+                label_category = _classify(bold.group(1))
+                if label_category is not None:
+                    category = label_category
+                    text = bold.group(2)
+                elif category is None or _ASIDE_LABEL.match(bold.group(1).strip()):
+                    continue
+            elif not item and text.endswith(":") and len(text) < 160:
+                # An introductory line ("potential issues to consider:") may switch the category
+                category = _classify(text) or category
+                continue
+            
+            if category is not None:
+                shortened = self._shorten(text)
+                if shortened and len(extracted[category]) < self.max_items:
+                    extracted[category].append(shortened)
+        return extracted
+    
+    def condense(self, report: str) -> Optional[str]:
+        """
+        Condense one report.
+        
+        Args:
+            report: A specialist's markdown assessment
+        
+        Returns:
+            The condensed text, or None if nothing could be extracted
+        """
+        extracted = self.extract(report)
+        if not any(extracted.values()):
+            return None
+        if self.structured:
+            return json.dumps({category: items for category, items in extracted.items() if items},
+                              ensure_ascii=False)
+        lines = []
+        for category, items in extracted.items():
+            if items:
+                lines.append(f"{CATEGORY_TITLES[category]}:")
+                lines.extend(f"- {item}" for item in items)
+        return "\n".join(lines)
+    
+    def condense_all(self, specialist_reports: Dict[str, str]) -> CondensationResult:
+        """
+        Condense every specialist report.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+        
+        Returns:
+            CondensationResult with the reports to send to the team and the token reduction
+        """
+        reports: Dict[str, str] = {}
+        uncondensed: List[str] = []
+        for role, report in specialist_reports.items():
+            condensed = self.condense(report)
+            if condensed is None or len(condensed) >= len(report):
+                uncondensed.append(role)
+                condensed = report
+            reports[role] = condensed
+        
+        result = CondensationResult(
+            reports,
+            original_tokens=sum(_approx_tokens(report) for report in specialist_reports.values()),
+            condensed_tokens=sum(_approx_tokens(report) for report in reports.values()),
+            uncondensed=uncondensed
+        )
+        logger.info(f"Condensed specialist reports: {result.to_dict()}")
+        return result
@@ -1,35 +1,69 @@
 # core/multidisciplinary_team.py
+import time
+import asyncio
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Iterator, AsyncIterator
 
-from services.llm_service import LLMService
+from services.llm_service import LLMService, iterate_in_background_loop, run_in_background_loop
+from services.llm_router import RoutingPolicy
 from core.agent_base import BaseAgent
-from config.settings import TEMPLATES_DIR
-import os
+from core.template_registry import CompiledTemplate, get_template_registry
+from config import settings
 
 logger = logging.getLogger(__name__)
 
+# Name of the prompt template for merging one group of reports (teampartialsynthesis_prompt.txt)
+PARTIAL_TEMPLATE_NAME = "TeamPartialSynthesis"
+
+DEFAULT_PARTIAL_PROMPT = """
+        Act like a multidisciplinary team of healthcare professionals reviewing part of a larger case conference.
+        You will receive assessments from a group of medical specialists about a patient case.
+        
+        Task: Merge these assessments into one concise summary that another team will combine with other groups' summaries.
+        Keep every finding, suspected condition, red flag and recommended test, and note which specialist raised it.
+        Note where the specialists agree or disagree. Do not make a final diagnosis.
+        
+        Specialists' Reports:
+        {specialist_reports}
+        """
+
+
 class MultidisciplinaryTeam(BaseAgent):
     """
     Agent that synthesizes assessments from multiple specialists.
+    
+    With more reports than group_size, the synthesis is hierarchical: the
+    reports are merged in groups of group_size, concurrently, and the final
+    synthesis works from the group summaries (repeating the step if there
+    are still too many). This keeps every prompt, and so the latency of the
+    final call, bounded as the number of specialists grows.
     """
     
+    REQUIRED_PLACEHOLDERS = ("specialist_reports",)
+    
     def __init__(self, 
-                 specialist_reports: Dict[str, str],
+                 specialist_reports: Optional[Dict[str, str]] = None,
                  llm_service: Optional[LLMService] = None,
                  temperature: float = 0.2,
-                 max_tokens: int = 1024):
+                 max_tokens: int = 1024,
+                 group_size: Optional[int] = None,
+                 routing_policy: Optional[RoutingPolicy] = None):
         """
         Initialize the multidisciplinary team agent.
         
         Args:
-            specialist_reports: Dictionary mapping specialist roles to their assessments
+            specialist_reports: Default reports for calls that don't pass their own
+                (prefer passing them per call so one instance can be reused)
             llm_service: LLM service for generating responses
             temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
             max_tokens: Maximum tokens in the response
+            group_size: Reports merged per partial synthesis, below 2 disabling hierarchical
+                synthesis (defaults to TEAM_GROUP_SIZE)
+            routing_policy: Backend routing for the team's calls when no llm_service is given
         """
         self.specialist_reports = specialist_reports
-        super().__init__(llm_service, temperature, max_tokens)
+        self.group_size = settings.TEAM_GROUP_SIZE if group_size is None else group_size
+        super().__init__(llm_service, temperature, max_tokens, routing_policy=routing_policy)
     
     def _get_role(self) -> str:
         return "MultidisciplinaryTeam"
@@ -48,33 +82,177 @@ class MultidisciplinaryTeam(BaseAgent):
         {specialist_reports}
         """
     
-    def format_prompt(self, **kwargs) -> str:
+    @property
+    def partial_template(self) -> CompiledTemplate:
+        """The prompt template for merging one group of reports."""
+        return get_template_registry().get(
+            PARTIAL_TEMPLATE_NAME,
+            default=DEFAULT_PARTIAL_PROMPT,
+            required=self.REQUIRED_PLACEHOLDERS
+        )
+    
+    def _reports(self, specialist_reports: Optional[Dict[str, str]]) -> Dict[str, str]:
+        if specialist_reports is None:
+            specialist_reports = self.specialist_reports
+        if specialist_reports is None:
+            raise ValueError("No specialist reports to synthesize")
+        return specialist_reports
+    
+    @staticmethod
+    def _join_reports(specialist_reports: Dict[str, str]) -> str:
+        # Format the specialist reports into a single string
+        specialist_text = ""
+        for role, report in specialist_reports.items():
+            specialist_text += f"\n\n{role} Report:\n{report}"
+        return specialist_text
+    
+    def format_prompt(self, specialist_reports: Optional[Dict[str, str]] = None, **kwargs) -> str:
         """
         Format the prompt with specialist reports.
         
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+                (defaults to the reports given to the constructor)
+        
         Returns:
             Formatted prompt string
         """
-        # Format the specialist reports into a single string
-        specialist_text = ""
-        for role, report in self.specialist_reports.items():
-            specialist_text += f"\n\n{role} Report:\n{report}"
-        
+        specialist_text = self._join_reports(self._reports(specialist_reports))
         context = {"specialist_reports": specialist_text, **kwargs}
         return self.prompt_template.format(**context)
     
-    def analyze(self, **kwargs) -> str:
+    def needs_grouping(self, count: int) -> bool:
+        """Whether count reports are too many for a single synthesis prompt."""
+        return self.group_size >= 2 and count > self.group_size
+    
+    def group(self, names: List[str]) -> List[List[str]]:
+        """
+        Split specialist names into the groups merged by each partial synthesis.
+        
+        Args:
+            names: Specialist names in report order
+        
+        Returns:
+            Consecutive groups of at most group_size names
+        """
+        size = max(self.group_size, 2)
+        return [names[i:i + size] for i in range(0, len(names), size)]
+    
+    def _partial_prompt(self, specialist_reports: Dict[str, str]) -> str:
+        return self.partial_template.format(specialist_reports=self._join_reports(specialist_reports))
+    
+    @staticmethod
+    def _partial_label(specialist_reports: Dict[str, str]) -> str:
+        return f"Group Summary ({', '.join(specialist_reports)})"
+    
+    def synthesize_group(self, specialist_reports: Dict[str, str]) -> Dict[str, str]:
+        """Blocking wrapper around synthesize_group_async."""
+        return run_in_background_loop(self.synthesize_group_async(specialist_reports))
+    
+    async def synthesize_group_async(self, specialist_reports: Dict[str, str]) -> Dict[str, str]:
+        """
+        Merge one group of reports into a partial synthesis.
+        
+        Args:
+            specialist_reports: The group's reports, keyed by specialist role
+        
+        Returns:
+            Dictionary with the single partial synthesis, keyed by a label naming
+            the group's specialists; the group's own reports if the call fails,
+            so the final synthesis still sees them
+        """
+        if len(specialist_reports) < 2:
+            return dict(specialist_reports)
+        start = time.perf_counter()
+        try:
+            summary = await self.llm_service.generate_response_async(
+                prompt=self._partial_prompt(specialist_reports),
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+        except Exception as e:
+            logger.error(f"Error merging specialist reports {', '.join(specialist_reports)}: {str(e)}")
+            return dict(specialist_reports)
+        self.llm_service.metrics.record("team_partial_latency", time.perf_counter() - start)
+        return {self._partial_label(specialist_reports): summary}
+    
+    def _split(self, specialist_reports: Dict[str, str]) -> List[Dict[str, str]]:
+        return [{name: specialist_reports[name] for name in names}
+                for names in self.group(list(specialist_reports))]
+    
+    def reduce_reports(self, specialist_reports: Dict[str, str]) -> Dict[str, str]:
+        """Blocking wrapper around reduce_reports_async."""
+        return run_in_background_loop(self.reduce_reports_async(specialist_reports))
+    
+    async def reduce_reports_async(self, specialist_reports: Dict[str, str]) -> Dict[str, str]:
+        """
+        Merge reports in groups, concurrently, until few enough remain for one synthesis.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles (or earlier
+                group summaries) to their text
+        
+        Returns:
+            At most group_size reports or group summaries (the input unchanged
+            if it is already small enough)
+        """
+        while self.needs_grouping(len(specialist_reports)):
+            groups = self._split(specialist_reports)
+            logger.info(f"Multidisciplinary team merging {len(specialist_reports)} reports in {len(groups)} groups")
+            partials = await asyncio.gather(*(self.synthesize_group_async(group) for group in groups))
+            merged = {label: text for partial in partials for label, text in partial.items()}
+            if len(merged) >= len(specialist_reports):
+                # Every group failed; synthesize from what there is
+                break
+            specialist_reports = merged
+        return specialist_reports
+    
+    def analyze(self, specialist_reports: Optional[Dict[str, str]] = None, **kwargs) -> str:
         """
         Analyze the specialists' reports and generate a comprehensive assessment.
         
+        Blocking wrapper around analyze_async.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+                (defaults to the reports given to the constructor)
+        
+        Returns:
+            Final assessment
+        """
+        return run_in_background_loop(self.analyze_async(specialist_reports, **kwargs))
+    
+    def analyze_stream(self, specialist_reports: Optional[Dict[str, str]] = None, **kwargs) -> Iterator[str]:
+        """
+        Analyze the specialists' reports, yielding the assessment as it is generated.
+        
+        Blocking wrapper around analyze_stream_async.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+                (defaults to the reports given to the constructor)
+        
+        Returns:
+            Iterator of text deltas of the final assessment (an error message if the call fails)
+        """
+        return iterate_in_background_loop(self.analyze_stream_async(specialist_reports, **kwargs))
+    
+    async def analyze_async(self, specialist_reports: Optional[Dict[str, str]] = None, **kwargs) -> str:
+        """
+        Analyze the specialists' reports without blocking the event loop.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+                (defaults to the reports given to the constructor)
+        
         Returns:
             Final assessment
         """
         logger.info("Multidisciplinary team analyzing specialist reports")
-        prompt = self.format_prompt(**kwargs)
+        prompt = self.format_prompt(await self.reduce_reports_async(self._reports(specialist_reports)), **kwargs)
         
         try:
-            response = self.llm_service.generate_response(
+            response = await self.llm_service.generate_response_async(
                 prompt=prompt,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens
@@ -83,4 +261,32 @@ class MultidisciplinaryTeam(BaseAgent):
             return response
         except Exception as e:
             logger.error(f"Error in multidisciplinary team analysis: {str(e)}")
-            return f"Error during multidisciplinary team analysis: {str(e)}"
\ No newline at end of file
+            return f"Error during multidisciplinary team analysis: {str(e)}"
+    
+    async def analyze_stream_async(self, specialist_reports: Optional[Dict[str, str]] = None,
+                                   **kwargs) -> AsyncIterator[str]:
+        """
+        Analyze the specialists' reports without blocking the event loop, yielding the assessment as it is generated.
+        
+        Args:
+            specialist_reports: Dictionary mapping specialist roles to their assessments
+                (defaults to the reports given to the constructor)
+        
+        Yields:
+            Text deltas of the final assessment (an error message if the call fails)
+        """
+        logger.info("Multidisciplinary team streaming analysis of specialist reports")
+        # Group summaries are not streamed; only the final synthesis is
+        prompt = self.format_prompt(await self.reduce_reports_async(self._reports(specialist_reports)), **kwargs)
+        
+        try:
+            async for delta in self.llm_service.stream_async(
+                prompt=prompt,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            ):
+                yield delta
+            logger.info("Multidisciplinary team completed analysis")
+        except Exception as e:
+            logger.error(f"Error in multidisciplinary team analysis: {str(e)}")
+            yield f"Error during multidisciplinary team analysis: {str(e)}"
\ No newline at end of file
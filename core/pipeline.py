@@ -0,0 +1,474 @@
+# core/pipeline.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Sequence, Union
+
+from core.agent_factory import AgentFactory
+from core.condenser import CondensationResult, ReportCondenser
+from core.specialist_panel import SpecialistPanel
+from services.llm_service import LLMService, get_background_loop
+from services.client_pool import get_llm_service
+from services.report_parser import ParsedReport, parse_report
+from utils.file_handler import FileHandler
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class Stage:
+    """One node of a pipeline: a function of the outputs of the stages it depends on."""
+    
+    def __init__(self,
+                 name: str,
+                 fn: Callable[[Dict[str, Any]], Any],
+                 inputs: Sequence[str] = (),
+                 condition: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 background: bool = False):
+        """
+        Initialize the stage.
+        
+        Args:
+            name: Unique stage name; its output is passed to dependents under this name
+            fn: Called with a dict mapping each input stage name to its output; a
+                coroutine function runs on the shared background event loop
+                (see services.llm_service.get_background_loop) instead of a thread
+            inputs: Names of the stages whose outputs this stage needs
+            condition: Called with the same dict; the stage is skipped if it returns False
+            background: Run off the critical path (run() returns without waiting for it)
+        """
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.condition = condition
+        self.background = background
+
+
+class StageTiming:
+    """When a stage ran, relative to the start of the pipeline run, and how it ended."""
+    
+    def __init__(self, status: str = "pending", start: Optional[float] = None, end: Optional[float] = None):
+        self.status = status
+        self.start = start
+        self.end = end
+    
+    @property
+    def duration(self) -> Optional[float]:
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"status": self.status, "start": self.start, "end": self.end, "duration": self.duration}
+
+
+class PipelineResult:
+    """Outputs, errors and per-stage timing of one pipeline run."""
+    
+    def __init__(self):
+        self.outputs: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.timings: Dict[str, StageTiming] = {}
+        self.total_time: Optional[float] = None
+        self.background: Dict[str, Future] = {}
+    
+    def wait_background(self, timeout: Optional[float] = None) -> None:
+        """Block until the background stages have finished."""
+        wait(list(self.background.values()), timeout=timeout)
+    
+    def timing_summary(self) -> Dict[str, Any]:
+        """
+        Return the run's timing as plain data.
+        
+        Returns:
+            Dictionary with "total" and a per-stage "stages" mapping
+        """
+        return {
+            "total": self.total_time,
+            "stages": {name: timing.to_dict() for name, timing in self.timings.items()}
+        }
+
+
+_background_executor: Optional[ThreadPoolExecutor] = None
+_background_executor_lock = threading.Lock()
+
+def _get_background_executor() -> ThreadPoolExecutor:
+    """Return the shared pool that runs background stages such as persistence."""
+    global _background_executor
+    with _background_executor_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pipeline-background")
+        return _background_executor
+
+
+class Pipeline:
+    """
+    Runs stages as a dependency graph on a thread pool and the shared event loop.
+    
+    A stage starts as soon as every stage it depends on has finished. Plain
+    functions run on the pipeline's threads; coroutine functions (the LLM
+    calls) are scheduled together on the background event loop, so any
+    number of them can be in flight without a thread each. Stages
+    whose condition is false, or whose inputs failed or were skipped, are
+    skipped along with their own dependents. Background stages are handed
+    to a shared pool so that slow side effects like persistence never delay
+    the result.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the pipeline.
+        
+        Args:
+            max_workers: Threads for the critical-path stages that are not coroutines
+                (one per stage if None)
+        """
+        self.max_workers = max_workers
+        self.stages: Dict[str, Stage] = {}
+    
+    def add_stage(self, name: str, fn: Callable[[Dict[str, Any]], Any], inputs: Sequence[str] = (),
+                  condition: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                  background: bool = False) -> "Pipeline":
+        """
+        Add a stage (see Stage for the arguments).
+        
+        Returns:
+            The pipeline, so calls can be chained
+        """
+        if name in self.stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        self.stages[name] = Stage(name, fn, inputs, condition, background)
+        return self
+    
+    def _validate(self) -> None:
+        """Reject unknown inputs and dependency cycles."""
+        for stage in self.stages.values():
+            for dependency in stage.inputs:
+                if dependency not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dependency}")
+        
+        visiting, done = set(), set()
+        
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].inputs:
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+        
+        for name in self.stages:
+            visit(name)
+    
+    def run(self,
+            on_stage_done: Optional[Callable[[str, StageTiming], None]] = None,
+            restored: Optional[Dict[str, Any]] = None,
+            on_stage_output: Optional[Callable[[str, Any], None]] = None) -> PipelineResult:
+        """
+        Run every stage, each as soon as its inputs are ready.
+        
+        Args:
+            on_stage_done: Called from a worker thread (or the event loop, for coroutine
+                stages) whenever a stage finishes or is skipped
+            restored: Outputs of stages that already ran (e.g. before a crash); those stages
+                are not run again and are marked "restored"
+            on_stage_output: Called like on_stage_done with (stage name, output) whenever a
+                stage runs successfully, e.g. to checkpoint it
+        
+        Returns:
+            PipelineResult once every critical-path stage has finished
+        """
+        self._validate()
+        result = PipelineResult()
+        result.timings = {name: StageTiming() for name in self.stages}
+        run_start = time.perf_counter()
+        
+        def finish(name: str, status: str) -> None:
+            timing = result.timings[name]
+            timing.status = status
+            if timing.end is None:
+                timing.end = time.perf_counter() - run_start
+            if on_stage_done is not None:
+                on_stage_done(name, timing)
+        
+        def failed(stage: Stage, error: Exception) -> None:
+            logger.error(f"Pipeline stage {stage.name} failed: {str(error)}")
+            result.errors[stage.name] = error
+            finish(stage.name, "failed")
+        
+        def succeeded(stage: Stage, output: Any) -> Any:
+            result.outputs[stage.name] = output
+            if on_stage_output is not None:
+                on_stage_output(stage.name, output)
+            finish(stage.name, "done")
+            return output
+        
+        def execute(stage: Stage, inputs: Dict[str, Any]) -> Any:
+            result.timings[stage.name].start = time.perf_counter() - run_start
+            try:
+                output = stage.fn(inputs)
+            except Exception as e:
+                failed(stage, e)
+                raise
+            return succeeded(stage, output)
+        
+        async def execute_async(stage: Stage, inputs: Dict[str, Any]) -> Any:
+            result.timings[stage.name].start = time.perf_counter() - run_start
+            try:
+                output = await stage.fn(inputs)
+            except Exception as e:
+                failed(stage, e)
+                raise
+            return succeeded(stage, output)
+        
+        def submit(executor: ThreadPoolExecutor, stage: Stage, inputs: Dict[str, Any]) -> Future:
+            if asyncio.iscoroutinefunction(stage.fn):
+                return asyncio.run_coroutine_threadsafe(execute_async(stage, inputs), get_background_loop())
+            return executor.submit(execute, stage, inputs)
+        
+        pending = dict(self.stages)
+        settled = set()
+        running: Dict[Future, str] = {}
+        max_workers = self.max_workers or max(1, sum(not asyncio.iscoroutinefunction(stage.fn)
+                                                    for stage in self.stages.values()))
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                # Start (or skip) every stage whose inputs have all settled
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for name, stage in list(pending.items()):
+                        if not all(dependency in settled for dependency in stage.inputs):
+                            continue
+                        del pending[name]
+                        progressed = True
+                        if any(dependency not in result.outputs for dependency in stage.inputs):
+                            settled.add(name)
+                            finish(name, "skipped")
+                            continue
+                        if restored and name in restored:
+                            result.outputs[name] = restored[name]
+                            result.timings[name].start = time.perf_counter() - run_start
+                            settled.add(name)
+                            finish(name, "restored")
+                            continue
+                        inputs = {dependency: result.outputs[dependency] for dependency in stage.inputs}
+                        if stage.condition is not None and not stage.condition(inputs):
+                            settled.add(name)
+                            finish(name, "skipped")
+                            continue
+                        if stage.background:
+                            # Nothing on the critical path may depend on a background stage's output
+                            settled.add(name)
+                            result.background[name] = submit(_get_background_executor(), stage, inputs)
+                        else:
+                            running[submit(executor, stage, inputs)] = name
+                
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    settled.add(running.pop(future))
+        
+        result.total_time = time.perf_counter() - run_start
+        logger.info(f"Pipeline finished in {result.total_time:.2f}s "
+                    f"({len(result.outputs)} stages done, {len(result.errors)} failed)")
+        return result
+
+
+_result_name_lock = threading.Lock()
+_claimed_result_names = set()
+_claimed_result_base = None
+
+def _unique_result_name(base: str) -> str:
+    """Return base, or base_2, base_3... if analyses finishing in the same second already took it."""
+    global _claimed_result_base
+    with _result_name_lock:
+        if base != _claimed_result_base:
+            # Names claimed for an earlier timestamp can no longer collide
+            _claimed_result_names.clear()
+            _claimed_result_base = base
+        name, suffix = base, 1
+        while name in _claimed_result_names or os.path.exists(os.path.join(settings.RESULTS_DIR, f"{name}.json")):
+            suffix += 1
+            name = f"{base}_{suffix}"
+        _claimed_result_names.add(name)
+        return name
+
+
+def build_analysis_pipeline(medical_report: Union[str, ParsedReport],
+                            specialist_types: Sequence[str],
+                            llm_service: Optional[LLMService] = None,
+                            temperature: float = 0.2,
+                            max_tokens: int = 1024,
+                            report_name: Optional[str] = None,
+                            panel_mode: bool = False,
+                            on_delta: Optional[Callable[[str, str], None]] = None,
+                            save_results: bool = True,
+                            condenser: Optional[ReportCondenser] = None) -> Pipeline:
+    """
+    Build the specialist analysis flow used by the app as a pipeline.
+    
+    Stages: one "specialist:<type>" stage per specialist (or a single "panel"
+    stage in panel mode), "specialists" collecting their reports, "team" for
+    the multidisciplinary synthesis when there are at least 2 reports, and a
+    background "save" stage writing the results to disk. With more
+    specialists than the team's group size, "team:group:<n>" stages merge
+    each group of reports as soon as that group has finished, and "team"
+    works from their summaries. With a condenser, the reports are
+    condensed before they reach the team (the saved results keep them in
+    full): by each group stage when there are groups, otherwise by a
+    "condense" stage that outputs the CondensationResult with the token
+    reduction.
+    
+    Args:
+        medical_report: The patient's medical report (text or ParsedReport)
+        specialist_types: Agent types to run (keys of AgentFactory.AGENT_REGISTRY)
+        llm_service: LLM service shared by every agent (defaults to the pooled one)
+        temperature: LLM temperature setting
+        max_tokens: LLM max tokens setting
+        report_name: Name of the report, stored with the saved results
+        panel_mode: Ask for every specialist assessment in a single request
+        on_delta: Called with (specialist type or "team", text delta) while responses stream;
+            it runs on the background event loop, so it must not block
+        save_results: Add the background "save" stage
+        condenser: Condense the specialist reports before they reach the team (None sends them in full)
+    
+    Returns:
+        Pipeline ready to run
+    """
+    llm_service = llm_service or get_llm_service()
+    # Parsed once; the agents and the saved results share it
+    report = parse_report(medical_report)
+    agents = {
+        specialist_type: AgentFactory.get_agent(
+            agent_type=specialist_type,
+            llm_service=llm_service,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        for specialist_type in specialist_types
+    }
+    pipeline = Pipeline()
+    
+    async def stream_text(name: str, deltas: AsyncIterator[str]) -> str:
+        text = ""
+        try:
+            async for delta in deltas:
+                text += delta
+                on_delta(name, delta)
+        finally:
+            # If on_delta aborts, end the call now rather than leaving it (and any
+            # identical requests sharing it) suspended until garbage collection
+            await deltas.aclose()
+        return text
+    
+    if panel_mode:
+        panel = SpecialistPanel(agents, llm_service=llm_service, temperature=temperature, max_tokens=max_tokens)
+        
+        async def panel_stage(inputs: Dict[str, Any]) -> Dict[str, str]:
+            return await panel.analyze_async(report)
+        
+        pipeline.add_stage("panel", panel_stage)
+        pipeline.add_stage("specialists", lambda inputs: dict(inputs["panel"]), inputs=["panel"])
+    else:
+        # One coroutine per specialist, all in flight together on the background loop
+        def specialist_stage(specialist_type: str) -> Callable[[Dict[str, Any]], Awaitable[str]]:
+            agent = agents[specialist_type]
+            
+            async def run(inputs: Dict[str, Any]) -> str:
+                if on_delta is None:
+                    return await agent.analyze_async(report)
+                return await stream_text(specialist_type, agent.analyze_stream_async(report))
+            return run
+        
+        stage_names = [f"specialist:{specialist_type}" for specialist_type in agents]
+        for specialist_type, stage_name in zip(agents, stage_names):
+            pipeline.add_stage(stage_name, specialist_stage(specialist_type))
+        pipeline.add_stage(
+            "specialists",
+            lambda inputs: {name.split(":", 1)[1]: inputs[name] for name in stage_names},
+            inputs=stage_names
+        )
+    
+    team_agent = AgentFactory.get_team(llm_service=llm_service, temperature=temperature, max_tokens=max_tokens)
+    
+    def condense(reports: Dict[str, str]) -> CondensationResult:
+        condensed = condenser.condense_all(reports)
+        llm_service.metrics.increment("condensed_tokens_saved",
+                                      condensed.original_tokens - condensed.condensed_tokens)
+        return condensed
+    
+    group_stages = []
+    if not panel_mode and team_agent.needs_grouping(len(agents)):
+        # Merge each group of reports as soon as its specialists finish, while the others still run
+        def group_stage(specialist_types: Sequence[str]) -> Callable[[Dict[str, Any]], Awaitable[Dict[str, str]]]:
+            async def run(inputs: Dict[str, Any]) -> Dict[str, str]:
+                reports = {specialist_type: inputs[f"specialist:{specialist_type}"] for specialist_type in specialist_types}
+                if condenser is not None:
+                    reports = condense(reports).reports
+                return await team_agent.synthesize_group_async(reports)
+            return run
+        
+        for index, specialist_types in enumerate(team_agent.group(list(agents)), start=1):
+            group_stages.append(f"team:group:{index}")
+            pipeline.add_stage(group_stages[-1], group_stage(specialist_types),
+                               inputs=[f"specialist:{specialist_type}" for specialist_type in specialist_types])
+    
+    # The team needs at least 2 specialist reports to synthesize
+    def has_team(inputs: Dict[str, Any]) -> bool:
+        return len(inputs["specialists"]) >= 2
+    
+    team_inputs = ["specialists"] + group_stages
+    # With groups the team reads their summaries, and each group condenses its own reports
+    condense_reports = condenser is not None and not group_stages
+    if condense_reports:
+        pipeline.add_stage("condense", lambda inputs: condense(inputs["specialists"]),
+                           inputs=["specialists"], condition=has_team)
+        team_inputs.append("condense")
+    
+    async def team_stage(inputs: Dict[str, Any]) -> str:
+        if group_stages:
+            reports = {label: text for name in group_stages for label, text in inputs[name].items()}
+        elif condense_reports:
+            reports = inputs["condense"].reports
+        else:
+            reports = inputs["specialists"]
+        if on_delta is None:
+            return await team_agent.analyze_async(reports)
+        return await stream_text("team", team_agent.analyze_stream_async(reports))
+    
+    pipeline.add_stage("team", team_stage, inputs=team_inputs, condition=has_team)
+    
+    if save_results:
+        def save_stage(inputs: Dict[str, Any]) -> str:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            diagnosis_filename = _unique_result_name(f"diagnosis_{timestamp}")
+            path = FileHandler.save_result(
+                data={
+                    "timestamp": timestamp,
+                    "report": report_name,
+                    "report_key": report.key,
+                    "specialist_reports": inputs["specialists"],
+                    "final_diagnosis": inputs["team"]
+                },
+                filename=diagnosis_filename,
+                format_type="json"
+            )
+            # Also save a text-only version for easy reading
+            FileHandler.save_result(
+                data=f"Final Diagnosis ({timestamp}):\n\n{inputs['team']}",
+                filename=f"{diagnosis_filename}_text",
+                format_type="txt"
+            )
+            return path
+        
+        pipeline.add_stage("save", save_stage, inputs=["specialists", "team"], background=True)
+    
+    return pipeline
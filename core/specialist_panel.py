@@ -0,0 +1,211 @@
+# core/specialist_panel.py
+import re
+import json
+import time
+import logging
+from typing import Dict, Optional, Any, Union
+
+from services.llm_service import LLMService, run_in_background_loop
+from config import settings
+from services.report_parser import ParsedReport
+from core.agent_base import BaseAgent, analyze_all_async
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the report inside each specialist's brief; the report itself is sent once
+REPORT_REFERENCE = "(the medical report is given once at the end of this message)"
+
+PANEL_PROMPT = """Act like a panel of medical specialists reviewing the same patient case.
+Each specialist below has their own brief. Answer every brief separately, as that specialist.
+
+{briefs}
+
+Return only a JSON object with exactly these keys: {keys}.
+Each value must be a string holding that specialist's complete answer to their brief.
+Do not add any text before or after the JSON object.
+
+Medical Report:
+{medical_report}"""
+
+
+def _approx_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token, as the rate-limit governor assumes)."""
+    return len(text) // 4
+
+
+def max_completion_tokens(model: str) -> int:
+    """Most completion tokens the model accepts in one request (from settings)."""
+    return settings.LLM_MODEL_MAX_COMPLETION_TOKENS.get(model, settings.LLM_MAX_COMPLETION_TOKENS)
+
+
+class SpecialistPanel:
+    """
+    Runs several specialists in a single LLM request.
+    
+    Every specialist's prompt template becomes a brief in one combined
+    prompt that carries the medical report only once, and the model answers
+    with one JSON object keyed by specialist. If the response cannot be
+    parsed, the panel falls back to one call per agent. Details of the last
+    run (mode, latency and estimated prompt tokens for both modes) are kept
+    in last_run for comparison with the fan-out mode.
+    """
+    
+    def __init__(self,
+                 agents: Dict[str, BaseAgent],
+                 llm_service: Optional[LLMService] = None,
+                 temperature: float = 0.2,
+                 max_tokens: int = 1024):
+        """
+        Initialize the panel.
+        
+        Args:
+            agents: Dictionary mapping specialist names to agent instances
+            llm_service: LLM service for the combined request (defaults to the first agent's)
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens per specialist (the combined request gets one budget per
+                agent, up to the completion limit of every model it may be routed to)
+        """
+        if not agents:
+            raise ValueError("A specialist panel needs at least one agent")
+        self.agents = agents
+        self.llm_service = llm_service or next(iter(agents.values())).llm_service
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.last_run: Dict[str, Any] = {}
+    
+    @property
+    def completion_limit(self) -> int:
+        """
+        Most completion tokens the combined request may ask for.
+        
+        A routed service's model is the routing policy's name, so the limit is
+        the smallest one among the models the policy may route the call to.
+        """
+        return min(max_completion_tokens(backend.model) for backend in self.llm_service.routing_policy.candidates())
+    
+    @property
+    def completion_budget(self) -> int:
+        """Completion tokens for the combined request: one budget per agent, clamped to what the models allow."""
+        requested = self.max_tokens * len(self.agents)
+        limit = self.completion_limit
+        if requested > limit:
+            logger.info(f"Specialist panel budget of {requested} tokens clamped to {limit} for {self.llm_service.model}")
+            return limit
+        return requested
+    
+    def _fallback(self, reason: str) -> None:
+        logger.warning(f"Specialist panel falling back to one call per specialist: {reason}")
+        self.llm_service.metrics.increment("panel_fallbacks")
+    
+    def format_prompt(self, medical_report: Union[str, ParsedReport]) -> str:
+        """
+        Build the combined prompt for every specialist.
+        
+        Args:
+            medical_report: The patient's medical report
+        
+        Returns:
+            Formatted prompt string
+        """
+        briefs = "\n\n".join(
+            f"### {name}\n{agent.format_prompt(REPORT_REFERENCE).strip()}"
+            for name, agent in self.agents.items()
+        )
+        return PANEL_PROMPT.format(
+            briefs=briefs,
+            keys=", ".join(json.dumps(name) for name in self.agents),
+            medical_report=str(medical_report)
+        )
+    
+    def parse_response(self, response: str) -> Optional[Dict[str, str]]:
+        """
+        Split the combined response into per-specialist assessments.
+        
+        Args:
+            response: Raw text returned by the model
+        
+        Returns:
+            Dictionary mapping specialist names to their assessment, or None
+            if the response is not a JSON object with a text for every agent
+        """
+        # Models often wrap JSON in a code fence or a sentence; keep the outermost object
+        match = re.search(r"\{.*\}", response, re.DOTALL)
+        if match is None:
+            return None
+        try:
+            data = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        
+        # Match keys case-insensitively since models like to capitalize roles
+        by_key = {str(key).strip().lower(): value for key, value in data.items()}
+        results = {}
+        for name in self.agents:
+            value = by_key.get(name.lower())
+            if not isinstance(value, str) or not value.strip():
+                return None
+            results[name] = value.strip()
+        return results
+    
+    def _record(self, mode: str, start: float, prompt: str, medical_report: Union[str, ParsedReport]) -> None:
+        fanout_prompt_tokens = sum(_approx_tokens(agent.format_prompt(medical_report)) for agent in self.agents.values())
+        self.last_run = {
+            "mode": mode,
+            "latency": time.perf_counter() - start,
+            "panel_prompt_tokens": _approx_tokens(prompt),
+            "fanout_prompt_tokens": fanout_prompt_tokens
+        }
+        self.llm_service.metrics.record(f"{mode}_latency", self.last_run["latency"])
+        logger.info(f"Specialist panel run: {self.last_run}")
+    
+    def analyze(self, medical_report: Union[str, ParsedReport]) -> Dict[str, str]:
+        """
+        Analyze the medical report with every specialist in one request.
+        
+        Blocking wrapper around analyze_async.
+        
+        Args:
+            medical_report: The patient's medical report
+        
+        Returns:
+            Dictionary mapping specialist names to their analysis
+        """
+        return run_in_background_loop(self.analyze_async(medical_report))
+    
+    async def analyze_async(self, medical_report: Union[str, ParsedReport]) -> Dict[str, str]:
+        """
+        Analyze the medical report with every specialist in one request, without blocking the event loop.
+        
+        Args:
+            medical_report: The patient's medical report
+        
+        Returns:
+            Dictionary mapping specialist names to their analysis
+        """
+        logger.info(f"Specialist panel analyzing report ({len(self.agents)} specialists)")
+        start = time.perf_counter()
+        prompt = self.format_prompt(medical_report)
+        
+        try:
+            response = await self.llm_service.generate_response_async(
+                prompt=prompt,
+                temperature=self.temperature,
+                max_tokens=self.completion_budget
+            )
+            results = self.parse_response(response)
+            reason = "the response could not be split into one answer per specialist"
+        except Exception as e:
+            logger.error(f"Error in specialist panel analysis: {str(e)}")
+            results = None
+            reason = f"the combined request failed ({str(e)})"
+        
+        if results is not None:
+            self._record("panel", start, prompt, medical_report)
+            return results
+        
+        self._fallback(reason)
+        results = await analyze_all_async(self.agents, medical_report)
+        self._record("fanout", start, prompt, medical_report)
+        return results
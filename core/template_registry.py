@@ -0,0 +1,227 @@
+# core/template_registry.py
+import os
+import time
+import logging
+import threading
+from string import Formatter
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIX = "_prompt.txt"
+
+_CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+class TemplateError(ValueError):
+    """Raised when a prompt template is malformed or lacks a required placeholder."""
+
+
+class CompiledTemplate:
+    """
+    A prompt template parsed once into literal text and named fields.
+    
+    format() renders it without re-parsing the format string and behaves
+    like str.format with keyword arguments. Only named placeholders are
+    allowed ({medical_report}); positional, attribute and index fields are
+    rejected when the template is compiled.
+    """
+    
+    def __init__(self, text: str, source: str = "<default>", mtime: Optional[float] = None):
+        """
+        Compile a template.
+        
+        Args:
+            text: Template text using str.format syntax
+            source: Where the text came from, for error messages
+            mtime: Modification time of the source file, if any
+        
+        Raises:
+            TemplateError: If the template cannot be parsed or uses unsupported fields
+        """
+        self.text = text
+        self.source = source
+        self.mtime = mtime
+        self._segments: List[Tuple[str, Optional[str], Optional[str], str]] = []
+        
+        try:
+            parsed = list(Formatter().parse(text))
+        except ValueError as e:
+            raise TemplateError(f"Malformed template {source}: {str(e)}")
+        
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None:
+                if not field.isidentifier():
+                    raise TemplateError(f"Unsupported placeholder {{{field}}} in template {source}; "
+                                        f"only named placeholders like {{medical_report}} are allowed")
+                if format_spec and "{" in format_spec:
+                    raise TemplateError(f"Nested placeholder in {{{field}}} in template {source}")
+            self._segments.append((literal, field, conversion, format_spec or ""))
+        self.placeholders: FrozenSet[str] = frozenset(field for _, field, _, _ in self._segments if field is not None)
+    
+    def validate(self, required: Iterable[str]) -> None:
+        """
+        Check that the template uses every required placeholder.
+        
+        Raises:
+            TemplateError: If a required placeholder is missing
+        """
+        missing = set(required) - self.placeholders
+        if missing:
+            raise TemplateError(f"Template {self.source} is missing placeholder(s): "
+                                f"{', '.join('{' + name + '}' for name in sorted(missing))}")
+    
+    def format(self, **context) -> str:
+        """
+        Render the template.
+        
+        Returns:
+            The formatted text
+        
+        Raises:
+            KeyError: If a placeholder has no value, as with str.format
+        """
+        parts = []
+        for literal, field, conversion, format_spec in self._segments:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = context[field]
+            if conversion:
+                value = _CONVERSIONS[conversion](value)
+            parts.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(parts)
+    
+    def __str__(self) -> str:
+        return self.text
+
+
+class TemplateRegistry:
+    """
+    Process-wide store of compiled prompt templates.
+    
+    Every <name>_prompt.txt file in the templates directory is read and
+    compiled once. At most every reload_interval seconds a lookup rescans
+    the directory's modification times, and changed or new files are
+    recompiled; an edit that fails to compile keeps the previous version.
+    """
+    
+    def __init__(self, templates_dir: Optional[str] = None, reload_interval: Optional[float] = None):
+        """
+        Initialize the registry and load every template.
+        
+        Args:
+            templates_dir: Directory holding the <name>_prompt.txt files (defaults to TEMPLATES_DIR)
+            reload_interval: Seconds between modification-time checks, 0 disabling hot reload
+                (defaults to TEMPLATE_RELOAD_INTERVAL)
+        """
+        self.templates_dir = settings.TEMPLATES_DIR if templates_dir is None else templates_dir
+        self.reload_interval = settings.TEMPLATE_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self._templates: Dict[str, CompiledTemplate] = {}
+        self._defaults: Dict[str, CompiledTemplate] = {}
+        self._reported: set = set()
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._scan()
+    
+    def _scan(self) -> None:
+        """Compile every template file that is new or changed since it was last loaded."""
+        try:
+            entries = [entry for entry in os.scandir(self.templates_dir)
+                       if entry.is_file() and entry.name.endswith(TEMPLATE_SUFFIX)]
+        except FileNotFoundError:
+            logger.warning(f"Templates directory not found: {self.templates_dir}")
+            return
+        
+        for entry in entries:
+            name = entry.name[:-len(TEMPLATE_SUFFIX)].lower()
+            mtime = entry.stat().st_mtime
+            current = self._templates.get(name)
+            if (current is not None and current.mtime == mtime) or self._failed.get(name) == mtime:
+                continue
+            try:
+                with open(entry.path, 'r') as file:
+                    template = CompiledTemplate(file.read(), source=entry.path, mtime=mtime)
+            except (OSError, TemplateError) as e:
+                logger.error(f"Could not load prompt template {entry.path}: {str(e)}")
+                self._failed[name] = mtime
+                continue
+            if current is not None:
+                logger.info(f"Reloaded prompt template {entry.path}")
+            self._templates[name] = template
+            self._reported.discard(name)
+    
+    def _refresh(self) -> None:
+        if self.reload_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.reload_interval:
+                return
+            self._last_check = now
+            self._scan()
+    
+    def get(self, name: str, default: Optional[str] = None, required: Iterable[str] = ()) -> CompiledTemplate:
+        """
+        Return the compiled template for a name (e.g. a role).
+        
+        Args:
+            name: Template name; the file is <name lowercased>_prompt.txt
+            default: Template text to use if the file is missing or invalid
+            required: Placeholders the template must contain
+        
+        Returns:
+            The compiled template
+        
+        Raises:
+            TemplateError: If neither the file nor the default is a valid template
+        """
+        self._refresh()
+        key = name.lower()
+        template = self._templates.get(key)
+        required = tuple(required)
+        if template is not None:
+            try:
+                template.validate(required)
+                return template
+            except TemplateError as e:
+                self._report(key, f"{str(e)}; using the default template")
+        else:
+            self._report(key, f"Prompt template not found for {name} in {self.templates_dir}")
+        
+        if default is None:
+            raise TemplateError(f"No usable prompt template for {name}")
+        compiled = self._defaults.get(default)
+        if compiled is None:
+            compiled = CompiledTemplate(default, source=f"<default for {name}>")
+            compiled.validate(required)
+            self._defaults[default] = compiled
+        return compiled
+    
+    def _report(self, key: str, message: str) -> None:
+        """Log a template problem once per name rather than on every lookup."""
+        if key not in self._reported:
+            self._reported.add(key)
+            logger.warning(message)
+    
+    def names(self) -> List[str]:
+        """Return the names of the loaded templates."""
+        self._refresh()
+        return sorted(self._templates)
+
+
+_default_registry: Optional[TemplateRegistry] = None
+_default_registry_lock = threading.Lock()
+
+def get_template_registry() -> TemplateRegistry:
+    """Return the process-wide template registry for TEMPLATES_DIR."""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = TemplateRegistry()
+        return _default_registry
@@ -0,0 +1,245 @@
+# core/triage.py
+import re
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple, Union
+
+from services.report_parser import ParsedReport, parse_report
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Weighted keywords per agent type; a keyword counts once per report, and plurals match too
+DEFAULT_TRIAGE_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "cardiologist": {
+        "chest pain": 3.0, "palpitation": 3.0, "angina": 3.0, "arrhythmia": 3.0, "myocardial": 3.0,
+        "murmur": 2.5, "troponin": 2.5, "heart": 2.0, "cardiac": 2.0, "tachycardia": 2.0,
+        "bradycardia": 2.0, "syncope": 2.0, "hypertension": 2.0, "ecg": 2.0, "ekg": 2.0,
+        "electrocardiogram": 2.0, "echocardiogram": 2.0, "holter": 2.0, "blood pressure": 1.5,
+        "edema": 1.5, "cholesterol": 1.0, "shortness of breath": 1.0, "dizziness": 1.0
+    },
+    "pulmonologist": {
+        "shortness of breath": 3.0, "dyspnea": 3.0, "cough": 3.0, "wheezing": 3.0, "asthma": 3.0,
+        "copd": 3.0, "hemoptysis": 3.0, "pneumonia": 3.0, "spirometry": 3.0, "pulmonary": 2.5,
+        "sputum": 2.5, "sleep apnea": 2.5, "lung": 2.0, "respiratory": 2.0, "breathing": 2.0,
+        "chest x-ray": 2.0, "oxygen saturation": 2.0, "smoker": 1.5, "smoking": 1.5, "chest pain": 1.0
+    },
+    "psychologist": {
+        "anxiety": 3.0, "panic": 3.0, "depression": 3.0, "impending doom": 3.0, "suicidal": 3.0,
+        "depressed": 2.5, "stress": 2.0, "insomnia": 2.0, "mood": 2.0, "worry": 2.0, "trauma": 2.0,
+        "psychiatric": 2.0, "cognitive behavioral": 2.0, "cbt": 2.0, "benzodiazepine": 2.0,
+        "fear": 1.5, "lorazepam": 1.5, "sertraline": 1.5, "fatigue": 1.0, "therapy": 1.0
+    }
+}
+
+# How much a keyword found in each part of the report counts; other sections count DEFAULT_SECTION_WEIGHT
+SYMPTOMS_WEIGHT = 2.0
+SECTION_WEIGHTS: Dict[str, float] = {
+    "Chief Complaint": 1.5,
+    "Assessment": 1.0,
+    "Diagnostic Results": 1.0,
+    "Lab Results": 1.0,
+    "Physical Examination": 1.0,
+    "Full Report": 1.0,
+    "Family History": 0.25
+}
+DEFAULT_SECTION_WEIGHT = 0.5
+
+# Added to an agent type's score for each out-of-range lab value or vital sign that concerns it
+LAB_ABNORMAL_WEIGHT = 3.0
+
+
+def _compile_keywords(keywords: Iterable[str]) -> Pattern:
+    """One alternation over every keyword, longest first, matching whole words and plurals."""
+    alternatives = sorted((re.escape(keyword.lower()) for keyword in keywords), key=len, reverse=True)
+    return re.compile(rf"\b({'|'.join(alternatives)})(?:s|es)?\b", re.IGNORECASE)
+
+
+class TriageDecision:
+    """Which of the requested specialists to run for a report, and why."""
+    
+    def __init__(self, selected: List[str], skipped: List[str], scores: Dict[str, Optional[float]], avoided_calls: int):
+        self.selected = selected
+        self.skipped = skipped
+        self.scores = scores
+        self.avoided_calls = avoided_calls
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "selected": self.selected,
+            "skipped": self.skipped,
+            "scores": self.scores,
+            "avoided_calls": self.avoided_calls
+        }
+
+
+class TriageRouter:
+    """
+    Decides locally, before any LLM call, which specialists a report concerns.
+    
+    Each agent type has a map of weighted keywords. A report is split with
+    parse_report, and every keyword found counts its weight times the weight
+    of the most telling place it appears: the extracted symptoms, then the
+    chief complaint, then the findings sections, then the rest. Each lab
+    value outside its reference range adds LAB_ABNORMAL_WEIGHT to the agent
+    type it concerns (see services.lab_values). Specialists scoring below
+    the threshold are skipped, except those in always_include and agent
+    types without a keyword map, which always run. If every
+    requested specialist would be skipped, the best-scoring one still runs
+    (or all of them, if the report matches no keywords at all).
+    """
+    
+    def __init__(self,
+                 keyword_maps: Optional[Dict[str, Dict[str, float]]] = None,
+                 threshold: Optional[float] = None,
+                 always_include: Optional[Sequence[str]] = None):
+        """
+        Initialize the router.
+        
+        Args:
+            keyword_maps: Agent types mapped to {keyword: weight} (defaults to DEFAULT_TRIAGE_KEYWORDS)
+            threshold: Minimum relevance score for a specialist to run (defaults to TRIAGE_THRESHOLD)
+            always_include: Agent types that run whenever they are requested (defaults to TRIAGE_ALWAYS_INCLUDE)
+        """
+        if always_include is None:
+            always_include = settings.TRIAGE_ALWAYS_INCLUDE
+        self.threshold = settings.TRIAGE_THRESHOLD if threshold is None else threshold
+        self.always_include = {agent_type.lower() for agent_type in always_include}
+        self._keywords: Dict[str, Dict[str, float]] = {}
+        self._patterns: Dict[str, Pattern] = {}
+        self._lock = threading.Lock()
+        self._reports = 0
+        self._requested = 0
+        self._avoided_calls = 0
+        for agent_type, keywords in (DEFAULT_TRIAGE_KEYWORDS if keyword_maps is None else keyword_maps).items():
+            self.set_keywords(agent_type, keywords)
+    
+    def set_keywords(self, agent_type: str, keywords: Dict[str, float]) -> None:
+        """
+        Set the weighted keywords for an agent type (e.g. after registering a custom agent).
+        
+        Args:
+            agent_type: Agent type as registered with AgentFactory
+            keywords: Keywords or phrases mapped to their weight
+        """
+        agent_type = agent_type.lower()
+        keywords = {keyword.lower(): weight for keyword, weight in keywords.items()}
+        with self._lock:
+            self._keywords[agent_type] = keywords
+            self._patterns[agent_type] = _compile_keywords(keywords)
+    
+    @staticmethod
+    def _weighted_text(report: ParsedReport) -> List[Tuple[str, float]]:
+        """The parts of a report to search, each with the weight of a keyword found there."""
+        parts = [(" ; ".join(report.symptoms), SYMPTOMS_WEIGHT)]
+        parts.extend((content, SECTION_WEIGHTS.get(name, DEFAULT_SECTION_WEIGHT))
+                     for name, content in report.sections.items())
+        # Text outside the recognized sections still counts a little, but a keyword
+        # in a section counts only at that section's weight
+        outside: List[str] = []
+        position = 0
+        for start, end in sorted(report.section_spans.values()):
+            if start > position:
+                outside.append(report.text[position:start])
+            position = max(position, end)
+        outside.append(report.text[position:])
+        parts.append(("\n".join(outside), DEFAULT_SECTION_WEIGHT))
+        return parts
+    
+    def score(self, report_text: Union[str, ParsedReport], agent_types: Iterable[str]) -> Dict[str, Optional[float]]:
+        """
+        Score how relevant a report is to each agent type.
+        
+        Args:
+            report_text: The patient's medical report (text or ParsedReport)
+            agent_types: Agent types to score
+        
+        Returns:
+            Dictionary mapping each agent type to its score (None if it has no keyword map)
+        """
+        report = parse_report(report_text)
+        parts = self._weighted_text(report)
+        abnormal_labs = report.labs.abnormal_by_specialty()
+        scores: Dict[str, Optional[float]] = {}
+        for agent_type in agent_types:
+            key = agent_type.lower()
+            with self._lock:
+                keywords = self._keywords.get(key)
+                pattern = self._patterns.get(key)
+            if keywords is None:
+                scores[agent_type] = None
+                continue
+            # Each keyword counts once, at the weight of the best place it was found
+            found: Dict[str, float] = {}
+            for text, weight in parts:
+                for match in pattern.finditer(text):
+                    keyword = match.group(1).lower()
+                    found[keyword] = max(found.get(keyword, 0.0), weight)
+            score = sum((keywords[keyword] * weight for keyword, weight in found.items()), 0.0)
+            score += LAB_ABNORMAL_WEIGHT * len(abnormal_labs.get(key, ()))
+            scores[agent_type] = round(score, 2)
+        return scores
+    
+    def route(self, report_text: Union[str, ParsedReport], agent_types: Sequence[str]) -> TriageDecision:
+        """
+        Decide which of the requested specialists to run.
+        
+        Args:
+            report_text: The patient's medical report (text or ParsedReport)
+            agent_types: Requested agent types, in order
+        
+        Returns:
+            TriageDecision; avoided_calls counts the skipped specialists plus the
+            team synthesis if fewer than 2 specialists are left to run
+        """
+        scores = self.score(report_text, agent_types)
+        selected = [
+            agent_type for agent_type in agent_types
+            if scores[agent_type] is None
+            or scores[agent_type] >= self.threshold
+            or agent_type.lower() in self.always_include
+        ]
+        if not selected and agent_types:
+            # A report that matches no one's keywords says nothing about relevance, so run everyone
+            best = max(agent_types, key=lambda agent_type: scores[agent_type])
+            selected = [best] if scores[best] > 0 else list(agent_types)
+        skipped = [agent_type for agent_type in agent_types if agent_type not in selected]
+        
+        avoided_calls = len(skipped)
+        if len(agent_types) >= 2 and len(selected) < 2:
+            avoided_calls += 1
+        
+        with self._lock:
+            self._reports += 1
+            self._requested += len(agent_types)
+            self._avoided_calls += avoided_calls
+        
+        decision = TriageDecision(selected, skipped, scores, avoided_calls)
+        logger.info(f"Triage: {decision.to_dict()}")
+        return decision
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return triage statistics.
+        
+        Returns:
+            Dictionary with reports routed, specialists requested and LLM calls avoided
+        """
+        with self._lock:
+            return {
+                "reports": self._reports,
+                "requested": self._requested,
+                "avoided_calls": self._avoided_calls
+            }
+
+
+_default_router: Optional[TriageRouter] = None
+_default_router_lock = threading.Lock()
+
+def get_triage_router() -> TriageRouter:
+    """Return the process-wide triage router configured from the settings."""
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = TriageRouter()
+        return _default_router
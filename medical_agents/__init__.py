@@ -0,0 +1,9 @@
+# medical_agents/__init__.py
+"""
+Headless entry points for running the agents outside the Streamlit app.
+
+    python -m medical_agents.batch data/sample_reports --concurrency 4
+    python -m medical_agents.corpus reports.jsonl --processes 8
+    python -m medical_agents.worker --processes 4
+    python -m medical_agents.server --port 8000
+"""
@@ -0,0 +1,520 @@
+# medical_agents/batch.py
+"""
+Run the specialist and team analysis over many reports without the app.
+
+    python -m medical_agents.batch data/sample_reports
+    python -m medical_agents.batch reports.jsonl --output results.jsonl --concurrency 8
+
+The input is a directory of .txt/.md reports, a .txt/.md file, or a JSONL
+file with one {"id": ..., "report": ...} object per line; files holding
+several reports separated by REPORT_DELIMITER are split into their reports.
+Each finished report is appended to the output JSONL as soon as it is done.
+Rerunning the same command skips reports already in the output, and
+restores the specialist and team responses recorded in the checkpoint file
+for reports that were cut short, so a crashed run resumes without repeating
+those LLM calls. Reports that failed are retried: their failed records are
+dropped from the output when the run starts, so it holds at most one
+record per report. Resume with the same options and input; the checkpoint
+is keyed by report id only.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set
+
+from config import settings
+from services.report_stream import ReportBuffer
+
+# The pipeline and agents are imported when the first report is processed, so --help stays instant
+if TYPE_CHECKING:
+    from core.condenser import ReportCondenser
+    from core.triage import TriageRouter
+    from services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+REPORT_SUFFIXES = (".txt", ".md")
+
+# Stages whose outputs cost LLM calls; these are checkpointed so a resumed run can restore them
+CHECKPOINT_STAGE_PREFIXES = ("specialist:", "panel", "team")
+
+# Agents return their errors as text rather than raising (see BaseAgent.analyze)
+AGENT_ERROR_PREFIX = "Error during "
+
+
+class ReportItem(NamedTuple):
+    """One report to analyze."""
+    report_id: str
+    text: str
+
+
+def _iter_report_file(file_path: str, name: str) -> Iterator[ReportItem]:
+    try:
+        # Exports holding several reports are split, their reports numbered name#1, name#2, ...
+        with ReportBuffer.open(file_path) as reader:
+            spans = reader.spans()
+            first, second = next(spans, None), next(spans, None)
+            if second is None:
+                if first is not None:
+                    yield ReportItem(name, reader.read(first))
+                return
+            for span in itertools.chain((first, second), spans):
+                yield ReportItem(f"{name}#{span.index + 1}", reader.read(span))
+    except (OSError, ValueError) as e:
+        logger.error(f"Skipping unreadable report {file_path}: {str(e)}")
+
+
+def _iter_directory(path: str) -> Iterator[ReportItem]:
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(REPORT_SUFFIXES):
+            continue
+        yield from _iter_report_file(os.path.join(path, name), name)
+
+
+def _iter_jsonl(path: str) -> Iterator[ReportItem]:
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                text = entry.get("report") or entry.get("text")
+            except (json.JSONDecodeError, AttributeError):
+                text = None
+            if not isinstance(text, str) or not text.strip():
+                logger.error(f"Skipping line {line_number} of {path}: expected an object with a \"report\" text")
+                continue
+            yield ReportItem(str(entry.get("id", f"line-{line_number}")), text)
+
+
+def iter_reports(path: str) -> Iterator[ReportItem]:
+    """
+    Stream reports from a directory, a report file or a JSONL file, one at a time.
+    
+    Report files are memory-mapped and split on REPORT_DELIMITER, so a
+    single large export of concatenated reports is read one report at a time.
+    
+    Args:
+        path: Directory of .txt/.md reports, a .txt/.md file, or a .jsonl file
+    
+    Returns:
+        Iterator of ReportItem, read lazily
+    """
+    if os.path.isdir(path):
+        return _iter_directory(path)
+    if path.lower().endswith(REPORT_SUFFIXES):
+        return _iter_report_file(path, os.path.basename(path))
+    return _iter_jsonl(path)
+
+
+def _read_jsonl_records(path: str) -> List[Dict[str, Any]]:
+    """
+    Read an append-only JSONL file, dropping a line torn by a crash.
+    
+    A torn final line is also cut from the file so that new records start on a fresh line.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data and not data.endswith(b"\n"):
+        data = data[:data.rfind(b"\n") + 1]
+        with open(path, 'r+b') as file:
+            file.truncate(len(data))
+    records = []
+    for line in data.decode('utf-8').splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring unreadable line in {path}")
+    return records
+
+
+def _compact_results(path: str, records: List[Dict[str, Any]]) -> Set[str]:
+    """
+    Drop failed and duplicate records from the results before they are retried.
+    
+    Args:
+        path: The results JSONL file
+        records: Its records, as read by _read_jsonl_records
+    
+    Returns:
+        Ids of the reports finished successfully
+    """
+    finished: Set[str] = set()
+    kept = []
+    for record in records:
+        if record.get("status") == "ok" and record.get("id") not in finished:
+            finished.add(record.get("id"))
+            kept.append(record)
+    
+    if len(kept) < len(records):
+        logger.info(f"Dropping {len(records) - len(kept)} failed or duplicate records from {path} to retry them")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for record in kept:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(temp_path, path)
+    return finished
+
+
+class _JsonlAppender:
+    """Appends JSON records to a file, each flushed to disk before append() returns."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+    
+    def append(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class StageCheckpoint:
+    """
+    Outputs of the LLM stages of reports that have not reached the results yet.
+    
+    Every successful specialist, panel and team stage is appended as it
+    finishes. On load, entries of reports already in the results are
+    dropped and the file is compacted.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = _JsonlAppender(path)
+    
+    def load(self, finished: Set[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Load the restorable stage outputs.
+        
+        Args:
+            finished: Ids of reports already in the results
+        
+        Returns:
+            Dictionary mapping report ids to {stage name: output}
+        """
+        entries = [entry for entry in _read_jsonl_records(self.path) if entry.get("id") not in finished]
+        restored: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            restored.setdefault(entry["id"], {})[entry["stage"]] = entry["output"]
+        
+        if os.path.exists(self.path):
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                for entry in entries:
+                    file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(temp_path, self.path)
+        return restored
+    
+    def record(self, report_id: str, stage: str, output: Any) -> None:
+        """Append one stage output (called from pipeline worker threads)."""
+        self._writer.append({"id": report_id, "stage": stage, "output": output})
+    
+    def close(self) -> None:
+        self._writer.close()
+    
+    def remove(self) -> None:
+        """Delete the checkpoint once every report has been recorded in the results."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def is_agent_error(output: Any) -> bool:
+    """Whether a stage output is (or contains) an error message returned by an agent."""
+    if isinstance(output, dict):
+        return any(is_agent_error(value) for value in output.values())
+    return isinstance(output, str) and output.startswith(AGENT_ERROR_PREFIX)
+
+
+class BatchRunner:
+    """
+    Analyzes a stream of reports with a bounded number in flight.
+    
+    Each report runs through the same pipeline as the app (with its
+    specialist stages in parallel); at most `concurrency` reports are
+    processed at once, and no more than that are read ahead of the results.
+    """
+    
+    def __init__(self,
+                 specialist_types: Sequence[str],
+                 output_path: str,
+                 checkpoint_path: Optional[str] = None,
+                 llm_service: Optional["LLMService"] = None,
+                 concurrency: Optional[int] = None,
+                 temperature: float = 0.2,
+                 max_tokens: int = 1024,
+                 panel_mode: bool = False,
+                 condenser: Optional["ReportCondenser"] = None,
+                 triage_router: Optional["TriageRouter"] = None,
+                 progress_stream=sys.stderr):
+        """
+        Initialize the runner.
+        
+        Args:
+            specialist_types: Agent types to run on every report
+            output_path: Append-only JSONL file of finished reports
+            checkpoint_path: JSONL file of finished LLM stages (defaults to <output>.checkpoint)
+            llm_service: LLM service shared by every agent (defaults to the pooled one)
+            concurrency: Maximum reports processed at once (defaults to MAX_WORKERS)
+            temperature: LLM temperature setting
+            max_tokens: LLM max tokens setting
+            panel_mode: Ask for every specialist assessment in a single request
+            condenser: ReportCondenser for the team's input (None sends the reports in full)
+            triage_router: TriageRouter deciding which specialists each report needs (None runs them all)
+            progress_stream: Where progress lines are written (None for silence)
+        """
+        self.specialist_types = list(specialist_types)
+        self.output_path = output_path
+        self.llm_service = llm_service
+        self.concurrency = max(1, settings.MAX_WORKERS if concurrency is None else concurrency)
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.panel_mode = panel_mode
+        self.condenser = condenser
+        self.triage_router = triage_router
+        self.progress_stream = progress_stream
+        self.ledger = _JsonlAppender(output_path)
+        self.checkpoint = StageCheckpoint(checkpoint_path or f"{output_path}.checkpoint")
+        self._counts = {"ok": 0, "failed": 0, "already_done": 0, "restored_stages": 0}
+        self._start = None
+    
+    def process(self, item: ReportItem, restored: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Analyze one report.
+        
+        Args:
+            item: The report
+            restored: Stage outputs recovered from the checkpoint
+        
+        Returns:
+            The result record written to the output file
+        """
+        from core.pipeline import build_analysis_pipeline
+        from services.report_parser import parse_report
+        
+        start = time.perf_counter()
+        parsed = parse_report(item.text)
+        specialist_types, skipped = self.specialist_types, []
+        if self.triage_router is not None:
+            decision = self.triage_router.route(parsed, self.specialist_types)
+            specialist_types, skipped = decision.selected, decision.skipped
+        
+        pipeline = build_analysis_pipeline(
+            medical_report=parsed,
+            specialist_types=specialist_types,
+            llm_service=self.llm_service,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            report_name=item.report_id,
+            panel_mode=self.panel_mode,
+            save_results=False,
+            condenser=self.condenser
+        )
+        
+        def checkpoint_stage(stage: str, output: Any) -> None:
+            if stage.startswith(CHECKPOINT_STAGE_PREFIXES) and not is_agent_error(output):
+                self.checkpoint.record(item.report_id, stage, output)
+        
+        restored = {stage: output for stage, output in (restored or {}).items() if stage in pipeline.stages}
+        result = pipeline.run(restored=restored, on_stage_output=checkpoint_stage)
+        
+        errors = {stage: str(error) for stage, error in result.errors.items()}
+        specialist_reports = result.outputs.get("specialists", {})
+        for specialist_type, report in specialist_reports.items():
+            if is_agent_error(report):
+                errors[f"specialist:{specialist_type}"] = report
+        final_diagnosis = result.outputs.get("team")
+        if is_agent_error(final_diagnosis):
+            errors["team"] = final_diagnosis
+        
+        record = {
+            "id": item.report_id,
+            "report_key": parsed.key,
+            "status": "failed" if errors else "ok",
+            "specialist_reports": specialist_reports,
+            "final_diagnosis": final_diagnosis,
+            "skipped_specialists": skipped,
+            "errors": errors,
+            "restored_stages": sorted(restored),
+            "duration": round(time.perf_counter() - start, 3),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        if "condense" in result.outputs:
+            record["condensation"] = result.outputs["condense"].to_dict()
+        return record
+    
+    def _finish(self, future: Future, item: ReportItem) -> None:
+        try:
+            record = future.result()
+        except Exception as e:
+            logger.error(f"Report {item.report_id} failed: {str(e)}")
+            record = {"id": item.report_id, "status": "failed", "errors": {"batch": str(e)},
+                      "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self.ledger.append(record)
+        self._counts[record["status"]] += 1
+        self._counts["restored_stages"] += len(record.get("restored_stages", ()))
+        self._print_progress()
+    
+    def throughput(self) -> float:
+        """Reports finished per minute so far in this run."""
+        elapsed = time.perf_counter() - self._start if self._start is not None else 0.0
+        finished = self._counts["ok"] + self._counts["failed"]
+        return finished * 60.0 / elapsed if elapsed > 0 else 0.0
+    
+    def _print_progress(self, final: bool = False) -> None:
+        if self.progress_stream is None:
+            return
+        finished = self._counts["ok"] + self._counts["failed"]
+        elapsed = time.perf_counter() - self._start
+        line = (f"{'Finished' if final else 'Progress'}: {finished} reports in {elapsed:.0f}s, "
+                f"{self.throughput():.1f} reports/min ({self._counts['failed']} failed, "
+                f"{self._counts['already_done']} already done, {self._counts['restored_stages']} stages restored)")
+        print(line, file=self.progress_stream, flush=True)
+    
+    def run(self, items: Iterator[ReportItem]) -> Dict[str, Any]:
+        """
+        Analyze every report not already in the output file.
+        
+        Failed records from earlier runs are removed from the output first
+        (see _compact_results), and those reports are analyzed again.
+        
+        Args:
+            items: Reports to analyze, e.g. from iter_reports
+        
+        Returns:
+            Counts of ok, failed and already-done reports plus the throughput
+        """
+        finished = _compact_results(self.output_path, _read_jsonl_records(self.output_path))
+        restored = self.checkpoint.load(finished)
+        if finished or restored:
+            logger.info(f"Resuming: {len(finished)} reports done, {len(restored)} partially done")
+        
+        self._start = time.perf_counter()
+        in_flight: Dict[Future, ReportItem] = {}
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch")
+        try:
+            for item in items:
+                if item.report_id in finished:
+                    self._counts["already_done"] += 1
+                    continue
+                # Read no further ahead than the reports being processed
+                while len(in_flight) >= self.concurrency:
+                    done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(future, in_flight.pop(future))
+                in_flight[executor.submit(self.process, item, restored.get(item.report_id))] = item
+            
+            while in_flight:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(future, in_flight.pop(future))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.ledger.close()
+            self.checkpoint.close()
+        
+        self._print_progress(final=True)
+        if self._counts["failed"] == 0:
+            self.checkpoint.remove()
+        return {**self._counts, "reports_per_minute": round(self.throughput(), 2)}
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m medical_agents.batch",
+        description="Analyze a directory or JSONL file of medical reports with the specialist agents"
+    )
+    parser.add_argument("input",
+                        help="Directory of .txt/.md reports, a report file, or a JSONL file of {\"id\", \"report\"} objects")
+    parser.add_argument("--output", help="Append-only JSONL results file (default: data/results/batch_<input name>.jsonl)")
+    parser.add_argument("--checkpoint", help="Stage checkpoint file (default: <output>.checkpoint)")
+    parser.add_argument("--specialists", help="Comma-separated agent types (default: every registered agent)")
+    parser.add_argument("--concurrency", type=int, default=settings.MAX_WORKERS, help="Reports processed at once")
+    parser.add_argument("--temperature", type=float, default=0.2, help="LLM temperature")
+    parser.add_argument("--max-tokens", type=int, default=1024, help="LLM max tokens per response")
+    parser.add_argument("--model", help="Groq model (default: GROQ_MODEL)")
+    parser.add_argument("--panel", action="store_true", help="Ask for every specialist assessment in one request")
+    parser.add_argument("--triage", action="store_true", help="Skip specialists irrelevant to each report")
+    parser.add_argument("--condense", action=argparse.BooleanOptionalAction, default=settings.CONDENSE_SPECIALIST_REPORTS,
+                        help="Condense the specialist reports before the team synthesis")
+    parser.add_argument("--log-level", default="WARNING", help="Log level for the console")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    
+    from utils.logger import setup_logger
+    setup_logger(level=args.log_level)
+    
+    from core.agent_factory import AgentFactory
+    from core.condenser import ReportCondenser
+    from core.triage import get_triage_router
+    from services.client_pool import get_llm_service
+    
+    if not os.path.exists(args.input):
+        print(f"Input not found: {args.input}", file=sys.stderr)
+        return 2
+    
+    specialist_types = ([specialist.strip().lower() for specialist in args.specialists.split(",") if specialist.strip()]
+                        if args.specialists else list(AgentFactory.AGENT_REGISTRY))
+    unknown = [specialist for specialist in specialist_types if specialist not in AgentFactory.AGENT_REGISTRY]
+    if unknown:
+        print(f"Unknown agent type(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    
+    try:
+        llm_service = get_llm_service(model=args.model)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    
+    settings.ensure_directories()
+    output_path = args.output or os.path.join(
+        settings.RESULTS_DIR, f"batch_{os.path.splitext(os.path.basename(os.path.normpath(args.input)))[0]}.jsonl"
+    )
+    runner = BatchRunner(
+        specialist_types=specialist_types,
+        output_path=output_path,
+        checkpoint_path=args.checkpoint,
+        llm_service=llm_service,
+        concurrency=args.concurrency,
+        temperature=args.temperature,
+        max_tokens=args.max_tokens,
+        panel_mode=args.panel,
+        condenser=ReportCondenser(structured=settings.CONDENSE_STRUCTURED) if args.condense else None,
+        triage_router=get_triage_router() if args.triage else None
+    )
+    print(f"Writing results to {output_path}", file=sys.stderr)
+    
+    try:
+        summary = runner.run(iter_reports(args.input))
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    
+    logger.info(f"Batch summary: {summary}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,369 @@
+# medical_agents/corpus.py
+"""
+Parse a corpus of reports into one table for cohort analytics (no LLM calls).
+
+    python -m medical_agents.corpus data/sample_reports
+    python -m medical_agents.corpus reports.jsonl --output cohort.parquet --processes 8 --chunk-size 1000
+
+The input is read like the batch command's (a directory of .txt/.md reports,
+a file of concatenated reports, or a JSONL file of {"id": ..., "report": ...}
+objects) and parsed with ReportParser in chunks across a process pool. The
+result has one row per report: patient information, one column per report
+section, one boolean column per symptom in the vocabulary, found in the
+chief complaint, and each lab value with its reference-range flag. Each
+chunk is written to a Parquet file as one row group as soon as it is
+parsed, so the corpus never has to fit in memory, and load_corpus_frame()
+reads the file back with its column types (categories, nullable integers,
+dates) intact.
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from config import settings
+from medical_agents.batch import ReportItem, iter_reports
+
+# pandas is imported when a frame is built, so --help stays instant
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PATIENT_INFO_FIELDS = ("patient_id", "name", "age", "gender", "date")
+
+AGE_GROUP_BINS = (0, 18, 30, 45, 65, 80, 200)
+AGE_GROUP_LABELS = ("0-17", "18-29", "30-44", "45-64", "65-79", "80+")
+
+GENDER_VALUES = {"m": "male", "male": "male", "man": "male",
+                 "f": "female", "female": "female", "woman": "female"}
+
+
+def column_name(label: str, prefix: str) -> str:
+    """Turn a section or symptom name into a column name ("Follow-up" -> "section_follow_up")."""
+    return f"{prefix}_{re.sub(r'[^0-9a-z]+', '_', label.lower()).strip('_')}"
+
+
+def _chunks(items: Iterable[ReportItem], chunk_size: int) -> Iterator[List[ReportItem]]:
+    chunk: List[ReportItem] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_chunk(items: Sequence[ReportItem], include_section_text: bool = True) -> Dict[str, List[Any]]:
+    """
+    Parse reports into columns of plain values (runs in the pool's worker processes).
+    
+    Args:
+        items: The reports
+        include_section_text: Keep each section's text, not only whether it is present
+    
+    Returns:
+        Column name -> one value per report, in input order
+    """
+    from services.lab_values import get_lab_table
+    from services.report_parser import COMMON_SECTIONS, ParsedReport, get_symptom_matcher
+    
+    matcher = get_symptom_matcher()
+    labels = list(dict.fromkeys(matcher.labels))
+    prefix = "section" if include_section_text else "has"
+    columns: Dict[str, List[Any]] = {name: [] for name in ("report_id", "report_key", "length")}
+    columns.update({field: [] for field in PATIENT_INFO_FIELDS})
+    columns.update({column_name(section, prefix): [] for section in COMMON_SECTIONS})
+    columns.update({column_name(label, "symptom"): [] for label in labels})
+    
+    for item in items:
+        report = ParsedReport(item.text)
+        columns["report_id"].append(item.report_id)
+        columns["report_key"].append(report.key)
+        columns["length"].append(len(item.text))
+        patient_info = report.patient_info
+        for field in PATIENT_INFO_FIELDS:
+            columns[field].append(patient_info.get(field))
+        
+        sections = report.sections
+        for section in COMMON_SECTIONS:
+            text = sections.get(section)
+            columns[column_name(section, prefix)].append(text if include_section_text else text is not None)
+        
+        found = {match.label for match in matcher.iter_matches(sections.get("Chief Complaint", ""))}
+        for label in labels:
+            columns[column_name(label, "symptom")].append(label in found)
+    
+    # Lab values of the whole chunk are extracted and flagged together
+    labs = get_lab_table().extract_many(item.text for item in items)
+    values, flags = labs.matrix()
+    for position, analyte in enumerate(labs.table.analytes):
+        columns[column_name(analyte, "lab")] = values[:, position].tolist()
+        columns[column_name(analyte, "lab") + "_flag"] = flags[:, position].tolist()
+    columns["abnormal_labs"] = labs.abnormal_counts().tolist()
+    return columns
+
+
+def build_frame(columns: Dict[str, List[Any]]) -> "pd.DataFrame":
+    """
+    Turn parsed columns into a typed DataFrame.
+    
+    Post-processing is done on whole columns: ages become nullable integers
+    with an age-group category, genders are normalized to a category, report
+    dates are parsed, each report gets its symptom count, and lab values are
+    stored as float32 (NaN when not reported) with int8 range flags.
+    """
+    import pandas as pd
+    
+    frame = pd.DataFrame(columns)
+    for field in ("report_id", "report_key", "patient_id"):
+        frame[field] = frame[field].astype("string")
+    # The name pattern runs on into the next line when the report has no blank line after it
+    frame["name"] = frame["name"].astype("string").str.split("\n").str[0].str.strip().astype("string")
+    frame["length"] = frame["length"].astype("int32")
+    
+    frame["age"] = pd.to_numeric(frame["age"], errors="coerce").astype("Int16")
+    frame["age_group"] = pd.cut(frame["age"], bins=AGE_GROUP_BINS, labels=AGE_GROUP_LABELS, right=False)
+    
+    gender = frame["gender"].astype("string").str.strip().str.lower()
+    normalized = gender.map(GENDER_VALUES).astype("string")
+    normalized[gender.notna() & normalized.isna()] = "other"
+    frame["gender"] = pd.Categorical(normalized, categories=["female", "male", "other"])
+    
+    frame["date"] = pd.to_datetime(frame["date"], errors="coerce", format="mixed")
+    
+    section_columns = [name for name in frame.columns if name.startswith("section_")]
+    for name in section_columns:
+        frame[name] = frame[name].astype("string")
+    
+    symptom_columns = [name for name in frame.columns if name.startswith("symptom_")]
+    frame["symptom_count"] = frame[symptom_columns].sum(axis=1).astype("int16")
+    
+    lab_columns = [name for name in frame.columns if name.startswith("lab_")]
+    frame[lab_columns] = frame[lab_columns].astype({
+        name: "int8" if name.endswith("_flag") else "float32" for name in lab_columns
+    })
+    frame["abnormal_labs"] = frame["abnormal_labs"].astype("int16")
+    return frame
+
+
+def iter_chunk_columns(items: Iterable[ReportItem],
+                       processes: Optional[int] = None,
+                       chunk_size: Optional[int] = None,
+                       include_section_text: bool = True) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Parse reports a chunk at a time, yielding each chunk's columns in input order.
+    
+    Reports are read lazily and handed to the pool a chunk at a time, with
+    at most two chunks per process outstanding, so only those chunks are
+    ever held in memory.
+    
+    Args:
+        items: The reports (e.g. iter_reports(path))
+        processes: Worker processes (defaults to the CPU count; 1 parses in this process)
+        chunk_size: Reports per task sent to a worker process (defaults to CORPUS_CHUNK_SIZE)
+        include_section_text: Keep each section's text, not only whether it is present
+    
+    Yields:
+        Columns of one chunk (see parse_chunk)
+    """
+    processes = processes or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = settings.CORPUS_CHUNK_SIZE
+    chunks = _chunks(items, max(1, chunk_size))
+    if processes <= 1:
+        for chunk in chunks:
+            yield parse_chunk(chunk, include_section_text)
+        return
+    
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending: Deque[Future] = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(parse_chunk, chunk, include_section_text))
+            if len(pending) >= processes * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def parse_corpus(items: Iterable[ReportItem],
+                 processes: Optional[int] = None,
+                 chunk_size: Optional[int] = None,
+                 include_section_text: bool = True) -> "pd.DataFrame":
+    """
+    Parse many reports into a DataFrame, one row per report in input order.
+    
+    The reports are parsed as iter_chunk_columns() reads them, but the
+    frame holds every row, including each section's text unless
+    include_section_text is False. To turn a corpus larger than memory into
+    a table, use write_corpus(), which writes each chunk as it is parsed.
+    
+    Args:
+        items: The reports (e.g. iter_reports(path))
+        processes: Worker processes (defaults to the CPU count; 1 parses in this process)
+        chunk_size: Reports per task sent to a worker process (defaults to CORPUS_CHUNK_SIZE)
+        include_section_text: Keep each section's text, not only whether it is present
+    
+    Returns:
+        The typed DataFrame (see build_frame)
+    """
+    columns: Dict[str, List[Any]] = {}
+    start = time.monotonic()
+    for chunk_columns in iter_chunk_columns(items, processes, chunk_size, include_section_text):
+        for name, values in chunk_columns.items():
+            columns.setdefault(name, []).extend(values)
+    
+    if not columns:
+        # No reports: still return the full set of columns
+        columns = parse_chunk([], include_section_text)
+    frame = build_frame(columns)
+    logger.info(f"Parsed {len(frame)} reports in {time.monotonic() - start:.1f}s")
+    return frame
+
+
+def write_corpus_frame(frame: "pd.DataFrame", path: str) -> str:
+    """
+    Write a corpus frame to a Parquet file (its directory is created if missing).
+    
+    Returns:
+        The path written
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    frame.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, path)
+    return path
+
+
+def write_corpus(items: Iterable[ReportItem],
+                 path: str,
+                 processes: Optional[int] = None,
+                 chunk_size: Optional[int] = None,
+                 include_section_text: bool = True) -> int:
+    """
+    Parse many reports straight into a Parquet file, one row group per chunk.
+    
+    Each chunk is typed (see build_frame) and written as soon as it is
+    parsed, so memory use stays at a few chunks however large the corpus
+    is. The file is written under a temporary name and only replaces path
+    once complete; load_corpus_frame() reads it back.
+    
+    Args:
+        items: The reports (e.g. iter_reports(path))
+        path: The Parquet file (its directory is created if missing)
+        processes: Worker processes (defaults to the CPU count; 1 parses in this process)
+        chunk_size: Reports per task sent to a worker process (defaults to CORPUS_CHUNK_SIZE)
+        include_section_text: Keep each section's text, not only whether it is present
+    
+    Returns:
+        The number of reports written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    writer: Optional[pq.ParquetWriter] = None
+    rows = 0
+    start = time.monotonic()
+    try:
+        for chunk_columns in iter_chunk_columns(items, processes, chunk_size, include_section_text):
+            table = pa.Table.from_pandas(build_frame(chunk_columns), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(temporary_path, table.schema)
+            elif not table.schema.equals(writer.schema):
+                # e.g. a chunk whose dates parse at another resolution, or that has none at all
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            rows += table.num_rows
+        if writer is None:
+            # No reports: still write the full set of columns
+            writer = pq.ParquetWriter(temporary_path, pa.Table.from_pandas(
+                build_frame(parse_chunk([], include_section_text)), preserve_index=False).schema)
+        writer.close()
+        writer = None
+        os.replace(temporary_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    logger.info(f"Wrote {rows} reports to {path} in {time.monotonic() - start:.1f}s")
+    return rows
+
+
+def load_corpus_frame(path: str, columns: Optional[Sequence[str]] = None) -> "pd.DataFrame":
+    """
+    Read a corpus frame written by write_corpus_frame.
+    
+    Args:
+        path: The Parquet file
+        columns: Read only these columns (the others are not loaded at all)
+    
+    Returns:
+        The DataFrame, with the column types it was written with
+    """
+    import pandas as pd
+    
+    return pd.read_parquet(path, columns=list(columns) if columns is not None else None)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m medical_agents.corpus",
+        description="Parse a directory or JSONL file of medical reports into a Parquet table"
+    )
+    parser.add_argument("input",
+                        help="Directory of .txt/.md reports, a report file, or a JSONL file of {\"id\", \"report\"} objects")
+    parser.add_argument("--output", help="Parquet file (default: data/results/corpus_<input name>.parquet)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=settings.CORPUS_CHUNK_SIZE, help="Reports per worker task")
+    parser.add_argument("--section-text", action=argparse.BooleanOptionalAction, default=True,
+                        help="Store each section's text (otherwise only whether it is present)")
+    parser.add_argument("--log-level", default="WARNING", help="Log level for the console")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    
+    from utils.logger import setup_logger
+    setup_logger(level=args.log_level)
+    # Reports without sections are visible in the table; a warning for each would flood the console
+    logging.getLogger("services.report_parser").setLevel(logging.ERROR)
+    
+    if not os.path.exists(args.input):
+        print(f"Input not found: {args.input}", file=sys.stderr)
+        return 2
+    
+    settings.ensure_directories()
+    output_path = args.output or os.path.join(
+        settings.RESULTS_DIR, f"corpus_{os.path.splitext(os.path.basename(os.path.normpath(args.input)))[0]}.parquet"
+    )
+    
+    start = time.monotonic()
+    try:
+        rows = write_corpus(iter_reports(args.input), output_path, processes=args.processes,
+                            chunk_size=args.chunk_size, include_section_text=args.section_text)
+    except KeyboardInterrupt:
+        print("Interrupted; nothing was written", file=sys.stderr)
+        return 130
+    elapsed = time.monotonic() - start
+    
+    print(f"Parsed {rows} reports in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} reports/s); "
+          f"wrote {output_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
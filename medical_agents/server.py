@@ -0,0 +1,500 @@
+# medical_agents/server.py
+"""
+HTTP API for the specialist analysis, for other services to call.
+
+    python -m medical_agents.server --port 8000
+
+POST /analyze with a JSON body
+    {"report": "...", "specialists": ["cardiologist", "psychologist"],
+     "temperature": 0.2, "max_tokens": 1024, "panel_mode": false,
+     "triage": false, "condense": true, "report_name": "..."}
+returns {"specialist_reports": {...}, "final_diagnosis": "..."} like the app.
+POST /analyze/stream takes the same body and answers with server-sent
+events: "start", "delta" ({"specialist": ..., "text": ...}, with "team" for
+the final synthesis), "specialist" when one report is complete, and
+"result" (or "error") at the end. GET /health reports the admission state.
+
+Each analysis runs the same pipeline as the app (core.pipeline), including
+the panel, group-synthesis, condense and save stages. Its LLM stages run as
+coroutines on the shared background event loop; the pipeline itself is
+driven from a thread of a pool the server owns, while the server's own
+event loop keeps serving. Analyses are admitted while the LLM calls they
+will make, together, fit within the calls the rate-limit governor
+currently allows in flight, so the limit follows the governor as it adapts
+to the API's rate limits; the rest wait in a bounded queue and are turned
+away with 503 when it is full. An analysis keeps its place until its
+pipeline has stopped, even if the client disconnects first.
+"""
+import sys
+import json
+import time
+import asyncio
+import functools
+import threading
+import logging
+import argparse
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import tornado.web
+import tornado.httpserver
+from tornado.iostream import StreamClosedError
+
+from config import settings
+from services.client_pool import get_llm_service
+from services.llm_service import get_governor
+
+if TYPE_CHECKING:
+    from services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class Overloaded(Exception):
+    """Raised when an analysis cannot be admitted; retry_after is a hint in seconds."""
+    
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits the LLM calls that admitted analyses make to the governor's concurrency limit.
+    
+    Each analysis is admitted with the number of calls it will make (one per
+    specialist, group summary and team synthesis), so the analyses running
+    at once together stay within the calls the governor allows in flight.
+    An analysis larger than the whole limit is admitted when nothing else
+    runs. Requests over the limit wait in a queue of at most max_pending
+    entries for up to timeout seconds. Must be used from a single event loop.
+    """
+    
+    def __init__(self,
+                 llm_service: "LLMService",
+                 max_pending: Optional[int] = None,
+                 timeout: Optional[float] = None):
+        """
+        Initialize the controller.
+        
+        Args:
+            llm_service: Service whose preferred backend's governor sets the limit
+            max_pending: Requests allowed to wait for a slot before new ones are rejected
+                (defaults to API_MAX_PENDING)
+            timeout: Seconds a request may wait for a slot (defaults to API_ADMISSION_TIMEOUT)
+        """
+        self.llm_service = llm_service
+        self.max_pending = settings.API_MAX_PENDING if max_pending is None else max_pending
+        self.timeout = settings.API_ADMISSION_TIMEOUT if timeout is None else timeout
+        self.active = 0
+        self.active_calls = 0
+        self.pending = 0
+        self._counters = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+    
+    @property
+    def limit(self) -> int:
+        """LLM calls allowed in flight (the governor's current concurrency limit)."""
+        backend = self.llm_service.routing_policy.candidates()[0]
+        return max(1, int(get_governor(backend.rate_limit_key).concurrency_limit))
+    
+    def _full(self, calls: int) -> bool:
+        return self.active_calls > 0 and self.active_calls + calls > self.limit
+    
+    @asynccontextmanager
+    async def admit(self, calls: int = 1) -> AsyncIterator[None]:
+        """
+        Hold room for one analysis.
+        
+        Args:
+            calls: LLM calls the analysis will make
+        
+        Raises:
+            Overloaded: If the queue is full or no room freed up in time
+        """
+        calls = max(1, calls)
+        if self._full(calls):
+            if self.pending >= self.max_pending:
+                self._counters["rejected"] += 1
+                raise Overloaded("Too many analyses waiting", retry_after=self.timeout)
+            self._counters["queued"] += 1
+            self.pending += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                # The limit moves with the governor, so it is re-read rather than waited on
+                while self._full(calls):
+                    if time.monotonic() >= deadline:
+                        self._counters["timed_out"] += 1
+                        raise Overloaded("Timed out waiting for an analysis slot", retry_after=self.timeout)
+                    await asyncio.sleep(0.05)
+            finally:
+                self.pending -= 1
+        
+        self.active += 1
+        self.active_calls += calls
+        self._counters["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.active_calls -= calls
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._counters)
+        stats.update(active=self.active, active_calls=self.active_calls, pending=self.pending,
+                     limit=self.limit, max_pending=self.max_pending)
+        return stats
+
+
+def parse_analysis_request(body: bytes) -> Dict[str, Any]:
+    """
+    Validate an /analyze request body.
+    
+    Args:
+        body: The raw JSON body
+    
+    Returns:
+        The analysis options with defaults filled in
+    
+    Raises:
+        ValueError: If the body is not a valid request
+    """
+    from core.agent_factory import AgentFactory
+    
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("Request body must be JSON")
+    if not isinstance(request, dict):
+        raise ValueError("Request body must be a JSON object")
+    
+    report = request.get("report")
+    if not isinstance(report, str) or not report.strip():
+        raise ValueError("\"report\" must be a non-empty string")
+    specialists = request.get("specialists")
+    if not isinstance(specialists, list) or not specialists or not all(isinstance(s, str) for s in specialists):
+        raise ValueError("\"specialists\" must be a non-empty list of agent types")
+    specialists = [specialist.lower() for specialist in specialists]
+    unknown = [specialist for specialist in specialists if specialist not in AgentFactory.AGENT_REGISTRY]
+    if unknown:
+        raise ValueError(f"Unknown agent types: {', '.join(unknown)}. "
+                         f"Available types: {', '.join(AgentFactory.AGENT_REGISTRY.keys())}")
+    report_name = request.get("report_name")
+    if report_name is not None and not isinstance(report_name, str):
+        raise ValueError("\"report_name\" must be a string")
+    
+    try:
+        options = {
+            "temperature": float(request.get("temperature", 0.2)),
+            "max_tokens": int(request.get("max_tokens", 1024)),
+            "panel_mode": bool(request.get("panel_mode", False)),
+            "triage": bool(request.get("triage", False)),
+            "condense": bool(request.get("condense", True))
+        }
+    except (TypeError, ValueError):
+        raise ValueError("\"temperature\" and \"max_tokens\" must be numbers")
+    return {"report": report, "specialists": list(dict.fromkeys(specialists)), "report_name": report_name, **options}
+
+
+class AnalysisCancelled(Exception):
+    """Raised inside the pipeline once the client of a streamed analysis has gone away."""
+
+
+class Analysis:
+    """
+    One request's analysis, built on the same pipeline as the app (core.pipeline).
+    
+    Triage runs when the analysis is built, so calls (the LLM calls the
+    pipeline will make) is known before it is admitted. run() drives the
+    pipeline from a worker thread and returns only once it has stopped, so
+    an admission slot is never released while the analysis still makes LLM
+    calls; when streaming, the deltas and finished specialist reports
+    produced by the pipeline are handed to the server's event loop in order.
+    """
+    
+    def __init__(self, request: Dict[str, Any], llm_service: "LLMService", stream: bool = False):
+        """
+        Build the analysis.
+        
+        Args:
+            request: Options from parse_analysis_request
+            llm_service: LLM service shared by the agents
+            stream: Report deltas and finished specialist reports to run()'s on_event
+        """
+        from core.condenser import ReportCondenser
+        from core.pipeline import build_analysis_pipeline
+        from core.triage import get_triage_router
+        from services.report_parser import parse_report
+        
+        report = parse_report(request["report"])
+        self.specialists: List[str] = request["specialists"]
+        self.skipped: List[str] = []
+        if request["triage"]:
+            decision = get_triage_router().route(report, self.specialists)
+            self.specialists, self.skipped = decision.selected, decision.skipped
+            llm_service.metrics.increment("triage_avoided_calls", decision.avoided_calls)
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._events: Optional[asyncio.Queue] = None
+        self._cancelled = threading.Event()
+        self.pipeline = build_analysis_pipeline(
+            medical_report=report,
+            specialist_types=self.specialists,
+            llm_service=llm_service,
+            temperature=request["temperature"],
+            max_tokens=request["max_tokens"],
+            report_name=request["report_name"],
+            panel_mode=request["panel_mode"],
+            on_delta=self._on_delta if stream else None,
+            condenser=ReportCondenser(structured=settings.CONDENSE_STRUCTURED) if request["condense"] else None
+        )
+        self.calls = sum(1 for name in self.pipeline.stages
+                         if name == "panel" or name.startswith(("specialist:", "team:group:")))
+        # The team synthesis runs only with at least 2 specialists
+        self.calls += 1 if len(self.specialists) >= 2 else 0
+    
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        """Queue an event for the server's loop (called from the pipeline's threads and the background loop)."""
+        if self._cancelled.is_set():
+            raise AnalysisCancelled()
+        if self._events is not None:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, (event, data))
+    
+    def _on_delta(self, name: str, delta: str) -> None:
+        self._emit("delta", {"specialist": name, "text": delta})
+    
+    def _on_stage_output(self, name: str, output: Any) -> None:
+        if name.startswith("specialist:"):
+            self._emit("specialist", {"specialist": name.split(":", 1)[1], "report": output})
+        elif name == "panel":
+            # The panel answers in one JSON document, so its reports arrive whole
+            for specialist_type, text in output.items():
+                self._emit("specialist", {"specialist": specialist_type, "report": text})
+    
+    async def run(self,
+                  on_event: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
+                  executor: Optional[Executor] = None) -> Dict[str, Any]:
+        """
+        Run the pipeline without blocking the event loop.
+        
+        If on_event fails (e.g. the client went away) or the caller is
+        cancelled, the remaining output is dropped, but run() still waits for
+        the pipeline to stop before raising.
+        
+        Args:
+            on_event: Awaited with (event name, data) as specialists and the team produce output
+            executor: Pool for the thread that drives the pipeline (the loop's default if None)
+        
+        Returns:
+            Dictionary with "specialist_reports", "final_diagnosis" and "skipped_specialists"
+        
+        Raises:
+            RuntimeError: If no specialist report was produced
+        """
+        self._loop = asyncio.get_running_loop()
+        done = object()
+        if on_event is not None:
+            self._events = asyncio.Queue()
+            await on_event("start", {"specialists": self.specialists, "skipped_specialists": self.skipped})
+        
+        future = self._loop.run_in_executor(executor, functools.partial(
+            self.pipeline.run, on_stage_output=self._on_stage_output if on_event is not None else None
+        ))
+        try:
+            if on_event is not None:
+                future.add_done_callback(lambda _: self._events.put_nowait((done, None)))
+                while True:
+                    event, data = await self._events.get()
+                    if event is done:
+                        break
+                    await on_event(event, data)
+            result = await future
+        except BaseException:
+            # A client that went away should not keep the remaining calls running,
+            # and the calls already in flight still count against admission
+            self._cancelled.set()
+            await _settle(future)
+            raise
+        
+        if "specialists" not in result.outputs:
+            raise RuntimeError("; ".join(f"{stage}: {str(error)}" for stage, error in result.errors.items())
+                               or "No specialist reports were produced")
+        return {
+            "specialist_reports": result.outputs["specialists"],
+            "final_diagnosis": result.outputs.get("team"),
+            "skipped_specialists": self.skipped
+        }
+
+
+async def _settle(future: asyncio.Future) -> None:
+    """Wait for a pipeline run to stop, even if the waiting task is cancelled meanwhile."""
+    while not future.done():
+        try:
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            pass
+
+
+class _AnalysisHandler(tornado.web.RequestHandler):
+    """Shared request parsing, admission and error replies."""
+    
+    def initialize(self, admission: AdmissionController, llm_service: "LLMService", executor: Executor) -> None:
+        self.admission = admission
+        self.llm_service = llm_service
+        self.executor = executor
+    
+    def write_error(self, status_code: int, **kwargs) -> None:
+        self.finish({"error": self._reason})
+    
+    def parse(self) -> Optional[Dict[str, Any]]:
+        """Return the validated request, or None after replying 400."""
+        try:
+            return parse_analysis_request(self.request.body)
+        except ValueError as e:
+            self.send_error(400, reason=str(e))
+            return None
+    
+    def reject(self, error: Overloaded) -> None:
+        logger.warning(f"Rejected {self.request.path}: {str(error)}")
+        # Not send_error, which would drop the Retry-After header
+        self.set_status(503, reason=str(error))
+        self.set_header("Retry-After", str(int(error.retry_after) or 1))
+        self.finish({"error": str(error)})
+
+
+class AnalyzeHandler(_AnalysisHandler):
+    """POST /analyze: run an analysis and return the complete result."""
+    
+    async def post(self) -> None:
+        request = self.parse()
+        if request is None:
+            return
+        analysis = Analysis(request, self.llm_service)
+        try:
+            async with self.admission.admit(analysis.calls):
+                result = await analysis.run(executor=self.executor)
+        except Overloaded as e:
+            self.reject(e)
+            return
+        self.finish(result)
+
+
+class AnalyzeStreamHandler(_AnalysisHandler):
+    """POST /analyze/stream: run an analysis and stream it as server-sent events."""
+    
+    async def send_event(self, event: str, data: Dict[str, Any]) -> None:
+        self.write(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+        await self.flush()
+    
+    async def post(self) -> None:
+        request = self.parse()
+        if request is None:
+            return
+        analysis = Analysis(request, self.llm_service, stream=True)
+        try:
+            async with self.admission.admit(analysis.calls):
+                self.set_header("Content-Type", "text/event-stream")
+                self.set_header("Cache-Control", "no-cache")
+                try:
+                    result = await analysis.run(on_event=self.send_event, executor=self.executor)
+                    await self.send_event("result", result)
+                except StreamClosedError:
+                    # The client went away; stop spending LLM calls on it
+                    logger.info("Client disconnected during a streamed analysis")
+                    return
+                except Exception as e:
+                    logger.error(f"Streamed analysis failed: {str(e)}")
+                    await self.send_event("error", {"error": str(e)})
+        except Overloaded as e:
+            self.reject(e)
+            return
+        except StreamClosedError:
+            return
+        self.finish()
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    """GET /health: admission and LLM statistics."""
+    
+    def initialize(self, admission: AdmissionController, llm_service: "LLMService") -> None:
+        self.admission = admission
+        self.llm_service = llm_service
+    
+    def get(self) -> None:
+        self.finish({"status": "ok", "admission": self.admission.stats(), "llm": self.llm_service.stats()})
+
+
+def make_app(llm_service: Optional["LLMService"] = None,
+             max_pending: Optional[int] = None,
+             admission_timeout: Optional[float] = None,
+             max_analyses: Optional[int] = None) -> tornado.web.Application:
+    """
+    Build the API application.
+    
+    Args:
+        llm_service: LLM service shared by every request (defaults to the pooled one)
+        max_pending: Requests allowed to wait for a slot (defaults to API_MAX_PENDING)
+        admission_timeout: Seconds a request may wait for a slot (defaults to API_ADMISSION_TIMEOUT)
+        max_analyses: Threads driving admitted pipelines (defaults to LLM_MAX_CONCURRENCY, since
+            admission allows at most one analysis per LLM call the governor lets through)
+    
+    Returns:
+        Tornado application to listen with
+    """
+    llm_service = llm_service or get_llm_service()
+    shared_args = {
+        "admission": AdmissionController(llm_service, max_pending=max_pending, timeout=admission_timeout),
+        "llm_service": llm_service
+    }
+    if max_analyses is None:
+        max_analyses = settings.LLM_MAX_CONCURRENCY
+    handler_args = dict(shared_args, executor=ThreadPoolExecutor(max_workers=max(1, max_analyses),
+                                                                 thread_name_prefix="api-analysis"))
+    return tornado.web.Application([
+        (r"/analyze", AnalyzeHandler, handler_args),
+        (r"/analyze/stream", AnalyzeStreamHandler, handler_args),
+        (r"/health", HealthHandler, shared_args)
+    ])
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m medical_agents.server",
+        description="Serve the specialist analysis over HTTP"
+    )
+    parser.add_argument("--host", default=settings.API_HOST, help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=settings.API_PORT, help="Port to listen on")
+    parser.add_argument("--max-pending", type=int, default=settings.API_MAX_PENDING,
+                        help="Requests allowed to wait for an analysis slot before new ones get 503")
+    parser.add_argument("--admission-timeout", type=float, default=settings.API_ADMISSION_TIMEOUT,
+                        help="Seconds a request may wait for an analysis slot")
+    parser.add_argument("--model", default=None, help="Primary Groq model (defaults to GROQ_MODEL)")
+    parser.add_argument("--log-level", default="INFO", help="Log level for the console")
+    return parser.parse_args(argv)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    app = make_app(get_llm_service(model=args.model), max_pending=args.max_pending,
+                   admission_timeout=args.admission_timeout)
+    server = tornado.httpserver.HTTPServer(app, max_body_size=MAX_BODY_BYTES)
+    server.listen(args.port, address=args.host)
+    logger.info(f"Serving the analysis API on http://{args.host}:{args.port}")
+    await asyncio.Event().wait()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    from utils.logger import setup_logger
+    
+    args = parse_args(argv)
+    setup_logger(level=args.log_level)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
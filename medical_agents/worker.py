@@ -0,0 +1,287 @@
+# medical_agents/worker.py
+"""
+Worker process that runs analysis jobs from the shared job queue.
+
+    python -m medical_agents.worker
+    python -m medical_agents.worker --processes 4 --threads 2
+
+The app enqueues jobs when "Run in background worker" is checked. Start as
+many workers as needed, on this machine or on others sharing the queue
+file; each needs its own GROQ_API_KEY (keys are never stored in the queue).
+A job whose worker dies is picked up again once its lease expires, and the
+specialist responses it had already received are reused.
+"""
+import os
+import sys
+import socket
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+from config import settings
+from services.job_queue import Job, JobQueue
+from medical_agents.batch import CHECKPOINT_STAGE_PREFIXES, is_agent_error
+
+if TYPE_CHECKING:
+    from core.pipeline import StageTiming
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_payload(medical_report: str,
+                     specialist_types: Sequence[str],
+                     report_name: Optional[str] = None,
+                     temperature: float = 0.2,
+                     max_tokens: int = 1024,
+                     panel_mode: bool = False,
+                     triage: bool = False,
+                     condense: bool = True,
+                     model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Describe an analysis as a job payload (see build_analysis_pipeline for the arguments).
+    
+    Returns:
+        JSON-serializable payload for JobQueue.enqueue
+    """
+    return {
+        "report": medical_report,
+        "report_name": report_name,
+        "specialists": list(specialist_types),
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "panel_mode": panel_mode,
+        "triage": triage,
+        "condense": condense,
+        "model": model
+    }
+
+
+class Worker:
+    """
+    Claims jobs from the queue and runs the analysis pipeline for each.
+    
+    While a job runs, its lease is renewed by a heartbeat and its progress
+    (stage statuses and the responses received so far) is stored in the
+    queue for the app to poll. Agent errors fail the attempt, and the job is
+    retried by the next claim with its finished stages restored.
+    """
+    
+    def __init__(self,
+                 queue: Optional[JobQueue] = None,
+                 worker_id: Optional[str] = None,
+                 poll_interval: Optional[float] = None,
+                 threads: int = 1):
+        """
+        Initialize the worker.
+        
+        Args:
+            queue: Job queue to take work from (defaults to the one at JOB_QUEUE_PATH)
+            worker_id: Identifier recorded on claimed jobs (defaults to host:pid)
+            poll_interval: Seconds to wait before asking again when the queue is empty
+                (defaults to JOB_POLL_INTERVAL)
+            threads: Jobs run at once by this worker
+        """
+        self.queue = queue or JobQueue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.threads = max(1, threads)
+        self.stop_event = threading.Event()
+    
+    def run_job(self, job: Job, worker_id: str) -> bool:
+        """
+        Run one claimed job to completion.
+        
+        Args:
+            job: The claimed job
+            worker_id: Identifier the job was claimed under
+        
+        Returns:
+            True if the job finished successfully
+        """
+        from core.condenser import ReportCondenser
+        from core.pipeline import build_analysis_pipeline
+        from core.triage import get_triage_router
+        from services.client_pool import get_llm_service
+        from services.report_parser import parse_report
+        
+        payload = job.payload
+        restored = dict(job.progress.get("outputs", {}))
+        progress: Dict[str, Any] = {"stages": {}, "outputs": dict(restored), "skipped_specialists": []}
+        progress_lock = threading.Lock()
+        lease_lost = threading.Event()
+        done = threading.Event()
+        
+        def push_progress() -> None:
+            with progress_lock:
+                if not self.queue.update_progress(job.id, worker_id, progress):
+                    lease_lost.set()
+        
+        def heartbeat() -> None:
+            while not done.wait(self.queue.lease_seconds / 3):
+                if not self.queue.heartbeat(job.id, worker_id):
+                    lease_lost.set()
+                    logger.warning(f"Worker {worker_id} lost the lease on job {job.id}")
+                    return
+        
+        heartbeat_thread = threading.Thread(target=heartbeat, name=f"heartbeat-{job.id[:8]}", daemon=True)
+        heartbeat_thread.start()
+        try:
+            report = parse_report(payload["report"])
+            specialist_types = payload["specialists"]
+            if payload.get("triage"):
+                decision = get_triage_router().route(report, specialist_types)
+                specialist_types = decision.selected
+                progress["skipped_specialists"] = decision.skipped
+            
+            pipeline = build_analysis_pipeline(
+                medical_report=report,
+                specialist_types=specialist_types,
+                llm_service=get_llm_service(model=payload.get("model")),
+                temperature=payload.get("temperature", 0.2),
+                max_tokens=payload.get("max_tokens", 1024),
+                report_name=payload.get("report_name"),
+                panel_mode=payload.get("panel_mode", False),
+                condenser=ReportCondenser(structured=settings.CONDENSE_STRUCTURED) if payload.get("condense", True) else None
+            )
+            
+            def on_stage_output(name: str, output: Any) -> None:
+                if name.startswith(CHECKPOINT_STAGE_PREFIXES) and not is_agent_error(output):
+                    with progress_lock:
+                        progress["outputs"][name] = output
+            
+            def on_stage_done(name: str, timing: "StageTiming") -> None:
+                with progress_lock:
+                    progress["stages"][name] = timing.status
+                push_progress()
+            
+            result = pipeline.run(
+                on_stage_done=on_stage_done,
+                restored={name: output for name, output in restored.items() if name in pipeline.stages},
+                on_stage_output=on_stage_output
+            )
+            # The results file is written by the background save stage
+            result.wait_background()
+            
+            errors = {stage: str(error) for stage, error in result.errors.items()}
+            specialist_reports = result.outputs.get("specialists", {})
+            errors.update({f"specialist:{name}": report for name, report in specialist_reports.items()
+                           if is_agent_error(report)})
+            if is_agent_error(result.outputs.get("team")):
+                errors["team"] = result.outputs["team"]
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            errors = {"worker": str(e)}
+        finally:
+            done.set()
+        
+        if lease_lost.is_set():
+            logger.warning(f"Discarding the result of job {job.id}; another worker has taken it over")
+            return False
+        if errors:
+            self.queue.fail(job.id, worker_id, "; ".join(f"{stage}: {error}" for stage, error in errors.items()))
+            return False
+        
+        condensed = result.outputs.get("condense")
+        self.queue.complete(job.id, worker_id, {
+            "specialist_reports": specialist_reports,
+            "final_diagnosis": result.outputs.get("team"),
+            "skipped_specialists": progress["skipped_specialists"],
+            "saved_to": result.background["save"].result() if "save" in result.background else None,
+            "timing": result.timing_summary(),
+            "condensation": condensed.to_dict() if condensed is not None else None
+        })
+        logger.info(f"Job {job.id} done in {result.total_time:.1f}s")
+        return True
+    
+    def _loop(self, worker_id: str, once: bool) -> None:
+        while not self.stop_event.is_set():
+            job = self.queue.claim(worker_id)
+            if job is None:
+                if once:
+                    return
+                self.stop_event.wait(self.poll_interval)
+                continue
+            self.run_job(job, worker_id)
+    
+    def run(self, once: bool = False) -> None:
+        """
+        Process jobs until stopped.
+        
+        Args:
+            once: Return as soon as the queue is empty instead of waiting for more jobs
+        """
+        logger.info(f"Worker {self.worker_id} started ({self.threads} thread(s), queue {self.queue.db_path})")
+        threads = [
+            threading.Thread(target=self._loop, args=(f"{self.worker_id}:{index}", once), name=f"worker-{index}")
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.info(f"Worker {self.worker_id} stopped")
+    
+    def stop(self) -> None:
+        """Stop claiming jobs; jobs already running are finished first."""
+        self.stop_event.set()
+
+
+def _run_worker(args: argparse.Namespace) -> None:
+    from utils.logger import setup_logger
+    setup_logger(level=args.log_level)
+    
+    worker = Worker(
+        queue=JobQueue(db_path=args.queue, lease_seconds=args.lease_seconds),
+        poll_interval=args.poll_interval,
+        threads=args.threads
+    )
+    # Finish the jobs in hand on Ctrl+C or SIGTERM rather than leaving them to lease expiry
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    worker.run(once=args.once)
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m medical_agents.worker",
+        description="Run analysis jobs enqueued by the app"
+    )
+    parser.add_argument("--queue", default=settings.JOB_QUEUE_PATH, help="Job queue SQLite file")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+    parser.add_argument("--threads", type=int, default=1, help="Jobs run at once by each process")
+    parser.add_argument("--lease-seconds", type=float, default=settings.JOB_LEASE_SECONDS,
+                        help="How long a claimed job stays reserved without a heartbeat")
+    parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL,
+                        help="Seconds between checks of an empty queue")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--log-level", default="INFO", help="Log level for the console")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.processes <= 1:
+        _run_worker(args)
+        return 0
+    
+    processes: List[multiprocessing.Process] = [
+        multiprocessing.Process(target=_run_worker, args=(args,), name=f"medical-agents-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # The children received the same SIGINT and are finishing their jobs
+        for process in processes:
+            process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+# services/client_pool.py
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Hashable, Optional, Tuple
+
+from config import settings
+from services.llm_service import LLMService, get_governor
+from services.llm_router import RoutingPolicy
+
+logger = logging.getLogger(__name__)
+
+class _PoolEntry:
+    """A pooled service and when it was last handed out."""
+    
+    def __init__(self, service: LLMService):
+        self.service = service
+        self.last_used = time.monotonic()
+        self.warmed = False
+
+
+class ClientPool:
+    """
+    Process-wide pool of LLM services keyed by API key and model, or by API
+    key and routing policy.
+    
+    A pooled service keeps its HTTP clients, and with them their keep-alive
+    connections, so repeat analyses, Streamlit reruns and other sessions
+    using the same key skip client construction and the TLS handshake.
+    Services that have not been handed out for idle_seconds are closed and
+    dropped on the next pool access. A service built for a routing policy is
+    reused for as long as that policy object is, so its latency and error
+    statistics, clients and in-flight state accumulate across callers.
+    """
+    
+    def __init__(self, idle_seconds: Optional[float] = None):
+        """
+        Initialize the pool.
+        
+        Args:
+            idle_seconds: How long an unused service is kept before eviction (defaults to LLM_CLIENT_IDLE_SECONDS)
+        """
+        self.idle_seconds = settings.LLM_CLIENT_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        self._entries: Dict[Tuple[str, Hashable], _PoolEntry] = {}
+        self._lock = threading.Lock()
+        self._warmer: Optional[ThreadPoolExecutor] = None
+        self._counters = {"created": 0, "reused": 0, "evicted": 0, "warmed": 0}
+    
+    def get(self,
+            api_key: Optional[str] = None,
+            model: Optional[str] = None,
+            routing_policy: Optional[RoutingPolicy] = None) -> LLMService:
+        """
+        Return the shared service for an API key and model, creating it on first use.
+        
+        Args:
+            api_key: Groq API key (defaults to environment variable)
+            model: Model identifier (defaults to environment variable)
+            routing_policy: Backend routing to use instead of the policy built for the model
+        
+        Returns:
+            Pooled LLMService
+        
+        Raises:
+            ValueError: If no API key is available
+        """
+        return self._entry(api_key, model, routing_policy).service
+    
+    def _entry(self,
+               api_key: Optional[str],
+               model: Optional[str],
+               routing_policy: Optional[RoutingPolicy] = None) -> _PoolEntry:
+        key = (api_key or settings.GROQ_API_KEY or "", routing_policy or model or settings.GROQ_MODEL)
+        self._evict_idle()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._counters["reused"] += 1
+                entry.last_used = time.monotonic()
+                return entry
+        
+        # Built outside the lock; a concurrent builder for the same key loses the race below
+        if routing_policy is not None:
+            service = LLMService(api_key=key[0] or None, routing_policy=routing_policy)
+        else:
+            service = LLMService(api_key=key[0] or None, model=key[1])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _PoolEntry(service)
+                self._counters["created"] += 1
+            else:
+                self._counters["reused"] += 1
+            entry.last_used = time.monotonic()
+            return entry
+    
+    def prewarm(self, api_key: Optional[str] = None, model: Optional[str] = None) -> Optional[Future]:
+        """
+        Create the service for a key and open its connections in the background.
+        
+        Args:
+            api_key: Groq API key (defaults to environment variable)
+            model: Model identifier (defaults to environment variable)
+        
+        Returns:
+            Future of the warm-up, or None if the service was already warm
+        """
+        entry = self._entry(api_key, model)
+        with self._lock:
+            if entry.warmed:
+                return None
+            entry.warmed = True
+            if self._warmer is None:
+                self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-prewarm")
+            self._counters["warmed"] += 1
+        return self._warmer.submit(entry.service.warm)
+    
+    def _in_use(self, service: LLMService) -> bool:
+        """Whether any backend of the service has calls in flight."""
+        return any(get_governor(backend.rate_limit_key).stats()["in_flight"]
+                   for backend in service.routing_policy.candidates())
+    
+    def _evict_idle(self) -> None:
+        """Close and drop services that have been idle for longer than idle_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items()
+                    if now - entry.last_used > self.idle_seconds and not self._in_use(entry.service)]
+            evicted = [self._entries.pop(key) for key in idle]
+            self._counters["evicted"] += len(evicted)
+        for entry in evicted:
+            logger.info(f"Evicting idle LLM service for model {entry.service.model}")
+            entry.service.close()
+    
+    def clear(self) -> None:
+        """Close and drop every pooled service."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.service.close()
+    
+    def stats(self) -> Dict[str, float]:
+        """
+        Return pool counters.
+        
+        Returns:
+            Dictionary with services created, reused, evicted and warmed, the
+            number currently pooled and the reuse rate
+        """
+        self._evict_idle()
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pooled"] = len(self._entries)
+        requests = stats["created"] + stats["reused"]
+        stats["reuse_rate"] = stats["reused"] / requests if requests else 0.0
+        return stats
+
+
+_default_pool: Optional[ClientPool] = None
+_default_pool_lock = threading.Lock()
+
+def get_client_pool() -> ClientPool:
+    """Return the process-wide client pool."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool()
+        return _default_pool
+
+
+def get_llm_service(api_key: Optional[str] = None,
+                    model: Optional[str] = None,
+                    routing_policy: Optional[RoutingPolicy] = None) -> LLMService:
+    """
+    Return the shared LLM service for an API key and model, or for a routing policy.
+    
+    Args:
+        api_key: Groq API key (defaults to environment variable)
+        model: Model identifier (defaults to environment variable)
+        routing_policy: Backend routing to use instead of the policy built for the model
+    
+    Returns:
+        Pooled LLMService
+    """
+    return get_client_pool().get(api_key, model, routing_policy)
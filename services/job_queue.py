@@ -0,0 +1,248 @@
+# services/job_queue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    """One analysis job as stored in the queue."""
+    
+    def __init__(self, row: sqlite3.Row):
+        self.id: str = row["id"]
+        self.status: str = row["status"]
+        self.payload: Dict[str, Any] = json.loads(row["payload"])
+        self.progress: Dict[str, Any] = json.loads(row["progress"]) if row["progress"] else {}
+        self.result: Optional[Dict[str, Any]] = json.loads(row["result"]) if row["result"] else None
+        self.error: Optional[str] = row["error"]
+        self.attempts: int = row["attempts"]
+        self.max_attempts: int = row["max_attempts"]
+        self.worker: Optional[str] = row["worker"]
+        self.lease_until: Optional[float] = row["lease_until"]
+        self.created_at: float = row["created_at"]
+        self.updated_at: float = row["updated_at"]
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "attempts": self.attempts,
+            "worker": self.worker,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file shared by the app and the workers.
+    
+    Workers claim the oldest queued job with a lease and must renew it with
+    heartbeat() while they work. A job whose lease runs out (its worker died
+    or hung) is handed to the next worker that asks, until it has been tried
+    max_attempts times. Every state change is a single transaction, so any
+    number of worker processes can share the file, on one machine or on
+    several machines mounting a filesystem with working SQLite locking.
+    """
+    
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 lease_seconds: Optional[float] = None,
+                 max_attempts: Optional[int] = None):
+        """
+        Initialize the queue.
+        
+        Args:
+            db_path: Path of the SQLite file, created if missing (defaults to JOB_QUEUE_PATH)
+            lease_seconds: How long a claim lasts without a heartbeat (defaults to JOB_LEASE_SECONDS)
+            max_attempts: Claims allowed per job before it is marked failed (defaults to JOB_MAX_ATTEMPTS)
+        """
+        self.db_path = settings.JOB_QUEUE_PATH if db_path is None else db_path
+        self.lease_seconds = settings.JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Must be called with the lock held."""
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Transactions are managed explicitly so that claims can take the write lock up front
+            self._conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, "
+                "progress TEXT, result TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "worker TEXT, lease_until REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        return self._conn
+    
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        """
+        Add a job.
+        
+        Args:
+            payload: JSON-serializable description of the work
+        
+        Returns:
+            The new job's id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, status, payload, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), self.max_attempts, now, now)
+            )
+        logger.info(f"Enqueued job {job_id}")
+        return job_id
+    
+    def claim(self, worker_id: str) -> Optional[Job]:
+        """
+        Claim the oldest job that is queued or whose lease has expired.
+        
+        Args:
+            worker_id: Identifier of the claiming worker
+        
+        Returns:
+            The claimed job, or None if there is nothing to do
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs abandoned by a dead worker that have used up their attempts are failed, not retried
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= max_attempts",
+                    (FAILED, "Lease expired too many times", now, RUNNING, now)
+                )
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE id = ?",
+                    (RUNNING, worker_id, now + self.lease_seconds, now, row["id"])
+                )
+                job = Job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        logger.info(f"Worker {worker_id} claimed job {job.id} (attempt {job.attempts})")
+        return job
+    
+    def _update_owned(self, job_id: str, worker_id: str, assignments: str, values: tuple) -> bool:
+        """Apply an update only if the worker still holds the job. Returns whether it did."""
+        with self._lock:
+            cursor = self._connect().execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND worker = ? AND status = ?",
+                values + (time.time(), job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+    
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """
+        Renew a worker's lease on a job.
+        
+        Returns:
+            False if the lease was lost (it expired and another worker took the job)
+        """
+        return self._update_owned(job_id, worker_id, "lease_until = ?", (time.time() + self.lease_seconds,))
+    
+    def update_progress(self, job_id: str, worker_id: str, progress: Dict[str, Any]) -> bool:
+        """Store a running job's progress for the app to poll (also renews the lease)."""
+        return self._update_owned(job_id, worker_id, "progress = ?, lease_until = ?",
+                                  (json.dumps(progress), time.time() + self.lease_seconds))
+    
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Mark a job done and store its result.
+        
+        Returns:
+            False if the worker no longer held the job (its result is discarded)
+        """
+        return self._update_owned(job_id, worker_id, "status = ?, result = ?, error = NULL, lease_until = NULL",
+                                  (DONE, json.dumps(result)))
+    
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt; the job is queued again unless it has used up its attempts.
+        
+        Args:
+            job_id: The job
+            worker_id: The worker that held it
+            error: Description of the failure
+            retry: Allow another attempt
+        
+        Returns:
+            False if the worker no longer held the job
+        """
+        with self._lock:
+            row = self._connect().execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        status = QUEUED if retry and row is not None and row["attempts"] < row["max_attempts"] else FAILED
+        return self._update_owned(job_id, worker_id, "status = ?, error = ?, worker = NULL, lease_until = NULL",
+                                  (status, error))
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job by id, or None if it does not exist."""
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job(row) if row is not None else None
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the number of jobs in each status."""
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["count"] for row in rows}
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_queue: Optional[JobQueue] = None
+_default_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue at JOB_QUEUE_PATH."""
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+        return _default_queue
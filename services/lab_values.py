@@ -0,0 +1,385 @@
+# services/lab_values.py
+import re
+import csv
+import bisect
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from services.term_matcher import TermMatcher
+
+logger = logging.getLogger(__name__)
+
+LOW = -1
+NORMAL = 0
+HIGH = 1
+
+# Unit codes of values given without a unit, and with a unit the table does not know
+NO_UNIT = -1
+OTHER_UNIT = -2
+
+
+class LabReference(NamedTuple):
+    """Reference range of one analyte."""
+    analyte: str
+    unit: str
+    low: float
+    high: float
+    aliases: Tuple[str, ...] = ()
+    # Agent type an abnormal value concerns, for triage
+    specialty: Optional[str] = None
+
+
+# Adult reference ranges; values reported in another unit are extracted but not flagged
+REFERENCE_RANGES: List[LabReference] = [
+    LabReference("hemoglobin", "g/dL", 12.0, 17.5, ("hgb", "haemoglobin")),
+    LabReference("white blood cells", "10^3/uL", 4.0, 11.0, ("wbc", "white blood cell count", "leukocytes")),
+    LabReference("platelets", "10^3/uL", 150.0, 450.0, ("platelet count", "plt")),
+    LabReference("glucose", "mg/dL", 70.0, 99.0, ("blood glucose", "fasting glucose", "blood sugar")),
+    LabReference("hba1c", "%", 4.0, 5.6, ("a1c", "hemoglobin a1c")),
+    LabReference("sodium", "mmol/L", 135.0, 145.0),
+    LabReference("potassium", "mmol/L", 3.5, 5.1),
+    LabReference("creatinine", "mg/dL", 0.6, 1.3),
+    LabReference("blood urea nitrogen", "mg/dL", 7.0, 20.0, ("bun",)),
+    LabReference("alt", "U/L", 7.0, 56.0, ("alanine aminotransferase",)),
+    LabReference("ast", "U/L", 10.0, 40.0, ("aspartate aminotransferase",)),
+    LabReference("tsh", "mIU/L", 0.4, 4.0, ("thyroid stimulating hormone",)),
+    LabReference("c-reactive protein", "mg/L", 0.0, 10.0, ("crp",)),
+    LabReference("troponin", "ng/mL", 0.0, 0.04, ("troponin i", "troponin t"), "cardiologist"),
+    LabReference("total cholesterol", "mg/dL", 0.0, 200.0, ("cholesterol",), "cardiologist"),
+    LabReference("ldl", "mg/dL", 0.0, 100.0, ("ldl cholesterol",), "cardiologist"),
+    LabReference("hdl", "mg/dL", 40.0, 200.0, ("hdl cholesterol",), "cardiologist"),
+    LabReference("triglycerides", "mg/dL", 0.0, 150.0, (), "cardiologist"),
+    LabReference("systolic blood pressure", "mmHg", 90.0, 129.0, ("systolic bp", "sbp"), "cardiologist"),
+    LabReference("diastolic blood pressure", "mmHg", 60.0, 79.0, ("diastolic bp", "dbp"), "cardiologist"),
+    LabReference("heart rate", "bpm", 60.0, 100.0, ("pulse", "hr"), "cardiologist"),
+    LabReference("ejection fraction", "%", 55.0, 70.0, ("ef", "lvef"), "cardiologist"),
+    LabReference("oxygen saturation", "%", 95.0, 100.0, ("spo2", "o2 saturation", "o2 sat"), "pulmonologist"),
+    LabReference("respiratory rate", "breaths/min", 12.0, 20.0, (), "pulmonologist"),
+    LabReference("temperature", "C", 36.1, 37.2, ("temp",)),
+    LabReference("bmi", "kg/m2", 18.5, 24.9, ("body mass index",))
+]
+
+# Terms reported as a pair of values ("blood pressure 122/78 mmHg")
+PAIRED_ANALYTES: Dict[str, Tuple[str, str]] = {
+    "blood pressure": ("systolic blood pressure", "diastolic blood pressure"),
+    "bp": ("systolic blood pressure", "diastolic blood pressure")
+}
+
+# Spellings of the same unit
+UNIT_ALIASES: Dict[str, str] = {
+    "x10^3/ul": "10^3/ul", "k/ul": "10^3/ul", "10^9/l": "10^3/ul", "x10^9/l": "10^3/ul", "k/mm3": "10^3/ul",
+    "meq/l": "mmol/l", "iu/l": "u/l", "uiu/ml": "miu/l", "beats/min": "bpm", "/min": "breaths/min",
+    "kg/m^2": "kg/m2", "°c": "c", "°f": "f"
+}
+
+# Units no reference range uses, known so that values in them are not flagged
+OTHER_UNITS = ("F", "umol/L", "g/L", "mmol/mol", "pg/mL", "mg/mmol")
+
+# Names that are also ordinary abbreviations ("hr" for hour); a value after them counts only with a unit
+UNIT_REQUIRED_TERMS = frozenset({"hr", "ef", "temp"})
+
+# Words marking a line, or a heading over the lines below it, as lab results or vital signs
+_LAB_CONTEXT = re.compile(
+    r"\b(?:labs?|laboratory|vitals?|results?|blood ?work|blood tests?|cbc|bmp|cmp|panel|chemistry|hematology)\b",
+    re.IGNORECASE
+)
+# Lines looked back through for a heading
+_CONTEXT_LINES = 30
+
+# After an analyte's name: a short gap without digits or clause punctuation, then the value,
+# an optional second value ("122/78") and an optional unit
+_VALUE = re.compile(
+    r"(?:[^\S\n]*\([^()\n]{0,20}\))?[^0-9\n.;,()]{0,24}?(?<![\w.])[<>≤≥]?=?\s*"
+    r"(?P<value>\d+(?:\.\d+)?)(?:\s*/\s*(?P<second>\d+(?:\.\d+)?))?"
+    r"(?:[^\S\n]*(?P<unit>%|°?[A-Za-zµμ/][A-Za-zµμ0-9/^]*))?"
+)
+
+
+def normalize_unit(unit: str) -> str:
+    """Lowercase a unit and map its common spellings to one."""
+    unit = unit.strip().lower().replace("µ", "u").replace("μ", "u").replace(" ", "")
+    return UNIT_ALIASES.get(unit, unit)
+
+
+class LabValues:
+    """
+    Numeric lab values found in one or more reports, as parallel NumPy arrays.
+    
+    Row i is one value: report[i] is the index of the report it came from
+    (always 0 for a single report), analyte[i] the index of its analyte in
+    the LabTable, value[i] the number, unit[i] the index of its unit in the
+    table's units (NO_UNIT, or OTHER_UNIT for a unit the table does not
+    know), and flag[i] LOW, NORMAL or HIGH. checked[i] is False when the
+    unit differs from the reference range's, in which case the flag is
+    NORMAL. A value given without a unit is taken to be in the range's unit
+    only where context[i] is True, i.e. it was found in a lab context (see
+    LabTable); elsewhere it is kept but not checked.
+    """
+    
+    __slots__ = ("table", "report", "analyte", "value", "unit", "context", "flag", "checked", "report_count")
+    
+    def __init__(self,
+                 table: "LabTable",
+                 report: np.ndarray,
+                 analyte: np.ndarray,
+                 value: np.ndarray,
+                 unit: np.ndarray,
+                 context: np.ndarray,
+                 report_count: int):
+        self.table = table
+        self.report = report
+        self.analyte = analyte
+        self.value = value
+        self.unit = unit
+        self.context = context
+        self.report_count = report_count
+        
+        # One comparison over all values at once
+        self.checked = ((unit == NO_UNIT) & context) | (unit == table.unit_index[analyte])
+        flag = (value > table.high[analyte]).astype(np.int8) - (value < table.low[analyte]).astype(np.int8)
+        self.flag = np.where(self.checked, flag, np.int8(NORMAL)).astype(np.int8)
+    
+    def __len__(self) -> int:
+        return len(self.value)
+    
+    @property
+    def abnormal(self) -> np.ndarray:
+        """Mask of the values outside their reference range."""
+        return self.flag != NORMAL
+    
+    def abnormal_counts(self) -> np.ndarray:
+        """Number of abnormal values in each report."""
+        return np.bincount(self.report[self.abnormal], minlength=self.report_count)
+    
+    def matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fixed-width numeric features: one row per report, one column per analyte of the table.
+        
+        Returns:
+            (values, flags): float32 values (NaN where an analyte was not reported)
+            and int8 flags; an analyte reported twice keeps its last value
+        """
+        values = np.full((self.report_count, len(self.table)), np.nan, dtype=np.float32)
+        flags = np.zeros((self.report_count, len(self.table)), dtype=np.int8)
+        if len(self):
+            cells = self.report.astype(np.int64) * len(self.table) + self.analyte
+            # Index of the last occurrence of each (report, analyte) cell
+            _, first_from_end = np.unique(cells[::-1], return_index=True)
+            last = len(cells) - 1 - first_from_end
+            values.flat[cells[last]] = self.value[last]
+            flags.flat[cells[last]] = self.flag[last]
+        return values, flags
+    
+    def abnormal_analytes(self, report: int = 0) -> List[str]:
+        """Names of the analytes outside their range in one report."""
+        mask = self.abnormal & (self.report == report)
+        return list(dict.fromkeys(self.table.analytes[index] for index in self.analyte[mask]))
+    
+    def abnormal_by_specialty(self, report: int = 0) -> Dict[str, List[str]]:
+        """The analytes outside their range in one report, grouped by the agent type they concern."""
+        grouped: Dict[str, List[str]] = {}
+        for analyte in self.abnormal_analytes(report):
+            specialty = self.table.specialties[self.table.analytes.index(analyte)]
+            if specialty:
+                grouped.setdefault(specialty, []).append(analyte)
+        return grouped
+    
+    def to_records(self) -> List[Dict[str, Union[str, float, int, bool, None]]]:
+        """The values as dictionaries (for JSON)."""
+        units = self.table.units
+        return [
+            {
+                "report": int(report),
+                "analyte": self.table.analytes[analyte],
+                "value": float(value),
+                "unit": units[unit] if unit >= 0 else None,
+                "flag": int(flag),
+                "checked": bool(checked)
+            }
+            for report, analyte, value, unit, flag, checked in zip(
+                self.report, self.analyte, self.value, self.unit, self.flag, self.checked
+            )
+        ]
+
+
+class LabTable:
+    """
+    Reference ranges and the extractor that reads lab values against them.
+    
+    Analyte names and aliases are found in one pass over the text by a
+    TermMatcher; each is followed by its value and optional unit. Ranges are
+    kept as arrays indexed like the analytes, so the values of any number of
+    reports are flagged with a handful of vectorized comparisons.
+    
+    A number without a unit is only compared with the range in a lab
+    context: on a line that mentions labs, results or vital signs, or under
+    a heading (a line ending in ":") that does, within the same paragraph.
+    Names in UNIT_REQUIRED_TERMS are ignored unless a unit follows the value.
+    """
+    
+    def __init__(self, references: Sequence[LabReference] = REFERENCE_RANGES):
+        """
+        Build the table.
+        
+        Args:
+            references: Reference range of each analyte
+        """
+        self.references = list(references)
+        self.analytes = [reference.analyte for reference in self.references]
+        self.low = np.array([reference.low for reference in self.references], dtype=np.float64)
+        self.high = np.array([reference.high for reference in self.references], dtype=np.float64)
+        self.specialties = [reference.specialty for reference in self.references]
+        
+        index = {analyte: position for position, analyte in enumerate(self.analytes)}
+        # Every unit the table can compare, by normalized spelling; units[code] is how it is shown
+        self.units: List[str] = []
+        self._unit_codes: Dict[str, int] = {}
+        for unit in ([reference.unit for reference in self.references] + list(OTHER_UNITS)
+                     + sorted(set(UNIT_ALIASES.values()))):
+            if normalize_unit(unit) not in self._unit_codes:
+                self._unit_codes[normalize_unit(unit)] = len(self.units)
+                self.units.append(unit)
+        self.unit_index = np.array([self._unit_codes[normalize_unit(reference.unit)] for reference in self.references],
+                                   dtype=np.int32)
+        
+        terms = []
+        for reference in self.references:
+            terms.extend((name, reference.analyte) for name in (reference.analyte,) + tuple(reference.aliases))
+        for name, (first, second) in PAIRED_ANALYTES.items():
+            if first in index and second in index:
+                terms.append((name, name))
+        self._index = index
+        self._matcher = TermMatcher(terms)
+    
+    def __len__(self) -> int:
+        return len(self.references)
+    
+    @staticmethod
+    def _in_lab_context(text: str, position: int, line_starts: List[int]) -> bool:
+        """Whether the line at position, or the heading above it in the same paragraph, marks lab results."""
+        line = bisect.bisect_right(line_starts, position) - 1
+        for index in range(line, max(line - _CONTEXT_LINES, -1), -1):
+            end = line_starts[index + 1] - 1 if index + 1 < len(line_starts) else len(text)
+            content = text[line_starts[index]:end].strip()
+            if index < line and not content:
+                return False
+            if _LAB_CONTEXT.search(content):
+                return True
+            if index < line and content.endswith(":"):
+                return False
+        return False
+    
+    def _scan(self, text: str, report: int, rows: Tuple[List[int], ...]) -> None:
+        report_rows, analyte_rows, value_rows, unit_rows, context_rows = rows
+        line_starts: Optional[List[int]] = None
+        end = -1
+        # Longest name first at each position; names inside an earlier match are skipped
+        for match in sorted(self._matcher.iter_matches(text), key=lambda item: (item.start, -item.end)):
+            if match.start < end:
+                continue
+            found = _VALUE.match(text, match.end)
+            if found is None:
+                continue
+            end = found.end()
+            unit_code = NO_UNIT
+            if found.group("unit") is not None:
+                unit_code = self._unit_codes.get(normalize_unit(found.group("unit")), NO_UNIT)
+                if unit_code == NO_UNIT and "/" in found.group("unit"):
+                    unit_code = OTHER_UNIT
+                # Otherwise it is a word after the number ("82 today"), not a unit
+            if unit_code == NO_UNIT and match.term in UNIT_REQUIRED_TERMS:
+                # "hr 2 weeks ago"
+                continue
+            context = True
+            if unit_code == NO_UNIT:
+                if line_starts is None:
+                    line_starts = [0] + [newline.end() for newline in re.finditer("\n", text)]
+                context = self._in_lab_context(text, match.start, line_starts)
+            
+            pair = PAIRED_ANALYTES.get(match.label)
+            if pair is not None:
+                if found.group("second") is None:
+                    continue
+                values = zip(pair, (found.group("value"), found.group("second")))
+            else:
+                values = ((match.label, found.group("value")),)
+            for analyte, value in values:
+                report_rows.append(report)
+                analyte_rows.append(self._index[analyte])
+                value_rows.append(float(value))
+                unit_rows.append(unit_code)
+                context_rows.append(context)
+    
+    def extract_many(self, texts: Iterable[str]) -> LabValues:
+        """
+        Extract the lab values of many reports into one set of arrays.
+        
+        Args:
+            texts: Report texts (or the sections to read, e.g. the lab sections)
+        
+        Returns:
+            LabValues whose report array gives each value's position in texts
+        """
+        rows: Tuple[List[int], List[int], List[float], List[int], List[bool]] = ([], [], [], [], [])
+        count = 0
+        for count, text in enumerate(texts, start=1):
+            self._scan(text, count - 1, rows)
+        report_rows, analyte_rows, value_rows, unit_rows, context_rows = rows
+        return LabValues(
+            self,
+            report=np.array(report_rows, dtype=np.int32),
+            analyte=np.array(analyte_rows, dtype=np.int16),
+            value=np.array(value_rows, dtype=np.float64),
+            unit=np.array(unit_rows, dtype=np.int32),
+            context=np.array(context_rows, dtype=bool),
+            report_count=count
+        )
+    
+    def extract(self, text: str) -> LabValues:
+        """Extract the lab values of one report."""
+        return self.extract_many((text,))
+    
+    @classmethod
+    def from_csv(cls, path: str) -> "LabTable":
+        """
+        Load reference ranges from a CSV file.
+        
+        The file has a header row with the columns analyte, unit, low, high
+        and optionally aliases ("|"-separated) and specialty.
+        
+        Args:
+            path: The CSV file (UTF-8)
+        
+        Returns:
+            The table
+        """
+        references = []
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            for row in csv.DictReader(file):
+                aliases = tuple(alias.strip() for alias in (row.get("aliases") or "").split("|") if alias.strip())
+                references.append(LabReference(
+                    analyte=row["analyte"].strip().lower(),
+                    unit=row["unit"].strip(),
+                    low=float(row["low"]),
+                    high=float(row["high"]),
+                    aliases=aliases,
+                    specialty=(row.get("specialty") or "").strip().lower() or None
+                ))
+        logger.info(f"Loaded {len(references)} lab reference ranges from {path}")
+        return cls(references)
+
+
+_default_table: Optional[LabTable] = None
+_default_table_lock = threading.Lock()
+
+def get_lab_table() -> LabTable:
+    """Return the process-wide lab table (LAB_REFERENCE_PATH, or the built-in ranges)."""
+    global _default_table
+    with _default_table_lock:
+        if _default_table is None:
+            from config.settings import LAB_REFERENCE_PATH
+            _default_table = LabTable.from_csv(LAB_REFERENCE_PATH) if LAB_REFERENCE_PATH else LabTable()
+        return _default_table
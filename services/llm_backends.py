@@ -0,0 +1,263 @@
+# services/llm_backends.py
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from config import settings
+
+# groq and httpx take a few hundred milliseconds to import, so they are only
+# imported when a backend first builds its client
+if TYPE_CHECKING:
+    import httpx
+    from groq import AsyncGroq
+
+logger = logging.getLogger(__name__)
+
+class CompletionResult(NamedTuple):
+    """Text of a completion plus the metadata the rate-limit governor uses."""
+    text: str
+    headers: Optional[Mapping[str, str]] = None
+    total_tokens: Optional[int] = None
+
+
+class LLMBackend(ABC):
+    """
+    A chat-completion endpoint that LLMService can route calls to.
+    
+    Implementations are stateless apart from their HTTP clients, so one
+    instance can be shared by every service in the process. The clients
+    belong to the event loop that first used them (normally the background
+    loop every LLMService call runs on).
+    """
+    
+    def __init__(self, model: str, rate_limit_key: str):
+        """
+        Initialize the backend.
+        
+        Args:
+            model: Model identifier sent with every request
+            rate_limit_key: Calls sharing this key share one rate-limit governor
+        """
+        self.model = model
+        self.rate_limit_key = rate_limit_key
+    
+    @property
+    def label(self) -> str:
+        """Human-readable identifier used in logs and routing statistics."""
+        return f"{self.__class__.__name__}:{self.model}"
+    
+    async def warm_async(self) -> None:
+        """Open a connection ahead of the first call (no-op unless overridden)."""
+    
+    async def close_async(self) -> None:
+        """Close the backend's connections; they are reopened on next use."""
+    
+    @abstractmethod
+    async def complete_async(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                             timeout: Optional[float] = None) -> CompletionResult:
+        """Return a full completion for the messages."""
+    
+    @abstractmethod
+    async def stream_async(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                           timeout: Optional[float] = None) -> Tuple[Optional[Mapping[str, str]], AsyncIterator[str]]:
+        """Start a streamed completion and return its response headers and text deltas."""
+
+
+def _keepalive_limits() -> "httpx.Limits":
+    """Connection limits that keep idle connections open for reuse between calls."""
+    import httpx
+    return httpx.Limits(max_keepalive_connections=settings.LLM_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY)
+
+
+# Bound for the request that opens a connection ahead of the first call
+WARM_TIMEOUT = 10.0
+
+
+def _timeout_kwargs(timeout: Optional[float]) -> Dict[str, float]:
+    """Per-request timeout argument (omitted so the client default applies)."""
+    return {"timeout": timeout} if timeout is not None else {}
+
+
+def _chunk_text(chunk: Any) -> str:
+    """Extract the text delta from a streamed completion chunk."""
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+class GroqBackend(LLMBackend):
+    """Backend for the Groq chat-completions API."""
+    
+    def __init__(self, api_key: str, model: str):
+        """
+        Initialize the Groq backend.
+        
+        Args:
+            api_key: Groq API key
+            model: Groq model identifier
+        """
+        super().__init__(model=model, rate_limit_key=api_key)
+        self.api_key = api_key
+        self._async_client = None
+    
+    @property
+    def async_client(self) -> "AsyncGroq":
+        if self._async_client is None:
+            from groq import AsyncGroq, DefaultAsyncHttpxClient
+            # Retries are handled by LLMService, so the SDK's own retries are disabled
+            self._async_client = AsyncGroq(api_key=self.api_key, max_retries=0,
+                                           http_client=DefaultAsyncHttpxClient(limits=_keepalive_limits()))
+        return self._async_client
+    
+    async def warm_async(self) -> None:
+        # Listing models is the cheapest authenticated request; it leaves a live connection in the pool
+        await self.async_client.models.list(timeout=WARM_TIMEOUT)
+    
+    async def close_async(self) -> None:
+        if self._async_client is not None:
+            client, self._async_client = self._async_client, None
+            await client.close()
+    
+    async def complete_async(self, messages, temperature, max_tokens, timeout=None) -> CompletionResult:
+        raw = await self.async_client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **_timeout_kwargs(timeout)
+        )
+        # The async SDK's parse() is a coroutine
+        completion = await raw.parse()
+        usage = getattr(completion, "usage", None)
+        return CompletionResult(completion.choices[0].message.content, raw.headers,
+                                getattr(usage, "total_tokens", None))
+    
+    async def stream_async(self, messages, temperature, max_tokens, timeout=None):
+        raw = await self.async_client.chat.completions.with_raw_response.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **_timeout_kwargs(timeout)
+        )
+        chunks = await raw.parse()
+        
+        async def deltas() -> AsyncIterator[str]:
+            async for chunk in chunks:
+                delta = _chunk_text(chunk)
+                if delta:
+                    yield delta
+        
+        return raw.headers, deltas()
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Backend for any server exposing the OpenAI /chat/completions API.
+    
+    Useful for pointing the agents at a local inference server (vLLM,
+    llama.cpp, Ollama and similar) as a primary model or as a fallback.
+    """
+    
+    def __init__(self, base_url: str, model: str, api_key: Optional[str] = None, timeout: float = 120.0):
+        """
+        Initialize the backend.
+        
+        Args:
+            base_url: Base URL of the API, e.g. "http://localhost:8000/v1"
+            model: Model identifier understood by the server
+            api_key: Bearer token, if the server requires one
+            timeout: Default request timeout in seconds
+        """
+        super().__init__(model=model, rate_limit_key=base_url)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = timeout
+        self._async_client = None
+    
+    @property
+    def label(self) -> str:
+        return f"{self.base_url}:{self.model}"
+    
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+    
+    def _payload(self, messages, temperature, max_tokens, stream: bool) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream
+        }
+    
+    @property
+    def async_client(self) -> "httpx.AsyncClient":
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, headers=self._headers(), timeout=self.timeout,
+                                                   limits=_keepalive_limits())
+        return self._async_client
+    
+    async def warm_async(self) -> None:
+        await self.async_client.get("/models", timeout=WARM_TIMEOUT)
+    
+    async def close_async(self) -> None:
+        if self._async_client is not None:
+            client, self._async_client = self._async_client, None
+            await client.aclose()
+    
+    @staticmethod
+    def _parse_completion(response: "httpx.Response") -> CompletionResult:
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        return CompletionResult(body["choices"][0]["message"]["content"], response.headers, usage.get("total_tokens"))
+    
+    @staticmethod
+    def _parse_event(line: str) -> Optional[str]:
+        """Return the text delta in one server-sent event line, "" for none, None at [DONE]."""
+        if not line.startswith("data:"):
+            return ""
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+    
+    async def complete_async(self, messages, temperature, max_tokens, timeout=None) -> CompletionResult:
+        response = await self.async_client.post("/chat/completions",
+                                                json=self._payload(messages, temperature, max_tokens, False),
+                                                **_timeout_kwargs(timeout))
+        return self._parse_completion(response)
+    
+    async def stream_async(self, messages, temperature, max_tokens, timeout=None):
+        request = self.async_client.build_request("POST", "/chat/completions",
+                                                  json=self._payload(messages, temperature, max_tokens, True),
+                                                  **_timeout_kwargs(timeout))
+        response = await self.async_client.send(request, stream=True)
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
+            response.raise_for_status()
+        
+        async def deltas() -> AsyncIterator[str]:
+            try:
+                async for line in response.aiter_lines():
+                    delta = self._parse_event(line)
+                    if delta is None:
+                        return
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+        
+        return response.headers, deltas()
@@ -0,0 +1,198 @@
+# services/llm_router.py
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from services.llm_backends import LLMBackend, GroqBackend, OpenAICompatibleBackend
+
+logger = logging.getLogger(__name__)
+
+class RoutingPolicy(ABC):
+    """Decides which backend serves each LLM call and learns from the outcomes."""
+    
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Stable identifier of the policy, used in cache and request keys."""
+    
+    @abstractmethod
+    def candidates(self) -> List[LLMBackend]:
+        """Return the backends to try for the next call, in order of preference."""
+    
+    def record_success(self, backend: LLMBackend, latency: float) -> None:
+        """Report a successful call and its latency in seconds."""
+    
+    def record_failure(self, backend: LLMBackend) -> None:
+        """Report a failed call."""
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return routing statistics."""
+        return {}
+
+
+class SingleBackendPolicy(RoutingPolicy):
+    """Sends every call to one backend."""
+    
+    def __init__(self, backend: LLMBackend):
+        """
+        Initialize the policy.
+        
+        Args:
+            backend: The backend to use for every call
+        """
+        self.backend = backend
+    
+    @property
+    def name(self) -> str:
+        return self.backend.model
+    
+    def candidates(self) -> List[LLMBackend]:
+        return [self.backend]
+
+
+class _BackendHealth:
+    """Moving averages of one backend's latency and error rate."""
+    
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.ejected_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+
+class LatencyAwareRouter(RoutingPolicy):
+    """
+    Routes each call to the backend with the best recent latency and error rate.
+    
+    Latency and error rate are exponentially weighted moving averages. A
+    backend whose error rate crosses the threshold is moved to the back of
+    the list for a cooldown period. Backends that have not been measured yet
+    are tried first so every backend gets a latency estimate. The remaining
+    backends are always returned as failover candidates.
+    """
+    
+    def __init__(self,
+                 backends: List[LLMBackend],
+                 smoothing: float = 0.2,
+                 error_penalty: float = 4.0,
+                 error_threshold: float = 0.5,
+                 cooldown_seconds: float = 30.0):
+        """
+        Initialize the router.
+        
+        Args:
+            backends: Backends to route between, in order of preference for ties
+            smoothing: Weight of the newest sample in the moving averages
+            error_penalty: How strongly the error rate inflates a backend's score
+            error_threshold: Error rate above which a backend is ejected
+            cooldown_seconds: How long an ejected backend stays at the back
+        """
+        if not backends:
+            raise ValueError("LatencyAwareRouter needs at least one backend")
+        self.backends = list(backends)
+        self.smoothing = smoothing
+        self.error_penalty = error_penalty
+        self.error_threshold = error_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._health = {backend.label: _BackendHealth() for backend in self.backends}
+        self._lock = threading.Lock()
+    
+    @property
+    def name(self) -> str:
+        return "router:" + ",".join(backend.label for backend in self.backends)
+    
+    def _score(self, health: _BackendHealth) -> float:
+        if health.latency is None:
+            # Untried backends go first; ones that have only ever failed go last
+            return 0.0 if health.failures == 0 else float("inf")
+        return health.latency * (1.0 + self.error_penalty * health.error_rate)
+    
+    def candidates(self) -> List[LLMBackend]:
+        now = time.monotonic()
+        with self._lock:
+            ranked = sorted(
+                enumerate(self.backends),
+                key=lambda item: (
+                    self._health[item[1].label].ejected_until > now,
+                    self._score(self._health[item[1].label]),
+                    item[0]
+                )
+            )
+        return [backend for _, backend in ranked]
+    
+    def record_success(self, backend: LLMBackend, latency: float) -> None:
+        with self._lock:
+            health = self._health[backend.label]
+            health.calls += 1
+            if health.latency is None:
+                health.latency = latency
+            else:
+                health.latency += self.smoothing * (latency - health.latency)
+            health.error_rate *= (1.0 - self.smoothing)
+    
+    def record_failure(self, backend: LLMBackend) -> None:
+        with self._lock:
+            health = self._health[backend.label]
+            health.calls += 1
+            health.failures += 1
+            health.error_rate += self.smoothing * (1.0 - health.error_rate)
+            if health.error_rate > self.error_threshold:
+                health.ejected_until = time.monotonic() + self.cooldown_seconds
+                logger.warning(f"LLM backend {backend.label} ejected for {self.cooldown_seconds:.0f}s "
+                               f"(error rate {health.error_rate:.2f})")
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                label: {
+                    "latency": health.latency,
+                    "error_rate": round(health.error_rate, 3),
+                    "calls": health.calls,
+                    "failures": health.failures,
+                    "ejected": health.ejected_until > now
+                }
+                for label, health in self._health.items()
+            }
+
+
+def build_default_policy(api_key: Optional[str] = None, model: Optional[str] = None) -> RoutingPolicy:
+    """
+    Build the routing policy described by the settings.
+    
+    The Groq model comes first, followed by GROQ_FALLBACK_MODELS and the
+    local OpenAI-compatible server if LOCAL_LLM_BASE_URL is set. With a
+    single backend no routing is done at all.
+    
+    Args:
+        api_key: Groq API key (defaults to environment variable)
+        model: Primary Groq model (defaults to environment variable)
+    
+    Returns:
+        A SingleBackendPolicy or a LatencyAwareRouter
+    
+    Raises:
+        ValueError: If no backend can be configured
+    """
+    api_key = api_key or settings.GROQ_API_KEY
+    model = model or settings.GROQ_MODEL
+    
+    backends: List[LLMBackend] = []
+    if api_key:
+        backends.append(GroqBackend(api_key=api_key, model=model))
+        backends.extend(GroqBackend(api_key=api_key, model=fallback)
+                        for fallback in settings.GROQ_FALLBACK_MODELS if fallback != model)
+    if settings.LOCAL_LLM_BASE_URL:
+        backends.append(OpenAICompatibleBackend(base_url=settings.LOCAL_LLM_BASE_URL,
+                                                model=settings.LOCAL_LLM_MODEL,
+                                                api_key=settings.LOCAL_LLM_API_KEY))
+    
+    if not backends:
+        raise ValueError("Groq API key is required. Set GROQ_API_KEY environment variable or pass it explicitly.")
+    if len(backends) == 1:
+        return SingleBackendPolicy(backends[0])
+    return LatencyAwareRouter(backends)
@@ -1,34 +1,628 @@
 # services/llm_service.py
 import os
+import re
+import time
+import hashlib
+import asyncio
 import logging
-from groq import Groq
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Coroutine, TypeVar, Union, Mapping
 
-from config.settings import GROQ_API_KEY, GROQ_MODEL
+from config import settings
+from services.response_cache import ResponseCache, get_default_cache
+from services.metrics import LatencyTracker
+from services.resilience import ResilientCaller, RetryPolicy, status_code_of
+from services.singleflight import SingleFlight, get_default_singleflight
+from services.llm_backends import LLMBackend
+from services.llm_router import RoutingPolicy, build_default_policy
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+SYSTEM_MESSAGE = "You are a helpful medical assistant."
+
+
+def _build_messages(prompt: str) -> List[Dict[str, str]]:
+    """Build the chat messages sent to the LLM for a prompt."""
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def _cache_key(cache: Optional[ResponseCache], model: str, prompt: str,
+               temperature: float, max_tokens: int) -> Optional[str]:
+    """Return the cache key for a request, or None if the cache should not be used."""
+    if cache is None or cache.should_bypass(temperature):
+        return None
+    return cache.make_key(model, SYSTEM_MESSAGE, prompt, temperature, max_tokens)
+
+
+def _request_key(api_key: str, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """Identify identical in-flight requests (scoped per API key so errors are never shared across keys)."""
+    key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    return f"{key_id}:{ResponseCache.make_key(model, SYSTEM_MESSAGE, prompt, temperature, max_tokens)}"
+
+
+def _record_failover(policy: RoutingPolicy, backend: LLMBackend, error: Exception) -> Exception:
+    """Report a failed backend to the routing policy and return the error."""
+    policy.record_failure(backend)
+    logger.info(f"LLM backend {backend.label} failed ({type(error).__name__}: {str(error)})")
+    return error
+
+
+def _estimate_tokens(prompt: str, max_tokens: int) -> int:
+    """Estimate the tokens a request will consume (about 4 characters per prompt token)."""
+    return (len(SYSTEM_MESSAGE) + len(prompt)) // 4 + max_tokens
+
+
+def _parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset value such as "7.66s", "2m59.56s" or "120ms" into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value):
+        matched = True
+        total += float(amount) * {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}[unit]
+    return total if matched else None
+
+
+class RateLimitGovernor:
+    """
+    Client-side admission control for one API key.
+    
+    Two token buckets track requests and estimated tokens per minute, and an
+    AIMD limit caps the number of calls in flight: each success raises the
+    limit by roughly one per round trip, and each rate-limit rejection halves
+    it. Rate-limit headers returned by the API correct the local estimates.
+    Callers that find no capacity wait for it instead of failing.
+    """
+    
+    def __init__(self,
+                 requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None,
+                 initial_concurrency: Optional[int] = None,
+                 max_concurrency: Optional[int] = None,
+                 min_concurrency: int = 1):
+        """
+        Initialize the governor.
+        
+        Args:
+            requests_per_minute: Request budget per minute (defaults to GROQ_REQUESTS_PER_MINUTE)
+            tokens_per_minute: Token budget per minute (defaults to GROQ_TOKENS_PER_MINUTE)
+            initial_concurrency: Starting limit on calls in flight (defaults to MAX_WORKERS)
+            max_concurrency: Upper bound for the adaptive limit (defaults to LLM_MAX_CONCURRENCY)
+            min_concurrency: Lower bound for the adaptive limit
+        """
+        if requests_per_minute is None:
+            requests_per_minute = settings.GROQ_REQUESTS_PER_MINUTE
+        if tokens_per_minute is None:
+            tokens_per_minute = settings.GROQ_TOKENS_PER_MINUTE
+        if initial_concurrency is None:
+            initial_concurrency = settings.MAX_WORKERS
+        if max_concurrency is None:
+            max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(max(min_concurrency, min(initial_concurrency, max_concurrency)))
+        
+        self._request_tokens = self.requests_per_minute
+        self._token_tokens = self.tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "admitted": 0,
+            "waits": 0,
+            "rate_limited": 0,
+            "errors": 0
+        }
+    
+    def _refill(self, now: float) -> None:
+        """Top up both buckets for the time elapsed. Lock must be held."""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_tokens = min(self.requests_per_minute,
+                                   self._request_tokens + elapsed * self.requests_per_minute / 60.0)
+        self._token_tokens = min(self.tokens_per_minute,
+                                 self._token_tokens + elapsed * self.tokens_per_minute / 60.0)
+    
+    def _try_acquire(self, estimated_tokens: int) -> float:
+        """
+        Take capacity for one call if available. Lock must be held.
+        
+        Returns:
+            0.0 if the call was admitted, otherwise seconds to wait before retrying
+        """
+        now = time.monotonic()
+        self._refill(now)
+        
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= int(self.concurrency_limit):
+            return 0.25
+        
+        # A request larger than the whole bucket is admitted once the bucket is full
+        needed_tokens = min(float(estimated_tokens), self.tokens_per_minute)
+        if self._request_tokens < 1.0:
+            return (1.0 - self._request_tokens) * 60.0 / self.requests_per_minute
+        if self._token_tokens < needed_tokens:
+            return (needed_tokens - self._token_tokens) * 60.0 / self.tokens_per_minute
+        
+        self._request_tokens -= 1.0
+        self._token_tokens -= needed_tokens
+        self._in_flight += 1
+        self._counters["admitted"] += 1
+        return 0.0
+    
+    async def acquire_async(self, estimated_tokens: int) -> None:
+        """
+        Wait without blocking the event loop until a call may be sent.
+        
+        Args:
+            estimated_tokens: Estimated prompt plus completion tokens
+        """
+        with self._lock:
+            wait = self._try_acquire(estimated_tokens)
+            if wait > 0:
+                self._counters["waits"] += 1
+        while wait > 0:
+            await asyncio.sleep(min(wait, 0.25))
+            with self._lock:
+                wait = self._try_acquire(estimated_tokens)
+    
+    def release(self,
+                estimated_tokens: int,
+                actual_tokens: Optional[int] = None,
+                rate_limited: bool = False,
+                failed: bool = False,
+                headers: Optional[Mapping[str, str]] = None) -> None:
+        """
+        Return a call's concurrency slot and adapt the limits to its outcome.
+        
+        Args:
+            estimated_tokens: The estimate the call was admitted with
+            actual_tokens: Tokens reported by the API, used to refund over-estimates
+            rate_limited: True if the API rejected the call with HTTP 429
+            failed: True if the call failed for another reason
+            headers: Response headers carrying rate-limit information
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            self._refill(now)
+            
+            if actual_tokens is not None:
+                refund = min(float(estimated_tokens), self.tokens_per_minute) - actual_tokens
+                self._token_tokens = min(self.tokens_per_minute, self._token_tokens + refund)
+            
+            if rate_limited:
+                self._counters["rate_limited"] += 1
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2.0)
+                retry_after = _parse_duration((headers or {}).get("retry-after")) or 1.0
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+                logger.warning(f"Rate limited; concurrency limit lowered to {int(self.concurrency_limit)}, "
+                               f"pausing {retry_after:.1f}s")
+            elif failed:
+                self._counters["errors"] += 1
+            else:
+                self.concurrency_limit = min(float(self.max_concurrency),
+                                             self.concurrency_limit + 1.0 / self.concurrency_limit)
+            
+            if headers:
+                self._apply_headers(headers, now)
+    
+    def _apply_headers(self, headers: Mapping[str, str], now: float) -> None:
+        """Reconcile local buckets with the API's rate-limit headers. Lock must be held."""
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        
+        try:
+            if limit_tokens is not None:
+                self.tokens_per_minute = float(limit_tokens)
+            if remaining_tokens is not None:
+                self._token_tokens = min(self._token_tokens, float(remaining_tokens))
+            if remaining_requests is not None and float(remaining_requests) <= 0:
+                reset = _parse_duration(headers.get("x-ratelimit-reset-requests"))
+                if reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+        except ValueError:
+            logger.debug("Ignoring malformed rate-limit headers")
+    
+    def slot(self, estimated_tokens: int) -> "_GovernorSlot":
+        """
+        Return an async context manager that holds capacity for one call.
+        
+        A 429 raised inside the "async with" block is reported to the governor
+        automatically.
+        
+        Args:
+            estimated_tokens: Estimated prompt plus completion tokens
+        """
+        return _GovernorSlot(self, estimated_tokens)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the governor's current state and counters.
+        
+        Returns:
+            Dictionary with the concurrency limit, calls in flight and counters
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["concurrency_limit"] = int(self.concurrency_limit)
+            stats["in_flight"] = self._in_flight
+        return stats
+
+
+class _GovernorSlot:
+    """Capacity held by one call between admission and completion."""
+    
+    def __init__(self, governor: RateLimitGovernor, estimated_tokens: int):
+        self.governor = governor
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens = None
+        self.headers = None
+    
+    def observe(self, headers: Optional[Mapping[str, str]] = None, total_tokens: Optional[int] = None) -> None:
+        """Record the response headers and token usage of the call."""
+        if headers is not None:
+            self.headers = headers
+        if total_tokens is not None:
+            self.actual_tokens = total_tokens
+    
+    def _finish(self, exc: Optional[BaseException]) -> None:
+        headers = self.headers
+        rate_limited = status_code_of(exc) == 429
+        if exc is not None and headers is None:
+            headers = getattr(getattr(exc, "response", None), "headers", None)
+        self.governor.release(
+            self.estimated_tokens,
+            actual_tokens=self.actual_tokens,
+            rate_limited=rate_limited,
+            failed=exc is not None and not rate_limited,
+            headers=headers
+        )
+    
+    async def __aenter__(self) -> "_GovernorSlot":
+        await self.governor.acquire_async(self.estimated_tokens)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._finish(exc)
+
+
+_governors: Dict[str, RateLimitGovernor] = {}
+_governors_lock = threading.Lock()
+
+def get_governor(rate_limit_key: str) -> RateLimitGovernor:
+    """
+    Return the process-wide governor for a rate-limit key, creating it on first use.
+    
+    Args:
+        rate_limit_key: The API key (or server URL) whose limits the governor enforces
+    """
+    with _governors_lock:
+        if rate_limit_key not in _governors:
+            _governors[rate_limit_key] = RateLimitGovernor()
+        return _governors[rate_limit_key]
+
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop that runs async calls for blocking callers.
+    
+    The loop lives in a daemon thread for the life of the process, so async
+    clients, connections and single-flight state cached on first use stay
+    bound to a loop that is still running.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-async-loop", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_in_background_loop(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Run a coroutine on the background loop and block until it finishes.
+    
+    Args:
+        coroutine: The coroutine to run
+    
+    Returns:
+        Its result
+    
+    Raises:
+        RuntimeError: If called from the background loop itself, which would deadlock
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("Blocking LLM calls cannot be made from the background event loop; await them instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+async def _next(iterator: AsyncIterator[T]) -> T:
+    return await iterator.__anext__()
+
+
+def iterate_in_background_loop(iterator: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Iterate an async iterator on the background loop, blocking between items.
+    
+    Args:
+        iterator: Async iterator (e.g. a streamed completion) to drain
+    
+    Yields:
+        Its items, as they are produced
+    """
+    try:
+        while True:
+            try:
+                yield run_in_background_loop(_next(iterator))
+            except StopAsyncIteration:
+                return
+    finally:
+        # A consumer that stops early closes the async generator on the loop it runs on
+        if hasattr(iterator, "aclose"):
+            run_in_background_loop(iterator.aclose())
+
+
+def _routing_stats(policy: RoutingPolicy) -> Dict[str, Any]:
+    """Routing statistics plus the governor state of every backend the policy uses."""
+    return {
+        "policy": policy.name,
+        "backends": policy.stats(),
+        "governors": {backend.label: get_governor(backend.rate_limit_key).stats()
+                      for backend in policy.candidates()}
+    }
+
+
 class LLMService:
-    """Service for interacting with the Groq LLM API."""
+    """
+    Blocking interface to the LLM backends (Groq by default).
+    
+    A thin wrapper around AsyncLLMService for callers without an event loop:
+    every call runs on the process-wide background loop (see
+    get_background_loop), so caching, rate limiting, retries, coalescing and
+    routing exist once, in the async implementation.
+    """
     
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 model: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None,
+                 use_cache: bool = True,
+                 metrics: Optional[LatencyTracker] = None,
+                 routing_policy: Optional[RoutingPolicy] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 hedging: Optional[bool] = None,
+                 singleflight: Optional[SingleFlight] = None):
         """
-        Initialize the LLM service.
+        Initialize the LLM service (see AsyncLLMService for the arguments).
+        """
+        self.async_service = AsyncLLMService(
+            api_key=api_key,
+            model=model,
+            cache=cache,
+            use_cache=use_cache,
+            metrics=metrics,
+            routing_policy=routing_policy,
+            retry_policy=retry_policy,
+            hedging=hedging,
+            singleflight=singleflight
+        )
+        self.api_key = self.async_service.api_key
+        self.routing_policy = self.async_service.routing_policy
+        self.model = self.async_service.model
+        self.cache = self.async_service.cache
+        self.metrics = self.async_service.metrics
+        self.resilience = self.async_service.resilience
+        self.singleflight = self.async_service.singleflight
+    
+    def warm(self) -> None:
+        """Open a connection to every backend ahead of the first call; failures are only logged."""
+        run_in_background_loop(self.async_service.warm())
+    
+    def close(self) -> None:
+        """Close the backends' connections (they are reopened if the service is used again)."""
+        # The clients belong to the background loop, so they are closed there, without waiting
+        asyncio.run_coroutine_threadsafe(self.async_service.close(), get_background_loop())
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect latency, cache, routing, rate-limit and coalescing statistics.
+        
+        Returns:
+            Dictionary with "latency", "cache", "routing" and "singleflight" entries
+        """
+        return self.async_service.stats()
+    
+    def generate_response(self,
+                          prompt: str,
+                          temperature: float = 0.2,
+                          max_tokens: int = 1024,
+                          stream: bool = False,
+                          deadline: Optional[float] = None) -> Union[str, Iterator[str]]:
+        """
+        Generate a response from the LLM.
+        
+        Transient errors are retried with jittered backoff, and long-running
+        calls are hedged if hedging is enabled (see services.resilience).
         
         Args:
-            api_key: Groq API key (defaults to environment variable)
-            model: Model identifier (defaults to environment variable)
+            prompt: The input prompt text
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens in the response
+            stream: If True, return an iterator of text deltas instead (see stream)
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
+        
+        Returns:
+            Generated text response
+        
+        Raises:
+            DeadlineExceeded: If the call does not complete within the deadline
         """
-        self.api_key = api_key or GROQ_API_KEY
-        self.model = model or GROQ_MODEL
+        if stream:
+            return self.stream(prompt, temperature=temperature, max_tokens=max_tokens, deadline=deadline)
+        return run_in_background_loop(
+            self.async_service.generate_response(prompt, temperature=temperature, max_tokens=max_tokens,
+                                                 deadline=deadline)
+        )
+    
+    def stream(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024,
+               deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        
+        Time to first token and total latency are recorded separately in
+        self.metrics as "ttft" and "latency".
+        
+        Args:
+            prompt: The input prompt text
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens in the response
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
+        
+        Returns:
+            Iterator of text deltas in the order they are produced
+        """
+        return iterate_in_background_loop(
+            self.async_service.stream(prompt, temperature=temperature, max_tokens=max_tokens, deadline=deadline)
+        )
+    
+    async def generate_response_async(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024,
+                                      deadline: Optional[float] = None) -> str:
+        """
+        Generate a response from the LLM without blocking the event loop.
+        
+        Args:
+            prompt: The input prompt text
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens in the response
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
+        
+        Returns:
+            Generated text response
+        """
+        return await self.async_service.generate_response(prompt, temperature=temperature,
+                                                          max_tokens=max_tokens, deadline=deadline)
+    
+    def stream_async(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024,
+                     deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM without blocking the event loop.
+        
+        Args:
+            prompt: The input prompt text
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens in the response
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
         
-        if not self.api_key:
-            raise ValueError("Groq API key is required. Set GROQ_API_KEY environment variable or pass it explicitly.")
+        Returns:
+            Async iterator of text deltas
+        """
+        return self.async_service.stream(prompt, temperature=temperature, max_tokens=max_tokens, deadline=deadline)
+
+
+class AsyncLLMService:
+    """Asyncio service for interacting with the LLM backends (Groq by default).
+    
+    A single event loop can keep many completions in flight through one
+    instance, without spending an OS thread per request. LLMService is the
+    blocking wrapper around it.
+    """
+    
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 model: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None,
+                 use_cache: bool = True,
+                 metrics: Optional[LatencyTracker] = None,
+                 routing_policy: Optional[RoutingPolicy] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 hedging: Optional[bool] = None,
+                 singleflight: Optional[SingleFlight] = None):
+        """
+        Initialize the async LLM service.
         
-        self.client = Groq(api_key=self.api_key)
+        Args:
+            api_key: Groq API key (defaults to environment variable)
+            model: Primary Groq model identifier (defaults to environment variable)
+            cache: Response cache to use (defaults to the shared cache from settings)
+            use_cache: Set to False to always call the API
+            metrics: Latency tracker to record into (a new one is created if None)
+            routing_policy: Chooses the backend for each call (defaults to the policy built from settings)
+            retry_policy: Retry schedule for transient errors (defaults to settings)
+            hedging: Send a duplicate request when a call runs past the observed p95
+                (defaults to LLM_HEDGING_ENABLED)
+            singleflight: Coalescer for identical in-flight calls (defaults to the process-wide one)
+        """
+        self.api_key = api_key or settings.GROQ_API_KEY
+        self.routing_policy = routing_policy or build_default_policy(self.api_key, model)
+        # Cache and request keys use the policy name, which for a single Groq backend is the model id
+        self.model = self.routing_policy.name
+        self.cache = (cache or get_default_cache()) if use_cache else None
+        self.metrics = metrics or LatencyTracker()
+        self.resilience = ResilientCaller(retry_policy=retry_policy, metrics=self.metrics,
+                                          hedging=settings.LLM_HEDGING_ENABLED if hedging is None else hedging)
+        self.singleflight = singleflight or get_default_singleflight()
         logger.info(f"LLM Service initialized with model: {self.model}")
     
-    def generate_response(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024) -> str:
+    async def warm(self) -> None:
+        """Open a connection to every backend ahead of the first call; failures are only logged."""
+        for backend in self.routing_policy.candidates():
+            try:
+                await backend.warm_async()
+                logger.debug(f"Warmed LLM backend {backend.label}")
+            except Exception as e:
+                logger.warning(f"Could not warm LLM backend {backend.label}: {str(e)}")
+    
+    async def close(self) -> None:
+        """Close the backends' connections (they are reopened if the service is used again)."""
+        for backend in self.routing_policy.candidates():
+            await backend.close_async()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Collect latency, cache, routing, rate-limit and coalescing statistics.
+        
+        Returns:
+            Dictionary with "latency", "cache", "routing" and "singleflight" entries
+        """
+        return {
+            "latency": self.metrics.summary(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "routing": _routing_stats(self.routing_policy),
+            "singleflight": self.singleflight.stats()
+        }
+    
+    async def generate_response(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024,
+                                deadline: Optional[float] = None) -> str:
         """
         Generate a response from the LLM.
         
@@ -36,27 +630,152 @@ class LLMService:
             prompt: The input prompt text
             temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
             max_tokens: Maximum tokens in the response
-            
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
+        
         Returns:
             Generated text response
         """
+        if deadline is None:
+            deadline = settings.LLM_CALL_DEADLINE
+        cache_key = _cache_key(self.cache, self.model, prompt, temperature, max_tokens)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Serving LLM response from cache")
+                return cached
+        
         try:
-            logger.debug(f"Sending prompt to LLM (length: {len(prompt)})")
+            logger.debug(f"Sending prompt to LLM asynchronously (length: {len(prompt)})")
+            start = time.perf_counter()
+            
+            async def fetch() -> str:
+                response = await self._complete(prompt, temperature, max_tokens, deadline)
+                if cache_key is not None:
+                    self.cache.set(cache_key, response)
+                return response
             
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful medical assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
+            flight_key = _request_key(self.api_key or "", self.model, prompt, temperature, max_tokens)
+            response = await self.singleflight.do_async(flight_key, fetch)
+            self.metrics.record("latency", time.perf_counter() - start)
             
-            response = completion.choices[0].message.content
             logger.debug(f"Received response from LLM (length: {len(response)})")
             return response
-            
+        
         except Exception as e:
             logger.error(f"Error generating LLM response: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def _complete(self, prompt: str, temperature: float, max_tokens: int, deadline: Optional[float]) -> str:
+        """Send a completion through the retry/hedging layer, failing over between backends."""
+        messages = _build_messages(prompt)
+        estimated_tokens = _estimate_tokens(prompt, max_tokens)
+        
+        async def attempt(timeout: Optional[float]) -> str:
+            error = None
+            for backend in self.routing_policy.candidates():
+                start = time.perf_counter()
+                try:
+                    async with get_governor(backend.rate_limit_key).slot(estimated_tokens) as slot:
+                        result = await backend.complete_async(messages, temperature, max_tokens, timeout)
+                        slot.observe(result.headers, result.total_tokens)
+                except Exception as e:
+                    error = _record_failover(self.routing_policy, backend, e)
+                    continue
+                self.routing_policy.record_success(backend, time.perf_counter() - start)
+                return result.text
+            raise error
+        
+        return await self.resilience.call_async(attempt, deadline=deadline)
+    
+    async def stream(self, prompt: str, temperature: float = 0.2, max_tokens: int = 1024,
+                     deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        
+        Args:
+            prompt: The input prompt text
+            temperature: Controls randomness (0.0 = deterministic, 1.0 = creative)
+            max_tokens: Maximum tokens in the response
+            deadline: Time budget for the call in seconds, including retries
+                (defaults to LLM_CALL_DEADLINE; 0 means none)
+        
+        Yields:
+            Text deltas in the order they are produced
+        """
+        if deadline is None:
+            deadline = settings.LLM_CALL_DEADLINE
+        cache_key = _cache_key(self.cache, self.model, prompt, temperature, max_tokens)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Serving LLM response from cache")
+                yield cached
+                return
+        
+        try:
+            logger.debug(f"Streaming prompt to LLM asynchronously (length: {len(prompt)})")
+            flight_key = _request_key(self.api_key or "", self.model, prompt, temperature, max_tokens)
+            async for delta in self.singleflight.stream_async(
+                flight_key,
+                lambda: self._stream_upstream(prompt, temperature, max_tokens, deadline, cache_key)
+            ):
+                yield delta
+        
+        except Exception as e:
+            logger.error(f"Error streaming LLM response: {str(e)}")
+            raise
+    
+    async def _stream_upstream(self, prompt: str, temperature: float, max_tokens: int,
+                               deadline: Optional[float], cache_key: Optional[str]) -> AsyncIterator[str]:
+        """Stream one upstream completion, retrying until the first delta arrives."""
+        messages = _build_messages(prompt)
+        estimated_tokens = _estimate_tokens(prompt, max_tokens)
+        start = time.perf_counter()
+        deadline_at = time.monotonic() + deadline if deadline else None
+        retry_state = {}
+        
+        while True:
+            parts = []
+            try:
+                async for delta in self._stream_routed(messages, temperature, max_tokens,
+                                                       self.resilience.remaining(deadline_at), estimated_tokens):
+                    if not parts:
+                        self.metrics.record("ttft", time.perf_counter() - start)
+                    parts.append(delta)
+                    yield delta
+                break
+            except Exception as e:
+                # Deltas already yielded cannot be taken back, so only retry before the first one
+                if parts:
+                    raise
+                await asyncio.sleep(self.resilience.backoff(e, retry_state, deadline_at))
+        
+        self.metrics.record("latency", time.perf_counter() - start)
+        response = "".join(parts)
+        logger.debug(f"Finished streaming response from LLM (length: {len(response)})")
+        if cache_key is not None:
+            self.cache.set(cache_key, response)
+    
+    async def _stream_routed(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                             timeout: Optional[float], estimated_tokens: int) -> AsyncIterator[str]:
+        """Stream from the preferred backend, failing over to the next one until a delta has been produced."""
+        error = None
+        for backend in self.routing_policy.candidates():
+            start = time.perf_counter()
+            started = False
+            try:
+                async with get_governor(backend.rate_limit_key).slot(estimated_tokens) as slot:
+                    headers, deltas = await backend.stream_async(messages, temperature, max_tokens, timeout)
+                    slot.observe(headers)
+                    async for delta in deltas:
+                        started = True
+                        yield delta
+            except Exception as e:
+                error = _record_failover(self.routing_policy, backend, e)
+                if started:
+                    raise
+                continue
+            self.routing_policy.record_success(backend, time.perf_counter() - start)
+            return
+        raise error
@@ -0,0 +1,90 @@
+# services/metrics.py
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional
+
+class LatencyTracker:
+    """
+    Thread-safe rolling windows of latency samples and named counters.
+
+    Each metric keeps its most recent samples only, so percentiles follow the
+    current behaviour of the API rather than the whole process lifetime.
+    """
+
+    def __init__(self, window: int = 500):
+        """
+        Initialize the tracker.
+
+        Args:
+            window: Number of most recent samples kept per metric
+        """
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Record a latency sample.
+
+        Args:
+            name: Metric name (e.g. "latency", "ttft")
+            seconds: Measured duration in seconds
+        """
+        with self._lock:
+            self._samples[name].append(seconds)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """
+        Increment a named counter.
+
+        Args:
+            name: Counter name
+            amount: Value to add
+        """
+        with self._lock:
+            self._counters[name] += amount
+
+    def count(self, name: str) -> int:
+        """Return the number of samples currently held for a metric."""
+        with self._lock:
+            return len(self._samples.get(name, ()))
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """
+        Return a percentile of the recorded samples.
+
+        Args:
+            name: Metric name
+            q: Percentile between 0 and 100
+
+        Returns:
+            The percentile in seconds, or None if there are no samples
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q / 100.0 * (len(samples) - 1)))))
+        return samples[index]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize every metric and counter.
+
+        Returns:
+            Dictionary with per-metric count/p50/p95/p99 and a "counters" entry
+        """
+        with self._lock:
+            names = list(self._samples.keys())
+            counters = dict(self._counters)
+        summary = {}
+        for name in names:
+            summary[name] = {
+                "count": self.count(name),
+                "p50": self.percentile(name, 50),
+                "p95": self.percentile(name, 95),
+                "p99": self.percentile(name, 99)
+            }
+        summary["counters"] = counters
+        return summary
@@ -1,10 +1,123 @@
 # services/report_parser.py
 import re
+import hashlib
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AnyStr, Dict, Any, Optional, List, Tuple, Union
+
+if TYPE_CHECKING:
+    import mmap
+    from services.lab_values import LabValues
+    from services.term_matcher import TermMatcher
 
 logger = logging.getLogger(__name__)
 
+# Common section headers in medical reports
+COMMON_SECTIONS = [
+    "Patient ID", "Name", "Age", "Gender", "Date of Report",
+    "Chief Complaint", "Medical History", "Family History",
+    "Personal Medical History", "Medications", "Lab Results",
+    "Diagnostic Results", "Physical Examination", "Assessment",
+    "Plan", "Recommendations", "Follow-up"
+]
+
+_SECTION_KEYS = {section.lower(): section for section in COMMON_SECTIONS}
+
+# Symptom terms looked for in the chief complaint, unless SYMPTOM_VOCABULARY_PATH names a vocabulary file
+SYMPTOM_TERMS = [
+    "pain", "ache", "discomfort", "fatigue", "weakness",
+    "nausea", "vomiting", "dizziness", "vertigo", "headache",
+    "fever", "cough", "shortness of breath", "breathing difficulty",
+    "chest pain", "palpitations", "sweating", "anxiety", "depression",
+    "numbness", "tingling", "swelling", "insomnia", "rash"
+]
+
+# Headers and section ends are matched case-insensitively. Instead of
+# IGNORECASE patterns, which the regex engine cannot scan for quickly, the
+# text is folded to the lowercase letters IGNORECASE would treat it as. The
+# mapping is one character to one character, so positions in the folded
+# text are positions in the report.
+_CASE_FOLD = str.maketrans({
+    **{chr(code): chr(code + 32) for code in range(ord("A"), ord("Z") + 1)},
+    "\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"
+})
+
+# A section ends at a blank line, or at a line starting with words of two or
+# more letters and a colon
+_SECTION_END = re.compile(r"\n(?:\n|[a-z]{2,}(?:\s+[a-z]{2,})*:)")
+# An optional colon and the whitespace between a header and its content
+_HEADER_SEPARATOR = re.compile(r":?\s*")
+
+# The same patterns for reports held in byte buffers (see ReportParser.scan_sections)
+_SECTION_KEYS_BYTES = {key.encode("ascii"): section for key, section in _SECTION_KEYS.items()}
+_SECTION_END_BYTES = re.compile(_SECTION_END.pattern.encode("ascii"))
+_HEADER_SEPARATOR_BYTES = re.compile(_HEADER_SEPARATOR.pattern.encode("ascii"))
+
+
+def _fold_case(text: str) -> str:
+    """Lowercase text the way IGNORECASE matching sees it, keeping every position."""
+    return text.lower() if text.isascii() else text.translate(_CASE_FOLD)
+
+
+def _section_bounds(folded: AnyStr,
+                    keys: Dict[AnyStr, str],
+                    separator: "re.Pattern[AnyStr]",
+                    section_end: "re.Pattern[AnyStr]") -> Dict[str, Tuple[int, int]]:
+    """
+    Locate each section's content in case-folded report text (or bytes).
+    
+    Returns:
+        Section name -> (start, end) offsets, in COMMON_SECTIONS order
+    """
+    starts: Dict[str, int] = {}
+    for key, section in keys.items():
+        position = folded.find(key)
+        if position >= 0:
+            starts[section] = separator.match(folded, position + len(key)).end()
+    
+    ends: Dict[str, int] = {}
+    end = -1
+    for section, start in sorted(starts.items(), key=lambda item: item[1]):
+        # The previous section's end is also the first end after this start
+        if start > end:
+            match = section_end.search(folded, start)
+            end = match.start() if match else len(folded)
+        ends[section] = end
+    
+    return {section: (starts[section], ends[section]) for section in COMMON_SECTIONS if section in starts}
+
+
+def _sections_at(report_text: str, spans: Dict[str, Tuple[int, int]]) -> Dict[str, str]:
+    """The content of each section found at spans in the report (see ReportParser.extract_sections)."""
+    sections = {section: report_text[start:end].strip() for section, (start, end) in spans.items()}
+    
+    # If no sections were found, return the entire report
+    if not sections:
+        logger.warning("No structured sections found in the report")
+        sections["Full Report"] = report_text
+        
+    return sections
+
+
+_symptom_matcher: Optional["TermMatcher"] = None
+_symptom_matcher_lock = threading.Lock()
+
+def get_symptom_matcher() -> "TermMatcher":
+    """Return the process-wide symptom matcher, built on first use."""
+    global _symptom_matcher
+    with _symptom_matcher_lock:
+        if _symptom_matcher is None:
+            from config.settings import SYMPTOM_VOCABULARY_PATH, TERM_AUTOMATON_CACHE_DIR
+            from services.term_matcher import TermMatcher
+            
+            if SYMPTOM_VOCABULARY_PATH:
+                _symptom_matcher = TermMatcher.from_file(SYMPTOM_VOCABULARY_PATH, cache_dir=TERM_AUTOMATON_CACHE_DIR)
+            else:
+                _symptom_matcher = TermMatcher(SYMPTOM_TERMS)
+        return _symptom_matcher
+
+
 class ReportParser:
     """
     Utility for parsing and extracting information from medical reports.
@@ -15,36 +128,68 @@ class ReportParser:
         """
         Extract common sections from a medical report.
         
+        Each section runs from the first occurrence of its header to the next
+        blank line or header-like line. Headers are found with plain substring
+        searches of a case-folded copy, and section ends by scanning forward
+        from the earliest section; sections that end at the same place share
+        one scan, so no part of the text is scanned twice.
+        
         Args:
             report_text: The full text of the medical report
             
         Returns:
             Dictionary mapping section names to their content
         """
-        # Common section headers in medical reports
-        common_sections = [
-            "Patient ID", "Name", "Age", "Gender", "Date of Report",
-            "Chief Complaint", "Medical History", "Family History",
-            "Personal Medical History", "Medications", "Lab Results",
-            "Diagnostic Results", "Physical Examination", "Assessment",
-            "Plan", "Recommendations", "Follow-up"
-        ]
-        
-        sections = {}
-        
-        # Basic pattern match for sections
-        for section in common_sections:
-            pattern = rf"{section}:?\s*(.*?)(?=\n\n|\n[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*:|$)"
-            match = re.search(pattern, report_text, re.DOTALL | re.IGNORECASE)
-            if match:
-                content = match.group(1).strip()
-                sections[section] = content
+        return _sections_at(report_text, ReportParser.section_spans(report_text))
+    
+    @staticmethod
+    def section_spans(report_text: str) -> Dict[str, Tuple[int, int]]:
+        """
+        Locate the content of each common section in a medical report.
+        
+        Args:
+            report_text: The full text of the medical report
+            
+        Returns:
+            Dictionary mapping section names to the (start, end) offsets of their
+            content in the text (empty if no sections were found); spans of
+            sections that end at the same place overlap
+        """
+        return _section_bounds(_fold_case(report_text), _SECTION_KEYS, _HEADER_SEPARATOR, _SECTION_END)
+    
+    @staticmethod
+    def scan_sections(buffer: Union[bytes, bytearray, memoryview, "mmap.mmap"],
+                      start: int = 0,
+                      end: Optional[int] = None,
+                      encoding: str = "utf-8") -> Dict[str, str]:
+        """
+        Extract the sections of a report held in a byte buffer, such as a memory-mapped file.
+        
+        Only the report's span is copied, once, to search a lowercase copy
+        for headers; the buffer is never decoded as a whole, only the
+        sections found. Headers are matched with ASCII case folding, so the
+        result is the same as extract_sections on the decoded text for
+        reports whose headers are ASCII.
+        
+        Args:
+            buffer: Bytes-like object holding the report
+            start: Offset of the report in the buffer
+            end: Offset just past the report (defaults to the end of the buffer)
+            encoding: Text encoding of the buffer
+            
+        Returns:
+            Dictionary mapping section names to their content
+        """
+        end = len(buffer) if end is None else end
+        bounds = _section_bounds(bytes(buffer[start:end]).lower(), _SECTION_KEYS_BYTES,
+                                 _HEADER_SEPARATOR_BYTES, _SECTION_END_BYTES)
+        sections = {section: bytes(buffer[start + section_start:start + section_end]).decode(encoding).strip()
+                    for section, (section_start, section_end) in bounds.items()}
         
-        # If no sections were found, return the entire report
         if not sections:
             logger.warning("No structured sections found in the report")
-            sections["Full Report"] = report_text
-            
+            sections["Full Report"] = bytes(buffer[start:end]).decode(encoding)
+        
         return sections
     
     @staticmethod
@@ -77,12 +222,12 @@ class ReportParser:
         return info
     
     @staticmethod
-    def extract_symptoms(report_text: str) -> List[str]:
+    def extract_symptoms(report_text: Union[str, "ParsedReport"]) -> List[str]:
         """
         Attempt to extract symptoms from the report text.
         
         Args:
-            report_text: The full text of the medical report
+            report_text: The full text of the medical report, or the report parsed
             
         Returns:
             List of identified symptoms
@@ -90,50 +235,44 @@ class ReportParser:
         symptoms = []
         
         # First, try to find the chief complaint section
-        sections = ReportParser.extract_sections(report_text)
+        sections = parse_report(report_text).sections
         
         if "Chief Complaint" in sections:
             complaint_text = sections["Chief Complaint"]
             
-            # Common symptom terms
-            symptom_terms = [
-                "pain", "ache", "discomfort", "fatigue", "weakness", 
-                "nausea", "vomiting", "dizziness", "vertigo", "headache",
-                "fever", "cough", "shortness of breath", "breathing difficulty",
-                "chest pain", "palpitations", "sweating", "anxiety", "depression",
-                "numbness", "tingling", "swelling", "insomnia", "rash"
-            ]
+            # Find every symptom term in one pass and expand each to its phrase
+            matcher = get_symptom_matcher()
+            phrases_by_term: Dict[str, List[Tuple[str, str]]] = {}
+            for match, phrase in matcher.phrases(complaint_text):
+                phrases_by_term.setdefault(match.term, []).append((match.label, phrase))
             
-            # Extract symptoms from the complaint
-            for term in symptom_terms:
-                if re.search(rf"\b{term}\b", complaint_text, re.IGNORECASE):
-                    # Try to get the full phrase
-                    matches = re.finditer(rf"[^.;,]*\b{term}\b[^.;,]*", complaint_text, re.IGNORECASE)
-                    for match in matches:
-                        symptom = match.group(0).strip()
-                        if symptom and len(symptom) > len(term):
-                            symptoms.append(symptom)
-                        else:
-                            symptoms.append(term)
+            # Report them in vocabulary order, preferring the full phrase
+            for term in matcher.terms:
+                for label, phrase in phrases_by_term.get(term, ()):
+                    if phrase and len(phrase) > len(term):
+                        symptoms.append(phrase)
+                    else:
+                        symptoms.append(label)
         
         # Remove duplicates while preserving order
         return list(dict.fromkeys(symptoms))
     
     @staticmethod
-    def summarize_report(report_text: str, max_length: int = 500) -> str:
+    def summarize_report(report_text: Union[str, "ParsedReport"], max_length: int = 500) -> str:
         """
         Create a concise summary of the medical report.
         
         Args:
-            report_text: The full text of the medical report
+            report_text: The full text of the medical report, or the report parsed
             max_length: Maximum length of the summary in characters
             
         Returns:
             Summary of the report
         """
         # Extract patient info and key sections
-        patient_info = ReportParser.extract_patient_info(report_text)
-        sections = ReportParser.extract_sections(report_text)
+        report = parse_report(report_text)
+        patient_info = report.patient_info
+        sections = report.sections
         
         # Build the summary
         summary_parts = []
@@ -170,4 +309,143 @@ class ReportParser:
         if len(summary) > max_length:
             summary = summary[:max_length-3] + "..."
             
-        return summary
\ No newline at end of file
+        return summary
+
+
+def report_key(report_text: str) -> str:
+    """Content hash identifying a report's text."""
+    return hashlib.sha256(report_text.encode("utf-8")).hexdigest()
+
+
+class ParsedReport:
+    """
+    A medical report parsed once, shared by every stage that needs its structure.
+    
+    The sections, patient information, symptoms, lab values and summary are
+    computed on first access and kept. Instances returned by parse_report are shared
+    across callers, so the dictionaries they expose must not be modified.
+    Formatting the object (str or a prompt placeholder) gives the report text.
+    """
+    
+    __slots__ = ("text", "_key", "_section_spans", "_sections", "_patient_info", "_symptoms", "_labs", "_summary")
+    
+    def __init__(self, text: str, key: Optional[str] = None):
+        """
+        Initialize the report.
+        
+        Args:
+            text: The full text of the medical report
+            key: Its content hash, if already known (computed on first use otherwise)
+        """
+        self.text = text
+        self._key = key
+        self._section_spans: Optional[Dict[str, Tuple[int, int]]] = None
+        self._sections: Optional[Dict[str, str]] = None
+        self._patient_info: Optional[Dict[str, str]] = None
+        self._symptoms: Optional[Tuple[str, ...]] = None
+        self._labs: Optional["LabValues"] = None
+        self._summary: Optional[str] = None
+    
+    @property
+    def key(self) -> str:
+        """Content hash of the report text."""
+        if self._key is None:
+            self._key = report_key(self.text)
+        return self._key
+    
+    @property
+    def section_spans(self) -> Dict[str, Tuple[int, int]]:
+        """Section names mapped to the offsets of their content (see ReportParser.section_spans)."""
+        if self._section_spans is None:
+            self._section_spans = ReportParser.section_spans(self.text)
+        return self._section_spans
+    
+    @property
+    def sections(self) -> Dict[str, str]:
+        """Section names mapped to their content (see ReportParser.extract_sections)."""
+        if self._sections is None:
+            self._sections = _sections_at(self.text, self.section_spans)
+        return self._sections
+    
+    @property
+    def patient_info(self) -> Dict[str, str]:
+        """Basic patient information (see ReportParser.extract_patient_info)."""
+        if self._patient_info is None:
+            self._patient_info = ReportParser.extract_patient_info(self.text)
+        return self._patient_info
+    
+    @property
+    def symptoms(self) -> Tuple[str, ...]:
+        """Symptoms named in the chief complaint (see ReportParser.extract_symptoms)."""
+        if self._symptoms is None:
+            self._symptoms = tuple(ReportParser.extract_symptoms(self))
+        return self._symptoms
+    
+    @property
+    def labs(self) -> "LabValues":
+        """Numeric lab values and vital signs, flagged against their reference ranges (see LabTable)."""
+        if self._labs is None:
+            from services.lab_values import get_lab_table
+            self._labs = get_lab_table().extract(self.text)
+        return self._labs
+    
+    @property
+    def summary(self) -> str:
+        """Summary of at most 500 characters (see ReportParser.summarize_report)."""
+        if self._summary is None:
+            self._summary = ReportParser.summarize_report(self)
+        return self._summary
+    
+    def __str__(self) -> str:
+        return self.text
+    
+    def __format__(self, format_spec: str) -> str:
+        return format(self.text, format_spec)
+    
+    def __len__(self) -> int:
+        return len(self.text)
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ParsedReport):
+            return NotImplemented
+        return self.text == other.text
+    
+    def __hash__(self) -> int:
+        return hash(self.key)
+    
+    def __repr__(self) -> str:
+        return f"ParsedReport(key={self.key[:12]!r}, length={len(self.text)})"
+
+
+# Most recently parsed reports, by content hash
+PARSED_REPORT_CACHE_SIZE = 64
+
+_parsed_reports: "OrderedDict[str, ParsedReport]" = OrderedDict()
+_parsed_reports_lock = threading.Lock()
+
+def parse_report(report: Union[str, ParsedReport]) -> ParsedReport:
+    """
+    Return the shared ParsedReport for a report's text.
+    
+    Reports are kept by content hash, so every caller given the same text
+    (the app, triage, the pipeline, a retried job) gets the same object and
+    its parsed views are computed once.
+    
+    Args:
+        report: The report text, or an already parsed report (returned as is)
+    
+    Returns:
+        The parsed report
+    """
+    if isinstance(report, ParsedReport):
+        return report
+    key = report_key(report)
+    with _parsed_reports_lock:
+        parsed = _parsed_reports.get(key)
+        if parsed is not None:
+            _parsed_reports.move_to_end(key)
+            return parsed
+        parsed = _parsed_reports[key] = ParsedReport(report, key=key)
+        while len(_parsed_reports) > PARSED_REPORT_CACHE_SIZE:
+            _parsed_reports.popitem(last=False)
+    return parsed
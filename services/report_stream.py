@@ -0,0 +1,156 @@
+# services/report_stream.py
+import os
+import re
+import mmap
+import logging
+from typing import Dict, Iterator, NamedTuple, Optional, Union
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+_NON_WHITESPACE = re.compile(rb"\S")
+_WHITESPACE_BYTES = frozenset(b" \t\n\r\x0b\x0c")
+
+
+class ReportSpan(NamedTuple):
+    """Where one report lies in a buffer (byte offsets, surrounding whitespace excluded)."""
+    index: int
+    start: int
+    end: int
+
+
+class ReportBuffer:
+    """
+    Splits a buffer of concatenated reports into individual reports without copying it.
+    
+    The buffer can be a memory-mapped file (see open()), an upload's memory
+    view or plain bytes. Delimiters are found by running the delimiter
+    pattern over the buffer itself, and a report is only copied and decoded
+    when it is read, so a file of any size costs the memory of one report at
+    a time. A buffer without delimiters is a single report.
+    """
+    
+    def __init__(self,
+                 buffer: Buffer,
+                 delimiter: Optional[str] = None,
+                 encoding: str = "utf-8"):
+        """
+        Initialize the reader.
+        
+        Args:
+            buffer: Bytes-like object holding the reports
+            delimiter: Regular expression (multiline) matching the separator between reports
+                (defaults to REPORT_DELIMITER)
+            encoding: Text encoding of the reports
+        """
+        if delimiter is None:
+            delimiter = settings.REPORT_DELIMITER
+        self.buffer = buffer
+        self.delimiter = re.compile(delimiter.encode("utf-8"), re.MULTILINE)
+        self.encoding = encoding
+        self._file = None
+    
+    @classmethod
+    def open(cls, path: str, delimiter: Optional[str] = None, encoding: str = "utf-8") -> "ReportBuffer":
+        """
+        Memory-map a report file; pages are read from disk only as they are scanned.
+        
+        Args:
+            path: The file
+            delimiter: Regular expression (multiline) matching the separator between reports
+                (defaults to REPORT_DELIMITER)
+            encoding: Text encoding of the file
+        
+        Returns:
+            The reader, to be closed (or used as a context manager) when done
+        """
+        file = open(path, "rb")
+        try:
+            # An empty file cannot be mapped
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(file.fileno()).st_size else b""
+        except Exception:
+            file.close()
+            raise
+        logger.debug(f"Mapped {path} ({len(buffer)} bytes)")
+        reader = cls(buffer, delimiter=delimiter, encoding=encoding)
+        reader._file = file
+        return reader
+    
+    def close(self) -> None:
+        """Unmap the file opened by open() (buffers passed in are left to their owner)."""
+        if self._file is not None:
+            if isinstance(self.buffer, mmap.mmap):
+                try:
+                    self.buffer.close()
+                except BufferError:
+                    # A spans() iterator abandoned mid-scan still uses the map; it is unmapped once collected
+                    pass
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self) -> "ReportBuffer":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def _trim(self, index: int, start: int, end: int) -> Optional[ReportSpan]:
+        match = _NON_WHITESPACE.search(self.buffer, start, end)
+        if match is None:
+            return None
+        start = match.start()
+        while self.buffer[end - 1] in _WHITESPACE_BYTES:
+            end -= 1
+        return ReportSpan(index, start, end)
+    
+    def spans(self) -> Iterator[ReportSpan]:
+        """
+        Yield the location of each report, scanning the buffer once.
+        
+        Blank stretches between delimiters are skipped, so reports are
+        numbered from 0 without gaps.
+        """
+        index = 0
+        start = 0
+        for match in self.delimiter.finditer(self.buffer):
+            span = self._trim(index, start, match.start())
+            if span is not None:
+                yield span
+                index += 1
+            start = match.end()
+        span = self._trim(index, start, len(self.buffer))
+        if span is not None:
+            yield span
+    
+    def read(self, span: ReportSpan) -> str:
+        """Decode one report."""
+        return bytes(self.buffer[span.start:span.end]).decode(self.encoding)
+    
+    def sections(self, span: ReportSpan) -> Dict[str, str]:
+        """Extract one report's sections straight from the buffer (see ReportParser.scan_sections)."""
+        from services.report_parser import ReportParser
+        return ReportParser.scan_sections(self.buffer, span.start, span.end, encoding=self.encoding)
+    
+    def __iter__(self) -> Iterator[str]:
+        for span in self.spans():
+            yield self.read(span)
+
+
+def iter_file_reports(path: str, delimiter: Optional[str] = None, encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Stream the reports in a file one at a time, memory-mapping it rather than reading it.
+    
+    Args:
+        path: File of one or more reports
+        delimiter: Regular expression (multiline) matching the separator between reports
+            (defaults to REPORT_DELIMITER)
+        encoding: Text encoding of the file
+    
+    Returns:
+        Iterator of report texts
+    """
+    with ReportBuffer.open(path, delimiter=delimiter, encoding=encoding) as reader:
+        yield from reader
@@ -0,0 +1,246 @@
+# services/resilience.py
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from config import settings
+from services.metrics import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call does not complete within its per-call deadline."""
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """HTTP status of an API error, from the Groq SDK or from an httpx response."""
+    status_code = getattr(exc, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(exc, "response", None), "status_code", None)
+    return status_code
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Decide whether an error from the LLM API is worth retrying.
+    
+    Args:
+        exc: The exception raised by the call
+    
+    Returns:
+        True for connection errors, timeouts, rate limits and 5xx responses
+    """
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    status_code = status_code_of(exc)
+    if status_code is not None:
+        return status_code in TRANSIENT_STATUS_CODES
+    # APIConnectionError / APITimeoutError and httpx transport errors carry no status code
+    return (type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+            or _is_transport_error(exc)
+            or isinstance(exc, (ConnectionError, TimeoutError)))
+
+
+def _is_transport_error(exc: BaseException) -> bool:
+    return any(cls.__name__ == "TransportError" and cls.__module__.startswith("httpx")
+               for cls in type(exc).__mro__)
+
+
+class RetryPolicy:
+    """
+    Retry schedule with full-jitter exponential backoff.
+    
+    Rate-limit rejections (HTTP 429) have their own, larger budget and no
+    backoff of their own, since the rate-limit governor already holds the
+    retry until the API's retry-after has passed.
+    """
+    
+    def __init__(self,
+                 max_retries: Optional[int] = None,
+                 rate_limit_retries: Optional[int] = None,
+                 base_delay: Optional[float] = None,
+                 max_delay: Optional[float] = None):
+        """
+        Initialize the retry policy.
+        
+        Args:
+            max_retries: Retries allowed for transient errors other than 429 (defaults to LLM_MAX_RETRIES)
+            rate_limit_retries: Retries allowed for 429 responses (defaults to LLM_RATE_LIMIT_RETRIES)
+            base_delay: Backoff for the first retry in seconds (defaults to LLM_RETRY_BASE_DELAY)
+            max_delay: Upper bound for a single backoff in seconds (defaults to LLM_RETRY_MAX_DELAY)
+        """
+        self.max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.rate_limit_retries = settings.LLM_RATE_LIMIT_RETRIES if rate_limit_retries is None else rate_limit_retries
+        self.base_delay = settings.LLM_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = settings.LLM_RETRY_MAX_DELAY if max_delay is None else max_delay
+    
+    def next_delay(self, exc: BaseException, state: Dict[str, int]) -> Optional[float]:
+        """
+        Return how long to wait before retrying, or None to give up.
+        
+        Args:
+            exc: The error raised by the last attempt
+            state: Per-call retry counters, updated in place
+        
+        Returns:
+            Delay in seconds, or None if the error is permanent or retries are exhausted
+        """
+        if not is_transient(exc):
+            return None
+        if status_code_of(exc) == 429:
+            state["rate_limited"] = state.get("rate_limited", 0) + 1
+            return 0.0 if state["rate_limited"] <= self.rate_limit_retries else None
+        
+        state["retries"] = state.get("retries", 0) + 1
+        if state["retries"] > self.max_retries:
+            return None
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (state["retries"] - 1)))
+        return random.uniform(0, ceiling)
+
+
+class ResilientCaller:
+    """
+    Runs LLM calls with retries, optional hedging and per-call deadlines.
+    
+    With hedging enabled, an attempt still running past the observed latency
+    percentile (p95 by default) gets a duplicate request, and whichever
+    answers first wins. Retries, hedges and hedge wins are counted in the
+    metrics tracker alongside the "attempt_latency" samples hedging uses.
+    """
+    
+    def __init__(self,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 metrics: Optional[LatencyTracker] = None,
+                 hedging: bool = False,
+                 hedge_percentile: Optional[float] = None,
+                 hedge_min_samples: Optional[int] = None):
+        """
+        Initialize the caller.
+        
+        Args:
+            retry_policy: Retry schedule (defaults to settings)
+            metrics: Tracker for latencies and counters
+            hedging: Send a duplicate request when an attempt runs long
+            hedge_percentile: Attempt latency percentile after which to hedge (defaults to LLM_HEDGE_PERCENTILE)
+            hedge_min_samples: Samples needed before hedging kicks in (defaults to LLM_HEDGE_MIN_SAMPLES)
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics or LatencyTracker()
+        self.hedging = hedging
+        self.hedge_percentile = settings.LLM_HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        self.hedge_min_samples = settings.LLM_HEDGE_MIN_SAMPLES if hedge_min_samples is None else hedge_min_samples
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Return the delay after which to hedge, or None if hedging is off or not warmed up."""
+        if not self.hedging or self.metrics.count("attempt_latency") < self.hedge_min_samples:
+            return None
+        return self.metrics.percentile("attempt_latency", self.hedge_percentile)
+    
+    @staticmethod
+    def remaining(deadline_at: Optional[float]) -> Optional[float]:
+        """Seconds left before the deadline (None if there is none)."""
+        if deadline_at is None:
+            return None
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("LLM call deadline exceeded")
+        return remaining
+    
+    def backoff(self, exc: BaseException, state: Dict[str, int], deadline_at: Optional[float] = None) -> float:
+        """
+        Account for a failed attempt and return the delay before the next one.
+        
+        Args:
+            exc: The error raised by the attempt
+            state: Per-call retry counters, updated in place
+            deadline_at: Monotonic deadline of the call, if any
+        
+        Returns:
+            Delay in seconds before retrying
+        
+        Raises:
+            The original error if it should not be retried, or DeadlineExceeded
+            if the retry could not start before the deadline
+        """
+        delay = self.retry_policy.next_delay(exc, state)
+        if delay is None:
+            raise exc
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            self.metrics.increment("deadline_exceeded")
+            raise DeadlineExceeded("LLM call deadline exceeded while retrying") from exc
+        self.metrics.increment("retries")
+        logger.warning(f"Transient LLM error ({type(exc).__name__}: {str(exc)}); retrying in {delay:.2f}s")
+        return delay
+    
+    async def _timed_async(self, fn: Callable[[Optional[float]], Awaitable[T]], timeout: Optional[float]) -> T:
+        start = time.perf_counter()
+        result = await fn(timeout)
+        self.metrics.record("attempt_latency", time.perf_counter() - start)
+        return result
+    
+    async def call_async(self, fn: Callable[[Optional[float]], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """
+        Run a call with retries and optional hedging.
+        
+        Args:
+            fn: Coroutine function performing one attempt; receives the seconds left (or None)
+            deadline: Overall time budget for the call in seconds
+        
+        Returns:
+            The result of the first successful attempt
+        """
+        deadline_at = time.monotonic() + deadline if deadline else None
+        state: Dict[str, int] = {}
+        while True:
+            try:
+                return await self._attempt_async(fn, deadline_at)
+            except DeadlineExceeded:
+                self.metrics.increment("deadline_exceeded")
+                raise
+            except Exception as e:
+                await asyncio.sleep(self.backoff(e, state, deadline_at))
+    
+    async def _attempt_async(self, fn: Callable[[Optional[float]], Awaitable[T]], deadline_at: Optional[float]) -> T:
+        timeout = self.remaining(deadline_at)
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or (timeout is not None and hedge_delay >= timeout):
+            try:
+                return await asyncio.wait_for(self._timed_async(fn, timeout), timeout)
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("LLM call deadline exceeded")
+        
+        primary = asyncio.ensure_future(self._timed_async(fn, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+        
+        self.metrics.increment("hedges")
+        logger.debug(f"Hedging LLM call still running after {hedge_delay:.2f}s")
+        hedge = asyncio.ensure_future(self._timed_async(fn, self.remaining(deadline_at)))
+        
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.remaining(deadline_at),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("LLM call deadline exceeded")
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.metrics.increment("hedge_wins")
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,239 @@
+# services/response_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM responses.
+
+    Lookups go to a bounded in-process LRU first and fall back to a persistent
+    SQLite table, so identical prompts are answered without an API call even
+    across restarts. Both tiers honour the same TTL. SQLite is only touched
+    outside the lock that guards the LRU, so memory hits never wait on disk.
+    """
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 ttl_seconds: Optional[int] = None,
+                 max_memory_entries: Optional[int] = None,
+                 max_disk_entries: Optional[int] = None,
+                 max_temperature: Optional[float] = None):
+        """
+        Initialize the response cache.
+
+        Args:
+            db_path: Path of the SQLite file (None keeps the cache in memory only)
+            ttl_seconds: Age after which an entry is treated as missing (defaults to LLM_CACHE_TTL_SECONDS)
+            max_memory_entries: Maximum number of entries in the in-process LRU (defaults to LLM_CACHE_MEMORY_ENTRIES)
+            max_disk_entries: Maximum number of rows kept in SQLite (defaults to LLM_CACHE_DISK_ENTRIES)
+            max_temperature: Skip the cache for calls with a temperature above this
+                (defaults to LLM_CACHE_MAX_TEMPERATURE)
+        """
+        self.db_path = db_path
+        self.ttl_seconds = settings.LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_memory_entries = settings.LLM_CACHE_MEMORY_ENTRIES if max_memory_entries is None else max_memory_entries
+        self.max_disk_entries = settings.LLM_CACHE_DISK_ENTRIES if max_disk_entries is None else max_disk_entries
+        self.max_temperature = settings.LLM_CACHE_MAX_TEMPERATURE if max_temperature is None else max_temperature
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes use of the SQLite connection, independently of the LRU lock
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    @staticmethod
+    def make_key(model: str, system_message: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        """
+        Build the cache key for a completion request.
+
+        Returns:
+            Hex SHA-256 digest of the request parameters
+        """
+        payload = json.dumps(
+            [model, system_message, prompt, round(float(temperature), 4), int(max_tokens)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def should_bypass(self, temperature: float) -> bool:
+        """Return True if a call with this temperature must not be served from the cache."""
+        if temperature > self.max_temperature:
+            with self._lock:
+                self._counters["bypassed"] += 1
+            return True
+        return False
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite tier on first use. Must be called with the database lock held."""
+        if self._conn is None and self.db_path:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries. Lock must be held."""
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            The cached response, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+        row = None
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                if conn is not None:
+                    row = conn.execute(
+                        "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        if now - row[1] <= self.ttl_seconds:
+                            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                        else:
+                            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                            row = None
+                        conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {str(e)}")
+            row = None
+
+        with self._lock:
+            if row is not None:
+                response, created_at = row
+                self._remember(key, response, created_at)
+                self._counters["disk_hits"] += 1
+                return response
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Cache key from make_key
+            response: The LLM response text
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            self._counters["stores"] += 1
+
+        evicted = 0
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                if conn is None:
+                    return
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+                overflow = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+                        (overflow,)
+                    )
+                    evicted = overflow
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {str(e)}")
+
+        if evicted:
+            with self._lock:
+                self._counters["evictions"] += evicted
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit/miss counters for the cache.
+
+        Returns:
+            Dictionary of counters, including the combined hit count
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """
+    Return the process-wide response cache configured from settings.
+
+    Returns:
+        Shared ResponseCache instance, or None if caching is disabled
+    """
+    global _default_cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache(db_path=settings.LLM_CACHE_PATH)
+        return _default_cache
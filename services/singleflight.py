@@ -0,0 +1,196 @@
+# services/singleflight.py
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """
+    One upstream call shared by every caller with the same key.
+    
+    The leader publishes text chunks as they arrive (a full completion
+    publishes a single chunk), so followers can either replay the stream or
+    wait for the joined result, from any event loop.
+    """
+    
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+        self._lock = threading.Lock()
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+    
+    def _wake_async_waiters(self) -> None:
+        """Resolve pending event-loop waiters. Lock must be held."""
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve_waiter, future)
+    
+    def publish(self, chunk: str) -> None:
+        """Append a chunk and wake every follower."""
+        with self._lock:
+            self.chunks.append(chunk)
+            self._wake_async_waiters()
+    
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the flight complete (or failed) and wake every follower."""
+        with self._lock:
+            self.done = True
+            self.error = error
+            self._wake_async_waiters()
+    
+    async def aiter_chunks(self) -> AsyncIterator[str]:
+        """Yield every chunk published so far and then each new one, waiting between them."""
+        loop = asyncio.get_running_loop()
+        index = 0
+        while True:
+            waiter = None
+            with self._lock:
+                new_chunks = self.chunks[index:]
+                index = len(self.chunks)
+                done, error = self.done, self.error
+                if not new_chunks and not done:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            for chunk in new_chunks:
+                yield chunk
+            if waiter is not None:
+                await waiter
+            elif done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+    
+    async def result_async(self) -> str:
+        """Wait for the flight to complete and return the joined text."""
+        return "".join([chunk async for chunk in self.aiter_chunks()])
+
+
+def _resolve_waiter(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests into one upstream call.
+    
+    The first caller for a key becomes the leader and performs the call;
+    callers arriving while it is in flight share its result (or error)
+    instead of sending their own request. Works across event loops, for full
+    and streaming calls alike.
+    """
+    
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "deduplicated": 0}
+    
+    def _join(self, key: str) -> Tuple[_Flight, bool]:
+        """Return the flight for a key and whether the caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self._counters["deduplicated"] += 1
+                return flight, False
+            flight = _Flight()
+            self._flights[key] = flight
+            self._counters["leaders"] += 1
+            return flight, True
+    
+    def _land(self, key: str, flight: _Flight, error: Optional[BaseException] = None) -> None:
+        """Remove a flight so later callers start a fresh one, then release its followers."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if flight.followers:
+            logger.debug(f"Shared one LLM call with {flight.followers} identical request(s)")
+        flight.finish(error)
+    
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        Run an async call once per key among concurrent callers.
+        
+        Args:
+            key: Request key identifying identical calls
+            fn: Coroutine function performing the upstream call
+        
+        Returns:
+            The call's result
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            return await flight.result_async()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._land(key, flight, _shareable(e))
+            raise
+        flight.publish(result)
+        self._land(key, flight)
+        return result
+    
+    async def stream_async(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Stream a call once per key; followers replay the leader's deltas.
+        
+        Args:
+            key: Request key identifying identical calls
+            fn: Returns an async iterator over the upstream deltas
+        
+        Yields:
+            Text deltas
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            async for chunk in flight.aiter_chunks():
+                yield chunk
+            return
+        error = None
+        completed = False
+        try:
+            async for chunk in fn():
+                flight.publish(chunk)
+                yield chunk
+            completed = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # A consumer that stops early must not leave followers waiting forever
+            if error is None and not completed:
+                error = _abandoned_error()
+            self._land(key, flight, error)
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Return coalescing counters.
+        
+        Returns:
+            Dictionary with the number of upstream calls led, calls deduplicated
+            and flights currently in the air
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._flights)
+        return stats
+
+
+def _abandoned_error() -> RuntimeError:
+    return RuntimeError("The shared LLM call was abandoned before it finished")
+
+
+def _shareable(error: BaseException) -> BaseException:
+    """Errors like cancellation belong to the leader only; followers see a plain failure."""
+    return error if isinstance(error, Exception) else _abandoned_error()
+
+
+_default_singleflight = SingleFlight()
+
+def get_default_singleflight() -> SingleFlight:
+    """Return the process-wide SingleFlight shared by every LLM service."""
+    return _default_singleflight
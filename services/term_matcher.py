@@ -0,0 +1,286 @@
+# services/term_matcher.py
+import os
+import pickle
+import hashlib
+import logging
+from bisect import bisect_right
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the serialized automaton layout changes
+AUTOMATON_FORMAT = 1
+
+# Whitespace inside a multi-word term matches any single whitespace character in the text
+_WHITESPACE = str.maketrans({character: " " for character in "\t\n\r\x0b\x0c\x85\xa0  "})
+
+
+def _fold(text: str) -> str:
+    """Lowercase text one character to one character, so positions in the result are positions in text."""
+    folded = text.lower()
+    if len(folded) != len(text):
+        # A few characters lowercase to two ("İ"); keep those as they are
+        folded = "".join(character if len(character.lower()) != 1 else character.lower() for character in text)
+    return folded.translate(_WHITESPACE)
+
+
+def _is_word_character(character: str) -> bool:
+    return character.isalnum() or character == "_"
+
+
+class TermMatch(NamedTuple):
+    """One occurrence of a vocabulary term in a text."""
+    term: str
+    label: str
+    start: int
+    end: int
+
+
+class TermMatcher:
+    """
+    Finds every occurrence of many terms in one pass over a text (Aho-Corasick).
+    
+    Matching is case-insensitive, and a space in a term matches any one
+    whitespace character, so multi-word terms are found across line breaks.
+    With word_boundaries, a term is only reported where it is not part of a
+    longer word. Each term can carry a label, e.g. the canonical name of a
+    synonym ("sob" labelled "shortness of breath"); the label defaults to the
+    term. The automaton is built once and can be saved and loaded, so large
+    vocabularies do not have to be rebuilt at every start.
+    """
+    
+    def __init__(self,
+                 terms: Iterable[Union[str, Tuple[str, str]]] = (),
+                 word_boundaries: bool = True):
+        """
+        Build the automaton.
+        
+        Args:
+            terms: Terms, or (term, label) pairs; duplicates keep their first label
+            word_boundaries: Only report terms that are whole words or phrases
+        """
+        self.word_boundaries = word_boundaries
+        self.terms: List[str] = []
+        self.labels: List[str] = []
+        self._lengths: List[int] = []
+        # Node 0 is the root; each node has its transitions, failure link and the terms ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        
+        seen = set()
+        for entry in terms:
+            term, label = (entry, entry) if isinstance(entry, str) else entry
+            term = " ".join(term.split())
+            key = _fold(term)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            self._insert(key, len(self.terms))
+            self.terms.append(term)
+            self.labels.append(label)
+            self._lengths.append(len(key))
+        self._link()
+    
+    def _insert(self, key: str, index: int) -> None:
+        node = 0
+        for character in key:
+            next_node = self._goto[node].get(character)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][character] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = next_node
+        self._out[node] += (index,)
+    
+    def _link(self) -> None:
+        """Compute the failure links breadth-first, merging each node's output with its failure node's."""
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for character, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and character not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(character, 0)
+                self._fail[child] = fail if fail != child else 0
+                self._out[child] += self._out[self._fail[child]]
+    
+    def __len__(self) -> int:
+        return len(self.terms)
+    
+    def iter_matches(self, text: str) -> Iterator[TermMatch]:
+        """
+        Yield every occurrence of every term, in order of where they end.
+        
+        Args:
+            text: The text to search
+        
+        Yields:
+            TermMatch for each occurrence (overlapping occurrences included)
+        """
+        goto, fail, out, terms, lengths = self._goto, self._fail, self._out, self.terms, self._lengths
+        node = 0
+        for position, character in enumerate(_fold(text)):
+            while node and character not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(character, 0)
+            for index in out[node]:
+                end = position + 1
+                start = end - lengths[index]
+                if self.word_boundaries and not self._at_boundaries(text, start, end):
+                    continue
+                yield TermMatch(terms[index], self.labels[index], start, end)
+    
+    @staticmethod
+    def _at_boundaries(text: str, start: int, end: int) -> bool:
+        """Whether the span is not joined to a word on either side (where its own edge is a word character)."""
+        if start > 0 and _is_word_character(text[start]) and _is_word_character(text[start - 1]):
+            return False
+        if end < len(text) and _is_word_character(text[end - 1]) and _is_word_character(text[end]):
+            return False
+        return True
+    
+    def find_all(self, text: str) -> List[TermMatch]:
+        """Return every occurrence of every term, ordered by start position."""
+        return sorted(self.iter_matches(text), key=lambda match: (match.start, match.end))
+    
+    def phrases(self, text: str, delimiters: str = ".;,") -> List[Tuple[TermMatch, str]]:
+        """
+        Expand each occurrence to the phrase around it.
+        
+        Args:
+            text: The text to search
+            delimiters: Characters that separate phrases
+        
+        Returns:
+            (match, phrase) pairs ordered by start position, the phrase being the
+            stripped text between the delimiters on either side of the match
+        """
+        cuts = [position for position, character in enumerate(text) if character in delimiters]
+        expanded = []
+        for match in self.find_all(text):
+            index = bisect_right(cuts, match.start - 1)
+            start = cuts[index - 1] + 1 if index else 0
+            end = cuts[index] if index < len(cuts) else len(text)
+            expanded.append((match, text[start:end].strip()))
+        return expanded
+    
+    def save(self, path: str) -> None:
+        """
+        Write the built automaton to a file for load().
+        
+        Args:
+            path: File to write (its directory is created if missing)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        state = {
+            "format": AUTOMATON_FORMAT,
+            "word_boundaries": self.word_boundaries,
+            "terms": self.terms,
+            "labels": self.labels,
+            "lengths": self._lengths,
+            "goto": self._goto,
+            "fail": self._fail,
+            "out": self._out
+        }
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> "TermMatcher":
+        """
+        Read an automaton written by save(). Only load files this application wrote.
+        
+        Args:
+            path: File to read
+        
+        Returns:
+            The matcher
+        
+        Raises:
+            ValueError: If the file was written in another format version
+        """
+        with open(path, "rb") as file:
+            state = pickle.load(file)
+        if not isinstance(state, dict) or state.get("format") != AUTOMATON_FORMAT:
+            raise ValueError(f"{path} is not a term automaton in format {AUTOMATON_FORMAT}")
+        matcher = cls.__new__(cls)
+        matcher.word_boundaries = state["word_boundaries"]
+        matcher.terms = state["terms"]
+        matcher.labels = state["labels"]
+        matcher._lengths = state["lengths"]
+        matcher._goto = state["goto"]
+        matcher._fail = state["fail"]
+        matcher._out = state["out"]
+        return matcher
+    
+    @classmethod
+    def from_file(cls,
+                  path: str,
+                  cache_dir: Optional[str] = None,
+                  word_boundaries: bool = True) -> "TermMatcher":
+        """
+        Build a matcher from a vocabulary file, reusing a saved automaton when the file is unchanged.
+        
+        The file has one term per line. A tab separates an optional label
+        ("sob<TAB>shortness of breath"); blank lines and lines starting with
+        "#" are ignored.
+        
+        Args:
+            path: Vocabulary file (UTF-8)
+            cache_dir: Directory for the built automaton, keyed by the file's content hash (None disables)
+            word_boundaries: Only report terms that are whole words or phrases
+        
+        Returns:
+            The matcher
+        """
+        with open(path, "rb") as file:
+            content = file.read()
+        
+        cache_path = None
+        if cache_dir:
+            digest = hashlib.sha256(content + (b"\x01" if word_boundaries else b"\x00")).hexdigest()[:16]
+            cache_path = os.path.join(cache_dir, f"{os.path.basename(path)}.{digest}.automaton")
+            if os.path.exists(cache_path):
+                try:
+                    return cls.load(cache_path)
+                except Exception as e:
+                    logger.warning(f"Rebuilding term automaton; could not load {cache_path}: {str(e)}")
+        
+        matcher = cls(parse_vocabulary(content.decode("utf-8").splitlines()), word_boundaries=word_boundaries)
+        logger.info(f"Built term automaton for {len(matcher)} terms from {path}")
+        if cache_path is not None:
+            try:
+                matcher.save(cache_path)
+            except OSError as e:
+                logger.warning(f"Could not save term automaton to {cache_path}: {str(e)}")
+        return matcher
+
+
+def parse_vocabulary(lines: Sequence[str]) -> List[Tuple[str, str]]:
+    """
+    Read vocabulary lines into (term, label) pairs.
+    
+    Args:
+        lines: Lines of a vocabulary file
+    
+    Returns:
+        The terms with their labels (the term itself when no label is given)
+    """
+    entries = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        term, _, label = line.partition("\t")
+        term, label = term.strip(), label.strip()
+        if term:
+            entries.append((term, label or term))
+    return entries
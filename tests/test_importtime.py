@@ -0,0 +1,49 @@
+# tests/test_importtime.py
+"""
+Cold-start checks for the entry paths (see benchmarks/importtime_budget.py).
+
+    python -m pytest tests/test_importtime.py
+"""
+import os
+import sys
+import subprocess
+import importlib.util
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_budget_module():
+    path = os.path.join(ROOT_DIR, "benchmarks", "importtime_budget.py")
+    spec = importlib.util.spec_from_file_location("importtime_budget", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+importtime_budget = _load_budget_module()
+
+# Best of a few fresh interpreters, as the benchmark does, to ride out a noisy machine
+RUNS = 3
+
+
+@pytest.mark.parametrize("path", sorted(importtime_budget.ENTRY_PATHS))
+def test_entry_path_within_budget(path):
+    modules = importtime_budget.ENTRY_PATHS[path]
+    total = min(importtime_budget.measure(modules)[0] for _ in range(RUNS))
+    assert total <= importtime_budget.DEFAULT_BUDGET_MS, (
+        f"Importing the {path} entry path took {total:.1f} ms "
+        f"(budget {importtime_budget.DEFAULT_BUDGET_MS:.0f} ms); "
+        f"run benchmarks/importtime_budget.py --verbose to see the slowest imports"
+    )
+
+
+@pytest.mark.parametrize("path", sorted(importtime_budget.ENTRY_PATHS))
+def test_entry_path_leaves_settings_unresolved(path):
+    # Settings are read where they are used, so importing must not load .env or compute them
+    modules = importtime_budget.ENTRY_PATHS[path]
+    code = "import " + ", ".join(modules) + "; import config.settings; print(config.settings._resolved)"
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR,
+                               capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == "False"
@@ -3,9 +3,9 @@ import os
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, Union, List
+from typing import Dict, Any, Iterator, Union, List
 
-from config.settings import REPORTS_DIR, RESULTS_DIR
+from config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +26,7 @@ class FileHandler:
         Raises:
             FileNotFoundError: If the report file doesn't exist
         """
-        file_path = os.path.join(REPORTS_DIR, filename)
+        file_path = os.path.join(settings.REPORTS_DIR, filename)
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 content = file.read()
@@ -39,6 +39,32 @@ class FileHandler:
             logger.error(f"Error loading report {filename}: {str(e)}")
             raise
     
+    @staticmethod
+    def iter_reports(filename: str) -> Iterator[str]:
+        """
+        Stream the reports in a file from the reports directory, one at a time.
+        
+        Unlike load_report, the file is memory-mapped rather than read, and a
+        file of several reports separated by REPORT_DELIMITER yields each in
+        turn, so very large exports never have to fit in memory.
+        
+        Args:
+            filename: Name of the report file
+            
+        Returns:
+            Iterator of report texts
+            
+        Raises:
+            FileNotFoundError: If the report file doesn't exist
+        """
+        from services.report_stream import iter_file_reports
+        
+        file_path = os.path.join(settings.REPORTS_DIR, filename)
+        if not os.path.isfile(file_path):
+            logger.error(f"Report file not found: {file_path}")
+            raise FileNotFoundError(file_path)
+        return iter_file_reports(file_path)
+    
     @staticmethod
     def save_result(data: Union[str, Dict[str, Any]], 
                    filename: str = None, 
@@ -68,9 +94,10 @@ class FileHandler:
         else:
             filename = f"{filename}.txt"
         
-        file_path = os.path.join(RESULTS_DIR, filename)
+        file_path = os.path.join(settings.RESULTS_DIR, filename)
         
         try:
+            settings.ensure_directories()
             with open(file_path, 'w', encoding='utf-8') as file:
                 if format_type.lower() == "json" and isinstance(data, dict):
                     json.dump(data, file, indent=2)
@@ -97,7 +124,7 @@ class FileHandler:
             List of report filenames
         """
         try:
-            files = [f for f in os.listdir(REPORTS_DIR) if os.path.isfile(os.path.join(REPORTS_DIR, f))]
+            files = [f for f in os.listdir(settings.REPORTS_DIR) if os.path.isfile(os.path.join(settings.REPORTS_DIR, f))]
             return sorted(files)
         except Exception as e:
             logger.error(f"Error listing reports: {str(e)}")
@@ -4,7 +4,7 @@ import logging
 import sys
 from logging.handlers import RotatingFileHandler
 
-from config.settings import LOG_LEVEL, BASE_DIR
+from config import settings
 
 def setup_logger(name: str = None, level: str = None) -> logging.Logger:
     """
@@ -23,7 +23,7 @@ def setup_logger(name: str = None, level: str = None) -> logging.Logger:
     # Only configure if this logger hasn't been set up already
     if not logger.handlers:
         # Determine log level
-        level = level or LOG_LEVEL
+        level = level or settings.LOG_LEVEL
         numeric_level = getattr(logging, level.upper(), logging.INFO)
         logger.setLevel(numeric_level)
         
@@ -39,7 +39,7 @@ def setup_logger(name: str = None, level: str = None) -> logging.Logger:
         logger.addHandler(console_handler)
         
         # File handler
-        log_dir = os.path.join(BASE_DIR, 'logs')
+        log_dir = os.path.join(settings.BASE_DIR, 'logs')
         os.makedirs(log_dir, exist_ok=True)
         
         log_file = os.path.join(log_dir, 'medical_agents.log')